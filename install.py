@@ -45,6 +45,9 @@ else:
             CF.write('dbPath      = "' + str(dbPath) + '"\n')
             print('        tmpPath     = "' + str(tmpPath) + '"')
             CF.write('tmpPath     = "' + str(tmpPath) + '"\n')
+            print('        sqliteWalMode = False')
+            CF.write('\n# Set sqliteWalMode to True to use sqlite3 WAL mode (not for NFS), then database readers never block the writers.\n')
+            CF.write('sqliteWalMode = False\n')
         os.chmod(configFile, stat.S_IRWXU+stat.S_IRWXG+stat.S_IRWXO)
         os.chmod(dbPath, stat.S_IRWXU+stat.S_IRWXG+stat.S_IRWXO)
         os.chmod(tmpPath, stat.S_IRWXU+stat.S_IRWXG+stat.S_IRWXO)
@@ -56,7 +59,7 @@ else:
 ## Replace string "PYTHONPATH" into the real python path on all of the python files.
 print('>>> Update python path for main executable programs.')
 
-pythonFiles = ['monitor/bin/bmonitor.py', 'monitor/bin/bmonitorGUI.py', 'monitor/bin/bsample.py', 'monitor/tools/seedb.py', 'monitor/bin/asub', 'monitor/bin/batchRun.py', 'monitor/bin/jobResourceMonitor.py', 'monitor/bin/jobResourceSample.py']
+pythonFiles = ['monitor/bin/bmonitor.py', 'monitor/bin/bmonitorGUI.py', 'monitor/bin/bsample.py', 'monitor/tools/seedb.py', 'monitor/tools/benchmark.py', 'monitor/tools/upgradeDb.py', 'monitor/bin/asub', 'monitor/bin/batchRun.py', 'monitor/bin/jobResourceMonitor.py', 'monitor/bin/jobResourceSample.py', 'monitor/bin/jobResourceIngest.py']
 currentPython = sys.executable
 currentPythonEscaping = re.sub('/', '\/', currentPython)
 
@@ -72,7 +75,7 @@ for pythonFile in pythonFiles:
 ## Replace string "MONITORPATH" into the real monitor directory path on all of the python files.
 print('>>> Update monitor directory path for main executable programs.')
 
-pythonFiles = ['monitor/bin/bmonitor.py', 'monitor/bin/bmonitorGUI.py', 'monitor/bin/bsample.py', 'monitor/tools/seedb.py', 'monitor/bin/asub', 'monitor/bin/batchRun.py', 'monitor/bin/jobResourceMonitor.py', 'monitor/bin/jobResourceSample.py', 'monitor/common/openlava_common.py', 'monitor/common/sqlite3_common.py']
+pythonFiles = ['monitor/bin/bmonitor.py', 'monitor/bin/bmonitorGUI.py', 'monitor/bin/bsample.py', 'monitor/tools/seedb.py', 'monitor/tools/benchmark.py', 'monitor/tools/upgradeDb.py', 'monitor/bin/asub', 'monitor/bin/batchRun.py', 'monitor/bin/jobResourceMonitor.py', 'monitor/bin/jobResourceSample.py', 'monitor/bin/jobResourceIngest.py', 'monitor/common/openlava_common.py', 'monitor/common/sqlite3_common.py']
 monitorPath = str(installPath) + '/monitor'
 monitorPathEscaping = re.sub('/', '\/', monitorPath)
 
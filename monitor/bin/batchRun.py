@@ -7,13 +7,14 @@
 
 import os
 import sys
-import argparse
-import threading
+import json
 import time
+import argparse
 
 sys.path.append('MONITORPATH')
 from common import common
 from common import openlava_common
+from common import sqlite3_common
 from conf import config
 
 os.environ["PYTHONUNBUFFERED"]="1"
@@ -28,15 +29,45 @@ def readArgs():
                         nargs='+',
                         default=[],
                         help='Specify hosts to check.')
+    parser.add_argument("-c", "--concurrency",
+                        type=int,
+                        default=64,
+                        help='Specify the max number of the parallel ssh sessions, default is 64.')
+    parser.add_argument("-t", "--timeout",
+                        type=int,
+                        default=240,
+                        help='Specify the timeout seconds of every host, default is 240.')
+    parser.add_argument("-r", "--retry",
+                        type=int,
+                        default=1,
+                        help='Specify the retry times on the ssh connection failure, default is 1.')
+    parser.add_argument("-s", "--ssh",
+                        default='ssh',
+                        help='Specify the ssh command, default is "ssh".')
+    parser.add_argument("-o", "--output",
+                        default='',
+                        help='Specify the json file to save the per-host result/latency report.')
+    parser.add_argument("--collect",
+                        action='store_true',
+                        default=False,
+                        help='Collect the job samples from the jobResourceSample.py output and save them on current host, instead of writing the db files on every host.')
 
     args = parser.parse_args()
-    return(args.hosts)
 
-def runJobResourceSample(specifiedHostList):
+    if args.concurrency < 1:
+        common.printError('*Error*: concurrency must be bigger than 0.')
+        sys.exit(1)
+
+    return(args.hosts, args.concurrency, args.timeout, args.retry, args.ssh, args.output, args.collect)
+
+def getBusyHostList(specifiedHostList):
+    """
+    Get the hosts with running jobs.
+    """
     bhostsDic = openlava_common.getBhostsInfo()
     hostList = bhostsDic['HOST_NAME']
-    runList = bhostsDic['RUN']
-    threadList = []
+    runList = bhostsDic.getNumericColumn('RUN')
+    busyHostList = []
 
     for i in range(len(hostList)):
         hostName = hostList[i]
@@ -45,26 +76,102 @@ def runJobResourceSample(specifiedHostList):
 
         runJobNum = runList[i]
 
-        if int(runJobNum) > 0:
-            jobResourceSample = str(config.installPath) + '/monitor/bin/jobResourceSample.py'
-            print(str(hostName) + ' : ' + str(jobResourceSample))
-            myThread = threading.Thread(target=common.sshRun, args=(hostName, jobResourceSample, 1200))
-            threadList.append(myThread)
-            myThread.setDaemon(True)
-            myThread.start()
-            time.sleep(1)
+        if runJobNum > 0:
+            busyHostList.append(hostName)
         else:
             print('*Info*: No job on host "' + str(hostName) + '", will ignore it.')
 
-    for myThread in threadList:
-        myThread.join()
+    return(busyHostList)
+
+def printHostResult(resultDic):
+    """
+    Print the result of the finished host.
+    """
+    message = '    %-24s%-10s%-10s%-10s' % (resultDic['host'], resultDic['status'], resultDic['attempts'], resultDic['seconds'])
+
+    if resultDic['status'] == 'passed':
+        print(message)
+    else:
+        common.printWarning(message)
+
+        for line in resultDic['output'][-5:]:
+            common.printWarning('        ' + str(line))
+
+def runJobResourceSample(specifiedHostList, concurrency, timeout, retry, sshCommand, outputFile, collect=False):
+    hostList = getBusyHostList(specifiedHostList)
+    jobResourceSample = str(config.installPath) + '/monitor/bin/jobResourceSample.py'
+
+    if collect:
+        jobResourceSample = str(jobResourceSample) + ' --output stdout'
+
+    print('>>> Running "' + str(jobResourceSample) + '" on ' + str(len(hostList)) + ' hosts (concurrency ' + str(concurrency) + ') ...')
+    print('    %-24s%-10s%-10s%-10s' % ('HOST', 'STATUS', 'ATTEMPTS', 'SECONDS'))
+
+    startTime = time.time()
+    resultList = common.sshRunHosts(hostList, jobResourceSample, concurrency=concurrency, timeout=timeout, retry=retry, sshCommand=sshCommand, callback=printHostResult)
+    seconds = round(time.time()-startTime, 3)
+
+    statusNumDic = {'passed' : 0, 'failed' : 0, 'timeout' : 0}
+
+    for resultDic in resultList:
+        statusNumDic[resultDic['status']] = statusNumDic.get(resultDic['status'], 0) + 1
+
+    hostSecondsList = [resultDic['seconds'] for resultDic in resultList]
+
+    if len(hostSecondsList) > 0:
+        print('>>> Done in ' + str(seconds) + ' seconds, passed ' + str(statusNumDic['passed']) + ', failed ' + str(statusNumDic['failed']) + ', timeout ' + str(statusNumDic['timeout']) + ', host latency avg ' + str(round(sum(hostSecondsList)/len(hostSecondsList), 3)) + 's / max ' + str(max(hostSecondsList)) + 's.')
+
+    saveFailed = False
+
+    if collect:
+        valueTupleList = []
+
+        for resultDic in resultList:
+            if resultDic['status'] == 'passed':
+                valueTupleList.extend(sqlite3_common.parseJobSampleRecords(resultDic['output']))
+
+        print('>>> Saving ' + str(len(valueTupleList)) + ' job samples into sqlite3 ...')
+        savedNum = sqlite3_common.saveJobSamples(str(config.dbPath) + '/resource/job', valueTupleList)
+
+        # Keep the samples on the spool directory, jobResourceIngest.py saves them on the next run (the saved samples are replaced).
+        if savedNum != len(valueTupleList):
+            common.printError('*Error*: Only ' + str(savedNum) + ' of ' + str(len(valueTupleList)) + ' job samples are saved.')
+            spoolFile = sqlite3_common.saveJobSampleSpool(sqlite3_common.jobSampleSpoolPath, 'batchRun_' + str(int(startTime)), valueTupleList)
+
+            if spoolFile != '':
+                common.printWarning('*Warning*: All of the collected job samples are saved into spool file "' + str(spoolFile) + '" for jobResourceIngest.py.')
+
+            saveFailed = True
+
+    if outputFile != '':
+        reportDic = {
+                     'startTime' : int(startTime),
+                     'seconds' : seconds,
+                     'concurrency' : concurrency,
+                     'timeout' : timeout,
+                     'retry' : retry,
+                     'summary' : statusNumDic,
+                     'hosts' : resultList,
+                    }
+
+        try:
+            with open(outputFile, 'w') as OF:
+                json.dump(reportDic, OF, indent=4)
+        except Exception as error:
+            common.printError('*Error*: Failed on writing report file "' + str(outputFile) + '": ' + str(error))
+
+    # Exit with error after the report is written, so the crontab/monitoring notices the unsaved samples.
+    if saveFailed:
+        sys.exit(1)
+
+    return(resultList)
 
 ################
 # Main Process #
 ################
 def main():
-    (hostList) = readArgs()
-    runJobResourceSample(hostList)
+    (hostList, concurrency, timeout, retry, sshCommand, outputFile, collect) = readArgs()
+    runJobResourceSample(hostList, concurrency, timeout, retry, sshCommand, outputFile, collect)
 
 if __name__ == '__main__':
     main()
@@ -2,8 +2,8 @@
 # -*- coding: utf-8 -*-
 
 import os
-import re
 import sys
+import time
 import getpass
 import datetime
 
@@ -12,87 +12,83 @@ from bin import bmonitorGUI
 from conf import config
 from common import common
 from common import sqlite3_common
+from common import downsample_common
 
 os.environ["PYTHONUNBUFFERED"]="1"
 
+# The max point number of the job memory curve, the longer curve is downsampled (the peak is kept), 0 means no limit.
+curveMaxPoints = getattr(config, 'curveMaxPoints', 2000)
+
 class drawCurve():
+    """
+    Get the job memory curve and the queue (PEND/RUN) job number curve data from the sqlite3 database files.
+    The database files are connected on every call (then closed), so the functions can run on the background query threads of bmonitorGUI.py.
+    """
     def __init__(self):
         self.user = getpass.getuser()
         self.queueDbFile= str(config.dbPath) + '/monitor/queue.db'
-
-        (self.queueDbFileConnectResult, self.queueDbConn) = sqlite3_common.connectDbFile(self.queueDbFile)
-        if self.queueDbFileConnectResult == 'failed':
-            common.printWarning('*Warning*: Failed on connectiong queue database file "' + str(self.queueDbFile) + '".')
-
         self.jobFirstLoad = True
         self.queueFirstLoad = True
 
-    def __clear__(self):
-        if self.queueDbFileConnectResult == 'passed':
-            self.queueDbConn.close()
+    def connectDbFile(self, dbFile):
+        """
+        Connect the db file with the current schema version, return the connection, None if it fails.
+        """
+        (result, dbConn) = sqlite3_common.connectDbFile(dbFile)
 
-    def drawJobMemCurve(self, job):
+        if result == 'failed':
+            common.printWarning('*Warning*: Failed on connectiong database file "' + str(dbFile) + '".')
+            return(None)
+        elif not sqlite3_common.checkSqlSchemaVersion(dbFile, dbConn):
+            dbConn.close()
+            return(None)
+
+        return(dbConn)
+
+    def getJobMemCurveData(self, job):
         """
-        Draw memory usage curve for specified job.
+        Get the memory usage curve data of the specified job, return (runTimeList (minutes), memList (G)), None if the job information is missing.
+        The curve is downsampled into no more than curveMaxPoints points.
         """
         jobRangeDic = common.getJobRangeDic([job,])
         jobRangeList = list(jobRangeDic.keys())
         jobRange = jobRangeList[0]
-        self.jobDbFile= str(config.dbPath) + '/monitor/job/' + str(jobRange) + '.db'
-
-        (self.jobDbFileConnectResult, self.jobDbConn) = sqlite3_common.connectDbFile(self.jobDbFile)
-        if self.jobDbFileConnectResult == 'failed':
-            common.printWarning('*Warning*: Failed on connectiong job database file "' + str(self.jobDbFile) + '".')
-            return
+        jobDbFile= str(config.dbPath) + '/monitor/job/' + str(jobRange) + '.db'
+        jobDbConn = self.connectDbFile(jobDbFile)
 
-        runTimeList = []
-        memList  = []
+        if jobDbConn is None:
+            return(None)
 
         if self.jobFirstLoad:
             common.printWarning('*Warning*: It is the first time loading job database, it may cost a little time ...')
             self.jobFirstLoad = False
 
         print('Getting history of job memory usage for job "' + str(job) + '".')
-        tableName = 'job_' + str(job)
-        dataDic = sqlite3_common.getSqlTableData(self.jobDbFile, self.jobDbConn, tableName, ['sampleTime', 'mem'])
+        dataDic = sqlite3_common.getJobSampleData(jobDbFile, jobDbConn, job, ['sample_time', 'mem'])
+        jobDbConn.close()
 
         if not dataDic:
             common.printWarning('*Warning*: job information is missing for "' + str(job) + '".')
-            return
-        else:
-            runTimeList = dataDic['sampleTime']
-            memList = dataDic['mem']
-            realRunTimeList = []
-            realMemList = []
-            firstRunTime = datetime.datetime.strptime(str(runTimeList[0]), '%Y%m%d_%H%M%S').timestamp()
-
-            for i in range(len(runTimeList)):
-                runTime = runTimeList[i]
-                currentRunTime = datetime.datetime.strptime(str(runTime), '%Y%m%d_%H%M%S').timestamp()
-                realRunTime = int((currentRunTime-firstRunTime)/60)
-                realRunTimeList.append(realRunTime)
-                mem = memList[i]
-                if mem == '':
-                     mem = '0'
-                realMem = round(int(mem)/1024, 1)
-                realMemList.append(realMem)
+            return(None)
 
-            memCurveFig = str(config.tmpPath) + '/' + str(self.user) + '_' + str(job) + '.png'
-            jobNum = common.stringToInt(job)
+        # sample_time is epoch seconds, mem unit is G (None for the missing value).
+        runTimeList = dataDic['sample_time']
+        memList = dataDic['mem']
+        firstRunTime = runTimeList[0]
+        realRunTimeList = [int((runTime-firstRunTime)/60) for runTime in runTimeList]
+        realMemList = [round(mem or 0, 1) for mem in memList]
+        (realRunTimeList, [realMemList]) = downsample_common.downsampleCurves(realRunTimeList, [realMemList], curveMaxPoints)
 
-            print('Save job memory curve as "' + str(memCurveFig) + '".')
-            common.drawPlot(realRunTimeList, realMemList, 'runTime (Minitu)', 'memory (G)', yUnit='G', title='job : ' + str(job), saveName=memCurveFig, figureNum=jobNum)
+        return(realRunTimeList, realMemList)
 
-        if self.jobDbFileConnectResult == 'passed':
-            self.jobDbConn.close()
-
-    def drawQueueJobNumCurve(self, queue):
+    def getQueueJobNumCurveData(self, queue):
         """
-        Draw (PEND/RUN) job number curve for specified queue.
+        Get the (PEND/RUN) job number curve data (daily average of the last 15 sampled dates) of the specified queue, return (dateList, pendList, runList), None if the queue information is missing.
         """
-        if self.queueDbFileConnectResult == 'failed':
-            common.printWarning('*Warning*: Failed on connectiong queue database file "' + str(self.queueDbFile) + '".')
-            return
+        queueDbConn = self.connectDbFile(self.queueDbFile)
+
+        if queueDbConn is None:
+            return(None)
 
         dateList = []
         pendList = []
@@ -106,51 +102,98 @@ class drawCurve():
 
         print('Getting history of queue PEND/RUN job number for queue "' + str(queue) + '".')
         tableName = 'queue_' + str(queue)
-        dataDic = sqlite3_common.getSqlTableData(self.queueDbFile, self.queueDbConn, tableName, ['sampleTime', 'PEND', 'RUN'])
+
+        # Only read the samples of the last 15 sampled dates (the dates without samples are skipped), sampleTime is epoch seconds
+        # (the primary key), so walk back date by date with the last sample before every date.
+        beginSeconds = None
+        lastDataDic = sqlite3_common.getSqlTableData(self.queueDbFile, queueDbConn, tableName, ['sampleTime'], limit=1, tail=True)
+
+        for i in range(15):
+            if not lastDataDic:
+                break
+
+            beginSeconds = int(time.mktime(datetime.date.fromtimestamp(lastDataDic['sampleTime'][0]).timetuple()))
+            lastDataDic = sqlite3_common.getSqlTableData(self.queueDbFile, queueDbConn, tableName, ['sampleTime'], limit=1, rangeKey='sampleTime', rangeEnd=beginSeconds-1, tail=True)
+
+        if beginSeconds is None:
+            dataDic = {}
+        else:
+            dataDic = sqlite3_common.getSqlTableData(self.queueDbFile, queueDbConn, tableName, ['sampleTime', 'PEND', 'RUN'], rangeKey='sampleTime', rangeBegin=beginSeconds, orderKey='sampleTime')
+
+        queueDbConn.close()
 
         if not dataDic:
             common.printWarning('*Warning*: queue information is missing for "' + str(queue) + '".')
-            return
-        else:
-            origSampleTimeList = dataDic['sampleTime']
-            origPendList = dataDic['PEND']
-            origRunList = dataDic['RUN']
-
-            for i in range(len(origSampleTimeList)):
-                sampleTime = origSampleTimeList[i]
-                date = re.sub('_.*', '', sampleTime)
-                pendNum = origPendList[i]
-                runNum = origRunList[i]
-
-                if (i != 0) and ((i == len(origSampleTimeList)-1) or (date not in dateList)):
-                    pendAvg = int(sum(tmpPendList)/len(tmpPendList))
-                    pendList.append(pendAvg)
-                    runAvg = int(sum(tmpRunList)/len(tmpRunList))
-                    runList.append(runAvg)
-
-                if date not in dateList:
-                    dateList.append(date)
-                    tmpPendList = []
-                    tmpRunList = []
-
-                tmpPendList.append(int(pendNum))
-                tmpRunList.append(int(runNum))
-
-            # Cut dateList/pendList/runList, only save 15 days result.a
-            if len(dateList) > 15:
-                dateList = dateList[-15:]
-                pendList = pendList[-15:]
-                runList = runList[-15:]
-
-            if len(dateList) == 0:
-                common.printWarning('*Warning*: PEND/RUN job number information is missing for queue "' + str(queue) + '".')
-                return
-            else:
-                queueJobNumCurveFig = str(config.tmpPath) + '/' + str(self.user) + '_' + str(queue) + '_jobNum.png'
-                queueNum = common.stringToInt(queue)
-
-                print('Save queue PEND/RUN job numeber curve as "' + str(queueJobNumCurveFig) + '".')
-                common.drawPlots(dateList, [pendList, runList], 'DATE', 'NUM', ['PEND', 'RUN'], xIsString=True, title='queue : ' + str(queue), saveName=queueJobNumCurveFig, figureNum=queueNum)
+            return(None)
+
+        origSampleTimeList = dataDic['sampleTime']
+        origPendList = dataDic['PEND']
+        origRunList = dataDic['RUN']
+        nextDateSeconds = 0
+
+        for i in range(len(origSampleTimeList)):
+            sampleTime = origSampleTimeList[i]
+
+            # The samples are ordered by sampleTime, only switch sampleTime into date on the first sample of a day.
+            if sampleTime >= nextDateSeconds:
+                sampleDate = datetime.date.fromtimestamp(sampleTime)
+                date = sampleDate.strftime('%Y%m%d')
+                nextDateSeconds = int(time.mktime((sampleDate + datetime.timedelta(days=1)).timetuple()))
+
+            pendNum = origPendList[i] or 0
+            runNum = origRunList[i] or 0
+
+            if (i != 0) and ((i == len(origSampleTimeList)-1) or (date not in dateList)):
+                pendAvg = int(sum(tmpPendList)/len(tmpPendList))
+                pendList.append(pendAvg)
+                runAvg = int(sum(tmpRunList)/len(tmpRunList))
+                runList.append(runAvg)
+
+            if date not in dateList:
+                dateList.append(date)
+                tmpPendList = []
+                tmpRunList = []
+
+            tmpPendList.append(int(pendNum))
+            tmpRunList.append(int(runNum))
+
+        # Cut dateList/pendList/runList, only save 15 days result.a
+        if len(dateList) > 15:
+            dateList = dateList[-15:]
+            pendList = pendList[-15:]
+            runList = runList[-15:]
+
+        if len(dateList) == 0:
+            common.printWarning('*Warning*: PEND/RUN job number information is missing for queue "' + str(queue) + '".')
+            return(None)
+
+        return(dateList, pendList, runList)
+
+    def drawJobMemCurve(self, job):
+        """
+        Draw memory usage curve for specified job, save it as png picture under tmpPath.
+        """
+        curveData = self.getJobMemCurveData(job)
+
+        if curveData is not None:
+            (realRunTimeList, realMemList) = curveData
+            memCurveFig = str(config.tmpPath) + '/' + str(self.user) + '_' + str(job) + '.png'
+
+            print('Save job memory curve as "' + str(memCurveFig) + '".')
+            common.drawPlot(realRunTimeList, realMemList, 'runTime (Minitu)', 'memory (G)', yUnit='G', title='job : ' + str(job), saveName=memCurveFig)
+
+    def drawQueueJobNumCurve(self, queue):
+        """
+        Draw (PEND/RUN) job number curve for specified queue, save it as png picture under tmpPath.
+        """
+        curveData = self.getQueueJobNumCurveData(queue)
+
+        if curveData is not None:
+            (dateList, pendList, runList) = curveData
+            queueJobNumCurveFig = str(config.tmpPath) + '/' + str(self.user) + '_' + str(queue) + '_jobNum.png'
+
+            print('Save queue PEND/RUN job numeber curve as "' + str(queueJobNumCurveFig) + '".')
+            common.drawPlots(dateList, [pendList, runList], 'DATE', 'NUM', ['PEND', 'RUN'], xIsString=True, title='queue : ' + str(queue), saveName=queueJobNumCurveFig)
 
 #################
 # Main Function #
@@ -4,12 +4,14 @@
 import os
 import re
 import sys
+import math
 import stat
 import copy
+import time
 import getpass
-from PyQt5.QtWidgets import QApplication, QWidget, QMainWindow, QAction, qApp, QTextEdit, QTabWidget, QFrame, QGridLayout, QTableWidget, QTableWidgetItem, QPushButton, QLabel, QMessageBox, QLineEdit, QComboBox
-from PyQt5.QtGui import QPixmap, QBrush, QFont
-from PyQt5.QtCore import Qt
+import collections
+from PyQt5.QtWidgets import QApplication, QWidget, QMainWindow, QAction, qApp, QTextEdit, QTabWidget, QFrame, QGridLayout, QTableView, QPushButton, QLabel, QMessageBox, QLineEdit, QComboBox, QProgressBar
+from PyQt5.QtCore import QTimer
 
 sys.path.append('MONITORPATH')
 from common import common
@@ -29,6 +31,34 @@ if 'XDG_RUNTIME_DIR' not in os.environ:
         os.makedirs(os.environ['XDG_RUNTIME_DIR'])
     os.chmod(os.environ['XDG_RUNTIME_DIR'], stat.S_IRWXU+stat.S_IRWXG+stat.S_IRWXO)
 
+def memToG(mem):
+    """
+    Switch the memory (unit is M) into G, None for the missing value.
+    """
+    if mem is None:
+        return(None)
+
+    return(round(mem/1024, 1))
+
+# The table columns (header, valueFunction, displayFunction) of the JOBS/HOSTS/QUEUES tabs, see pyqt5_common.tableModel.
+# JOBS record is jobRecord, HOSTS record is (host, status, queues, njobs, ncpus, ut, mem, maxmem, swp, maxswp), QUEUES record is (queue, pend, run).
+jobsTabColumnList = [
+                     ('Job', lambda record: record.jobId, None),
+                     ('User', lambda record: record.user, None),
+                     ('Status', lambda record: record.status, None),
+                     ('Queue', lambda record: record.queue, None),
+                     ('Host', lambda record: record.startedOn, None),
+                     ('Started', lambda record: record.startedTime, openlava_common.secondsToBjobsTime),
+                     ('Project', lambda record: record.project, None),
+                     ('Processers', lambda record: record.processorsRequested, None),
+                     ('cpuTime', lambda record: record.cpuTime, None),
+                     ('Rusage (G)', lambda record: memToG(record.rusageMem), None),
+                     ('Mem (G)', lambda record: memToG(record.mem), None),
+                     ('Command', lambda record: record.command, None),
+                    ]
+hostsTabColumnList = [(header, (lambda record, i=i: record[i]), None) for (i, header) in enumerate(['Host', 'Status', 'Queue', 'Njobs', 'Ncpus', 'Ut (%)', 'Mem (G)', 'Maxmem (G)', 'swp (G)', 'maxswp (G)'])]
+queuesTabColumnList = [(header, (lambda record, i=i: record[i]), None) for (i, header) in enumerate(['QUEUE', 'PEND', 'RUN'])]
+
 class mainWindow(QMainWindow):
     """
     Main window of openlavaMonitor.
@@ -37,20 +67,32 @@ class mainWindow(QMainWindow):
         super().__init__()
 
         self.myDrawCurve = bmonitor.drawCurve()
-        self.freshMark = False
+
+        # Auto fresh the tables every guiFreshInterval seconds (config.py), it can be switched on/off with "Setup -> Auto Fresh".
+        self.autoFreshInterval = max(1, int(getattr(config, 'guiFreshInterval', 60)))
+        self.autoFreshTimer = QTimer(self)
+        self.autoFreshTimer.timeout.connect(self.autoFresh)
+
+        # All of the openlava queries run on the background threads, the results are applied with queryLoaded.
+        self.queryLoader = pyqt5_common.queryLoader(self)
+        self.queryLoader.loaded.connect(self.queryLoaded)
+        self.queryLoader.failed.connect(self.queryFailed)
+        self.queryLoader.progress.connect(self.queryProgress)
+        self.queryLoader.busy.connect(self.queryBusy)
 
         self.initUI()
 
     def initUI(self):
         """
         Main process, draw the main graphic frame.
+        The queue/host lists and the tables are loaded on the background.
         """
-        self.queueList = openlava_common.getQueueList()
-        self.hostList = openlava_common.getHostList()
+        self.queueList = []
+        self.hostList = []
 
-        # Add menubar.
-        if not self.freshMark:
-            self.genMenubar()
+        # Add menubar and statusbar.
+        self.genMenubar()
+        self.genStatusbar()
 
         # Define main Tab widget
         self.mainTab = QTabWidget(self)
@@ -79,6 +121,8 @@ class mainWindow(QMainWindow):
         pyqt5_common.centerWindow(self)
         self.setWindowTitle('openlavaMonitor')
 
+        self.queryLoader.load('main', self.loadMainInfo)
+
     def genMenubar(self):
         """
         Generate menubar.
@@ -96,13 +140,54 @@ class mainWindow(QMainWindow):
         freshAction = QAction('Fresh', self)
         freshAction.triggered.connect(self.fresh)
 
+        autoFreshAction = QAction('Auto Fresh (' + str(self.autoFreshInterval) + 's)', self)
+        autoFreshAction.setCheckable(True)
+        autoFreshAction.toggled.connect(self.setAutoFresh)
+
         setupMenu = menubar.addMenu('Setup')
         setupMenu.addAction(freshAction)
+        setupMenu.addAction(autoFreshAction)
+
+        if getattr(config, 'guiAutoFresh', False):
+            autoFreshAction.setChecked(True)
+
+    def genStatusbar(self):
+        """
+        Generate statusbar, show the loading status of the background queries.
+        """
+        self.statusLabel = QLabel('')
+        self.statusProgressBar = QProgressBar()
+        self.statusProgressBar.setRange(0, 0)
+        self.statusProgressBar.setMaximumWidth(150)
+        self.statusProgressBar.setVisible(False)
+
+        self.statusBar().addPermanentWidget(self.statusLabel)
+        self.statusBar().addPermanentWidget(self.statusProgressBar)
 
     def fresh(self):
+        """
+        Re-load the openlava status (the command cache is dropped), only the changed rows of the tables are updated.
+        """
         print('* Re-Loading openlava status, please wait a moment ...')
-        self.freshMark = True
-        self.initUI()
+        openlava_common.clearCommandCache()
+        self.queryLoader.load('main', self.loadMainInfo)
+
+    def setAutoFresh(self, enable):
+        """
+        Start/stop the auto fresh timer.
+        """
+        if enable:
+            print('* Auto fresh openlava status every ' + str(self.autoFreshInterval) + ' seconds.')
+            self.autoFreshTimer.start(self.autoFreshInterval*1000)
+        else:
+            self.autoFreshTimer.stop()
+
+    def autoFresh(self):
+        """
+        Re-load the openlava status with the command cache (see openlava_common.commandCacheTtlDic), skip it if the last loading is not finished.
+        """
+        if not self.queryLoader.isBusy():
+            self.queryLoader.load('main', self.loadMainInfo)
 
 ## Common sub-functions (begin) ##
     def guiWarning(self, warningMessage):
@@ -111,6 +196,104 @@ class mainWindow(QMainWindow):
         """
         common.printWarning(warningMessage)
         QMessageBox.warning(self, 'openlavaMonitor Warning', warningMessage)
+
+    def genTableView(self, parent, columnList, highlightFunction=None, keyFunction=None):
+        """
+        Generate the table view with a tableModel (columnList) and a sortFilterProxyModel, return (view, model, proxyModel).
+        """
+        tableView = QTableView(parent)
+        model = pyqt5_common.tableModel(columnList, highlightFunction, keyFunction, self)
+        proxyModel = pyqt5_common.sortFilterProxyModel(self)
+        proxyModel.setSourceModel(model)
+
+        tableView.setModel(proxyModel)
+        tableView.setShowGrid(True)
+
+        return(tableView, model, proxyModel)
+
+    def setComboText(self, combo, text):
+        """
+        Select the item of the combo with the text (if it exists), don't reload the table.
+        """
+        index = combo.findText(text)
+
+        if index >= 0:
+            combo.blockSignals(True)
+            combo.setCurrentIndex(index)
+            combo.blockSignals(False)
+
+    def showUpdateMessage(self, name, deltaTuple):
+        """
+        Show the (added, removed, changed) row numbers of the updated table on the statusbar.
+        """
+        (addedNum, removedNum, changedNum) = deltaTuple
+        message = str(name) + ' updated at ' + str(time.strftime('%H:%M:%S')) + ' (' + str(addedNum) + ' added, ' + str(removedNum) + ' removed, ' + str(changedNum) + ' changed)'
+        print('* ' + str(message) + '.')
+        self.statusBar().showMessage(message)
+
+    def queryLoaded(self, name, result):
+        """
+        Apply the result of the background query on the GUI thread.
+        """
+        if name == 'main':
+            self.updateMainInfo(result)
+        elif name == 'job':
+            self.updateJobTab(result)
+        elif name == 'jobs':
+            self.updateJobsTabTable(result)
+        elif name == 'hosts':
+            self.updateHostsTabTable(result)
+        elif name == 'queues':
+            self.updateQueuesTabTable(result)
+        elif name == 'jobMemCurve':
+            self.updateJobTabMemCurve(result)
+        elif name == 'queueInfo':
+            self.updateQueueTabFrame1(result)
+        elif name == 'queueJobNumCurve':
+            self.updateQueueTabJobNumCurve(result)
+
+    def queryFailed(self, name, message):
+        common.printError(message)
+        self.guiWarning('*Warning*: Failed on loading ' + str(name) + ' information, ' + str(message.strip().split('\n')[-1]))
+
+    def queryProgress(self, name, number):
+        self.statusLabel.setText('Loading ' + str(name) + ' information (' + str(number) + ') ...')
+
+    def queryBusy(self, number):
+        """
+        Show the busy progress bar while any query is running.
+        """
+        if number > 0:
+            self.statusLabel.setText('Loading openlava information ...')
+            self.statusProgressBar.setVisible(True)
+        else:
+            self.statusLabel.setText('')
+            self.statusProgressBar.setVisible(False)
+
+    def loadMainInfo(self, request):
+        return(openlava_common.getQueueList(), openlava_common.getHostList())
+
+    def updateMainInfo(self, result):
+        """
+        Update the queue/host lists, the combos and the tables which depend on them.
+        """
+        (self.queueList, self.hostList) = result
+
+        # Keep the current selections on re-loading.
+        jobsTabQueue = self.jobsTabQueueCombo.currentText()
+        jobsTabStartedOn = self.jobsTabStartedOnCombo.currentText()
+        hostsTabQueue = self.hostsTabQueueCombo.currentText()
+
+        self.setJobsTabQueueCombo()
+        self.setComboText(self.jobsTabQueueCombo, jobsTabQueue)
+        self.setJobsTabStartedOnCombo()
+        self.setComboText(self.jobsTabStartedOnCombo, jobsTabStartedOn)
+        self.setHostsTabQueueCombo()
+        self.setComboText(self.hostsTabQueueCombo, hostsTabQueue)
+
+        self.genJobsTabTable()
+        self.genHostsTabTable()
+        self.genQueuesTabTable()
 ## Common sub-functions (end) ##
 
 
@@ -246,12 +429,11 @@ class mainWindow(QMainWindow):
 
     def genJobTabFrame3(self):
         # self.jobTabFram3
-        self.jobTabMemCurveLabel = QLabel('Job memory curve', self.jobTabFrame3)
-        self.jobTabMemCurveLabel.setAlignment(Qt.AlignCenter)
+        self.jobTabMemCurveCanvas = pyqt5_common.curveCanvas('Job memory curve', self.jobTabFrame3)
 
         # self.jobTabFram3 - Grid
         jobTabFrame3Grid = QGridLayout()
-        jobTabFrame3Grid.addWidget(self.jobTabMemCurveLabel, 0, 0)
+        jobTabFrame3Grid.addWidget(self.jobTabMemCurveCanvas, 0, 0)
         self.jobTabFrame3.setLayout(jobTabFrame3Grid)
 
     def checkJob(self):
@@ -280,9 +462,21 @@ class mainWindow(QMainWindow):
 
         # Get job info
         print('Getting job information for job "' + str(self.currentJob) + '".')
-        self.jobInfoDic = openlava_common.getBjobsUfInfo(command='bjobs -UF ' + str(currentJob))
+        self.queryLoader.load('job', self.loadJobInfo, currentJob)
+
+    def loadJobInfo(self, request, job):
+        return(openlava_common.getBjobsUfInfo(command='bjobs -UF ' + str(job), keepJobInfo=True))
+
+    def updateJobTab(self, jobInfoDic):
+        """
+        Update the related frames with the job info.
+        """
+        self.jobInfoDic = jobInfoDic
+
+        if self.currentJob not in self.jobInfoDic:
+            self.guiWarning('*Warning*: Not find job "' + str(self.currentJob) + '".')
+            return
 
-        # Update the related frames with the job info.
         self.updateJobTabFrame1()
         self.updateJobTabFrame2()
         self.updateJobTabFrame3()
@@ -364,27 +558,34 @@ class mainWindow(QMainWindow):
         self.jobTabJobInfoText.clear()
 
         if not init:
-            self.jobTabJobInfoText.insertPlainText(self.jobInfoDic[self.currentJob]['jobInfo'])
+            self.jobTabJobInfoText.insertPlainText(self.jobInfoDic[self.currentJob].jobInfo)
             pyqt5_common.textEditVisiblePosition(self.jobTabJobInfoText, 'Start')
 
     def updateJobTabFrame3(self, init=False):
         """
-        Draw memory curve for current job, save the png picture and show it on self.jobTabFrame3.
+        Load the memory curve data of current job on the background thread, it is drawn on self.jobTabFrame3 with updateJobTabMemCurve.
         """
-        self.jobTabMemCurveLabel.setText('Job memory curve')
+        if init:
+            # Drop the curve of the last job which is still loading.
+            self.queryLoader.cancel('jobMemCurve')
+            self.jobTabMemCurveCanvas.clearCurves()
+        elif self.jobInfoDic[self.currentJob].status != 'PEND':
+            self.queryLoader.load('jobMemCurve', self.loadJobMemCurve, self.currentJob)
 
-        if not init:
-            if self.jobInfoDic[self.currentJob]['status'] != 'PEND':
-                # Generate memory curve with the specified job id
-                self.myDrawCurve.drawJobMemCurve(self.currentJob)
-                memCurveFig = str(config.tmpPath) + '/' + str(user) + '_' + str(self.currentJob) + '.png'
-
-                if os.path.exists(memCurveFig):
-                    pixMap = QPixmap(memCurveFig).scaled(self.jobTabMemCurveLabel.width(), self.jobTabMemCurveLabel.height())
-                    self.jobTabMemCurveLabel.setPixmap(pixMap)
-                else:
-                    warningMessage = '*Warning*: Not find memory curve fig "' + str(memCurveFig) + '".'
-                    self.guiWarning(warningMessage)
+    def loadJobMemCurve(self, request, job):
+        return(job, self.myDrawCurve.getJobMemCurveData(job))
+
+    def updateJobTabMemCurve(self, result):
+        """
+        Draw the job memory curve on self.jobTabMemCurveCanvas.
+        """
+        (job, curveData) = result
+
+        if curveData is None:
+            self.guiWarning('*Warning*: Not find memory curve data of job "' + str(job) + '".')
+        else:
+            (runTimeList, memList) = curveData
+            self.jobTabMemCurveCanvas.setCurves(runTimeList, [memList], 'runTime (Minitu)', 'memory (G)', title='job : ' + str(job), peakUnit='G', marker='o')
 ## For job TAB (end) ## 
 
 
@@ -398,8 +599,9 @@ class mainWindow(QMainWindow):
         self.jobsTabFrame0.setFrameShadow(QFrame.Raised)
         self.jobsTabFrame0.setFrameShape(QFrame.Box)
 
-        self.jobsTabTable = QTableWidget(self.jobsTab)
-        self.jobsTabTable.itemClicked.connect(self.jobsTabCheckClick)
+        (self.jobsTabTable, self.jobsTabModel, self.jobsTabProxyModel) = self.genTableView(self.jobsTab, jobsTabColumnList, keyFunction=lambda record: record.jobId)
+        self.jobsTabTable.setSortingEnabled(True)
+        self.jobsTabTable.clicked.connect(self.jobsTabCheckClick)
 
         # self.jobsTab - Grid
         jobsTabGrid = QGridLayout()
@@ -412,39 +614,47 @@ class mainWindow(QMainWindow):
 
         self.jobsTab.setLayout(jobsTabGrid)
 
-        # Generate sub-frame
+        # Generate sub-frame, the table is loaded after the queue/host lists (updateMainInfo).
         self.genJobsTabFrame0()
-        self.genJobsTabTable()
 
     def setJobsTabStatusCombo(self, statusList=['RUN', 'PEND', 'ALL']):
         """
         Set (initialize) self.jobsTabStatusCombo.
         """
+        # The caller reloads the table, don't reload it on every item change.
+        self.jobsTabStatusCombo.blockSignals(True)
         self.jobsTabStatusCombo.clear()
         for status in statusList:
             self.jobsTabStatusCombo.addItem(status)
+        self.jobsTabStatusCombo.blockSignals(False)
 
     def setJobsTabQueueCombo(self, queueList=[]):
         """
         Set (initialize) self.jobsTabQueueCombo.
         """
+        # The caller reloads the table, don't reload it on every item change.
+        self.jobsTabQueueCombo.blockSignals(True)
         self.jobsTabQueueCombo.clear()
         if len(queueList) == 0:
             queueList = copy.deepcopy(self.queueList)
             queueList.insert(0, 'ALL')
         for queue in queueList:
             self.jobsTabQueueCombo.addItem(queue)
+        self.jobsTabQueueCombo.blockSignals(False)
 
     def setJobsTabStartedOnCombo(self, hostList=[]):
         """
         Set (initialize) self.jobsTabStartedOnCombo.
         """
+        # The caller reloads the table, don't reload it on every item change.
+        self.jobsTabStartedOnCombo.blockSignals(True)
         self.jobsTabStartedOnCombo.clear()
         if len(hostList) == 0:
             hostList = copy.deepcopy(self.hostList)
             hostList.insert(0, 'ALL')
         for host in hostList:
             self.jobsTabStartedOnCombo.addItem(host)
+        self.jobsTabStartedOnCombo.blockSignals(False)
 
     def genJobsTabFrame0(self):
         # self.jobsTabFrame0
@@ -495,11 +705,6 @@ class mainWindow(QMainWindow):
         self.jobsTabFrame0.setLayout(jobsTabFrame0Grid)
 
     def genJobsTabTable(self):
-        self.jobsTabTable.setShowGrid(True)
-        self.jobsTabTable.setSortingEnabled(True)
-        self.jobsTabTable.setColumnCount(12)
-        self.jobsTabTable.setHorizontalHeaderLabels(['Job', 'User', 'Status', 'Queue', 'Host', 'Started', 'Project', 'Processers', 'cpuTime', 'Rusage (G)', 'Mem (G)', 'Command'])
-
         command = 'bjobs -UF '
         user = self.jobsTabUserLine.text().strip()
 
@@ -527,86 +732,44 @@ class mainWindow(QMainWindow):
         if startedOn != 'ALL':
             command = str(command) + ' -m ' + str(startedOn)
 
-        jobDic = openlava_common.getBjobsUfInfo(command)
-
-        self.jobsTabTable.setRowCount(len(jobDic.keys()))
-        jobs = list(jobDic.keys())
-
-        for i in range(len(jobs)):
-            job = jobs[i]
-            j = 0
-            self.jobsTabTable.setItem(i, j, QTableWidgetItem(job))
-
-            j = j+1
-            item = QTableWidgetItem()
-            item.setText(jobDic[job]['user'])
-            self.jobsTabTable.setItem(i, j, item)
-
-            j = j+1
-            item = QTableWidgetItem()
-            item.setText(jobDic[job]['status'])
-            self.jobsTabTable.setItem(i, j, item)
-
-            j = j+1
-            item = QTableWidgetItem()
-            item.setText(jobDic[job]['queue'])
-            self.jobsTabTable.setItem(i, j, item)
-
-            j = j+1
-            item = QTableWidgetItem()
-            item.setText(jobDic[job]['startedOn'])
-            self.jobsTabTable.setItem(i, j, item)
-
-            j = j+1
-            item = QTableWidgetItem()
-            item.setText(jobDic[job]['startedTime'])
-            self.jobsTabTable.setItem(i, j, item)
-
-            j = j+1
-            if str(jobDic[job]['project']) != '':
-                item = QTableWidgetItem()
-                item.setData(Qt.DisplayRole, jobDic[job]['project'])
-                self.jobsTabTable.setItem(i, j, item)
-
-            j = j+1
-            if str(jobDic[job]['processorsRequested']) != '':
-                item = QTableWidgetItem()
-                item.setData(Qt.DisplayRole, int(jobDic[job]['processorsRequested']))
-                self.jobsTabTable.setItem(i, j, item)
-
-            j = j+1
-            if str(jobDic[job]['cpuTime']) != '':
-                item = QTableWidgetItem()
-                item.setData(Qt.DisplayRole, int(jobDic[job]['cpuTime']))
-                self.jobsTabTable.setItem(i, j, item)
-
-            j = j+1
-            if str(jobDic[job]['rusageMem']) != '':
-                item = QTableWidgetItem()
-                rusageMemValue = round(int(jobDic[job]['rusageMem'])/1024, 1)
-                item.setData(Qt.DisplayRole, rusageMemValue)
-                self.jobsTabTable.setItem(i, j, item)
-
-            j = j+1
-            if str(jobDic[job]['mem']) != '':
-                item = QTableWidgetItem()
-                memValue = round(int(jobDic[job]['mem'])/1024, 1)
-                item.setData(Qt.DisplayRole, memValue)
-                self.jobsTabTable.setItem(i, j, item)
-
-            j = j+1
-            item = QTableWidgetItem()
-            item.setText(jobDic[job]['command'])
-            self.jobsTabTable.setItem(i, j, item)
-
-    def jobsTabCheckClick(self, item=None):
+        self.queryLoader.load('jobs', self.loadJobsInfo, command)
+
+    def loadJobsInfo(self, request, command):
+        """
+        Get the jobs info with command "bjobs -UF ...", stop if the request is superseded by a new one.
+        """
+        jobDic = collections.OrderedDict()
+        jobIter = openlava_common.iterBjobsUfInfo(command)
+
+        try:
+            for (job, myJobRecord) in jobIter:
+                if request.isCanceled():
+                    return(None)
+
+                jobDic[job] = myJobRecord
+
+                if len(jobDic)%1000 == 0:
+                    request.setProgress(len(jobDic))
+        finally:
+            # Stop the bjobs command if the request is canceled.
+            jobIter.close()
+
+        return(jobDic)
+
+    def updateJobsTabTable(self, jobDic):
+        """
+        Show the jobs info on self.jobsTabTable, the view only reads the visible rows from the model.
+        Only the added/removed/changed jobs are updated on the model.
+        """
+        self.showUpdateMessage('JOBS', self.jobsTabModel.updateRecords(jobDic.values()))
+
+    def jobsTabCheckClick(self, index=None):
         """
         With the clicked job, jump the the job Tab, show the job related infos.
         """
-        if item != None:
-            if item.column() == 0:
-                currentRow = self.jobsTabTable.currentRow()
-                job = self.jobsTabTable.item(currentRow, 0).text().strip()
+        if (index != None) and index.isValid():
+            if index.column() == 0:
+                job = self.jobsTabProxyModel.getRecord(index).jobId
                 if job != '':
                     self.jobTabJobLine.setText(job)
                     self.checkJob()
@@ -624,8 +787,9 @@ class mainWindow(QMainWindow):
         self.hostsTabFrame0.setFrameShadow(QFrame.Raised)
         self.hostsTabFrame0.setFrameShape(QFrame.Box)
 
-        self.hostsTabTable = QTableWidget(self.hostsTab)
-        self.hostsTabTable.itemClicked.connect(self.hostsTabCheckClick)
+        (self.hostsTabTable, self.hostsTabModel, self.hostsTabProxyModel) = self.genTableView(self.hostsTab, hostsTabColumnList, lambda record, column: (column == 1) and (record[1] == 'closed'), lambda record: record[0])
+        self.hostsTabTable.setSortingEnabled(True)
+        self.hostsTabTable.clicked.connect(self.hostsTabCheckClick)
 
         # self.hostsTabTable - Grid
         hostsTabGrid = QGridLayout()
@@ -638,20 +802,22 @@ class mainWindow(QMainWindow):
 
         self.hostsTab.setLayout(hostsTabGrid)
 
-        # Generate sub-fram
+        # Generate sub-fram, the table is loaded after the host list (updateMainInfo).
         self.genHostsTabFrame0()
-        self.genHostsTabTable()
 
     def setHostsTabQueueCombo(self, queueList=[]):
         """
         Set (initialize) self.hostsTabQueueCombo.
         """
+        # The caller reloads the table, don't reload it on every item change.
+        self.hostsTabQueueCombo.blockSignals(True)
         self.hostsTabQueueCombo.clear()
         if len(queueList) == 0:
             queueList = copy.deepcopy(self.queueList)
             queueList.insert(0, 'ALL')
         for queue in queueList:
             self.hostsTabQueueCombo.addItem(queue)
+        self.hostsTabQueueCombo.blockSignals(False)
 
     def genHostsTabFrame0(self):
         # self.hostsTabFrame0
@@ -659,7 +825,7 @@ class mainWindow(QMainWindow):
         hostsTabQueueLabel.setStyleSheet("font-weight: bold;")
         self.hostsTabQueueCombo = QComboBox(self.hostsTabFrame0)
         self.setHostsTabQueueCombo()
-        self.hostsTabQueueCombo.currentIndexChanged.connect(self.genHostsTabTable)
+        self.hostsTabQueueCombo.currentIndexChanged.connect(self.filterHostsTabTable)
         hostsTabEmptyLabel = QLabel('')
 
         # self.hostsTabFrame0 - Grid
@@ -677,160 +843,85 @@ class mainWindow(QMainWindow):
 
     def genHostsTabTable(self):
         print('* Updating hosts information, please wait a moment ...')
+        self.queryLoader.load('hosts', self.loadHostsInfo)
 
-        self.hostsTabTable.setShowGrid(True)
-        self.hostsTabTable.setSortingEnabled(True)
-        self.hostsTabTable.setColumnCount(10)
-        self.hostsTabTable.setHorizontalHeaderLabels(['Host', 'Status', 'Queue', 'Njobs', 'Ncpus', 'Ut (%)', 'Mem (G)', 'Maxmem (G)', 'swp (G)', 'maxswp (G)'])
-
-        queue = self.hostsTabQueueCombo.currentText().strip()
-
+    def loadHostsInfo(self, request):
+        """
+        Get the hosts info records (see hostsTabColumnList) of all of the hosts.
+        """
         bhostsDic  = openlava_common.getBhostsInfo()
         lshostsDic = openlava_common.getLshostsInfo()
         lsloadDic  = openlava_common.getLsloadInfo()
         hostQueueDic = openlava_common.getHostQueueInfo()
+        hostRecordList = []
+
+        for host in bhostsDic.get('HOST_NAME', []):
+            status = bhostsDic.getValue('STATUS', host)
+            queues = ' '.join(hostQueueDic.get(host, []))
+            njobs = int(self.getHostsTabNumericValue(bhostsDic, 'NJOBS', host))
+            ncpus = int(self.getHostsTabNumericValue(lshostsDic, 'ncpus', host))
+            ut = int(self.getHostsTabNumericValue(lsloadDic, 'ut', host))
+            mem = int(self.getHostsTabNumericValue(lsloadDic, 'mem', host)/1024)
+            maxmem = int(self.getHostsTabNumericValue(lshostsDic, 'maxmem', host)/1024)
+            swp = int(self.getHostsTabNumericValue(lsloadDic, 'swp', host)/1024)
+            maxswp = int(self.getHostsTabNumericValue(lshostsDic, 'maxswp', host)/1024)
 
-        # Get expected host list
-        self.queueHostList = []
+            hostRecordList.append((host, status, queues, njobs, ncpus, ut, mem, maxmem, swp, maxswp))
+
+        return(hostRecordList)
+
+    def updateHostsTabTable(self, hostRecordList):
+        """
+        Show the hosts info on self.hostsTabTable.
+        """
+        self.showUpdateMessage('HOSTS', self.hostsTabModel.updateRecords(hostRecordList))
+        self.filterHostsTabTable()
+
+    def filterHostsTabTable(self):
+        """
+        Only show the hosts of the selected queue, filter the model rows instead of re-loading the hosts info.
+        """
+        queue = self.hostsTabQueueCombo.currentText().strip()
 
         if queue == 'ALL':
-            self.queueHostList = self.hostList
+            self.hostsTabProxyModel.setFilterFunction(None)
         else:
-            for host in self.hostList:
-                if host in hostQueueDic:
-                    if queue in hostQueueDic[host]:
-                        self.queueHostList.append(host)
-
-        self.hostsTabTable.setRowCount(len(self.queueHostList))
-
-        for i in range(len(self.queueHostList)):
-            host = self.queueHostList[i]
-
-            j = 0
-            self.hostsTabTable.setItem(i, j, QTableWidgetItem(host))
-
-            j = j+1
-            index = bhostsDic['HOST_NAME'].index(host)
-            status = bhostsDic['STATUS'][index]
-            item = QTableWidgetItem(status)
-            if str(status) == 'closed':
-                item.setFont(QFont('song', 10, QFont.Bold))
-                item.setForeground(QBrush(Qt.red))
-            self.hostsTabTable.setItem(i, j, item)
-
-            j = j+1
-            if host in hostQueueDic.keys():
-                queues = ' '.join(hostQueueDic[host])
-                item = QTableWidgetItem(queues)
-                self.hostsTabTable.setItem(i, j, item)
-
-            j = j+1
-            index = bhostsDic['HOST_NAME'].index(host)
-            njobs = bhostsDic['NJOBS'][index]
-            if not re.match('^[0-9]+$', njobs):
-                common.printWarning('*Warning*: host(' + str(host) + ') NJOBS info "' + str(njobs) + '": invalid value, reset it to "0".')
-                njobs = 0
-            item = QTableWidgetItem()
-            item.setData(Qt.DisplayRole, int(njobs))
-            self.hostsTabTable.setItem(i, j, item)
-
-            j = j+1
-            index = lshostsDic['HOST_NAME'].index(host)
-            ncpus = lshostsDic['ncpus'][index]
-            if not re.match('^[0-9]+$', ncpus):
-                common.printWarning('*Warning*: host(' + str(host) + ') ncpus info "' + str(ncpus) + '": invalid value, reset it to "0".')
-                ncpus = 0
-            item = QTableWidgetItem()
-            item.setData(Qt.DisplayRole, int(ncpus))
-            self.hostsTabTable.setItem(i, j, item)
-
-            j = j+1
-            index = lsloadDic['HOST_NAME'].index(host)
-            ut = lsloadDic['ut'][index]
-            ut = re.sub('%', '', ut)
-            if not re.match('^[0-9]+$', ut):
-                common.printWarning('*Warning*: host(' + str(host) + ') ut info "' + str(ut) + '": invalid value, reset it to "0".')
-                ut = 0
-            item = QTableWidgetItem()
-            item.setData(Qt.DisplayRole, int(ut))
-            self.hostsTabTable.setItem(i, j, item)
-
-            j = j+1
-            index = lsloadDic['HOST_NAME'].index(host)
-            mem = lsloadDic['mem'][index]
-            if re.search('M', mem):
-                mem = re.sub('M', '', mem)
-                mem = int(mem)/1024
-            elif re.search('G', mem):
-                mem = re.sub('G', '', mem)
-            else:
-                common.printWarning('*Warning*: host(' + str(host) + ') mem info "' + str(mem) + '": unrecognized unit, reset it to "0".')
-                mem = 0
-            item = QTableWidgetItem()
-            item.setData(Qt.DisplayRole, int(mem))
-            self.hostsTabTable.setItem(i, j, item)
-
-            j = j+1
-            index = lshostsDic['HOST_NAME'].index(host)
-            maxmem = lshostsDic['maxmem'][index]
-            if re.search('M', maxmem):
-                maxmem = re.sub('M', '', maxmem)
-                maxmem = int(maxmem)/1024
-            elif re.search('G', maxmem):
-                maxmem = re.sub('G', '', maxmem)
-            else:
-                common.printWarning('*Warning*: host(' + str(host) + ') maxmem info "' + str(maxmem) + '": unrecognized unit, reset it to "0".')
-                maxmem = 0
-            item = QTableWidgetItem()
-            item.setData(Qt.DisplayRole, int(maxmem))
-            self.hostsTabTable.setItem(i, j, item)
-
-            j = j+1
-            index = lsloadDic['HOST_NAME'].index(host)
-            swp = lsloadDic['swp'][index]
-            if re.search('M', swp):
-                swp = re.sub('M', '', swp)
-                swp = int(swp)/1024
-            elif re.search('G', swp):
-                swp = re.sub('G', '', swp)
-            else:
-                common.printWarning('*Warning*: host(' + str(host) + ') swp info "' + str(swp) + '": unrecognized unit, reset it to "0".')
-                swp = 0
-            item = QTableWidgetItem()
-            item.setData(Qt.DisplayRole, int(swp))
-            self.hostsTabTable.setItem(i, j, item)
-
-            j = j+1
-            index = lshostsDic['HOST_NAME'].index(host)
-            maxswp = lshostsDic['maxswp'][index]
-            if re.search('M', maxswp):
-                maxswp = re.sub('M', '', maxswp)
-                maxswp = int(maxswp)/1024
-            elif re.search('G', maxswp):
-                maxswp = re.sub('G', '', maxswp)
-            else:
-                common.printWarning('*Warning*: host(' + str(host) + ') maxswp info "' + str(maxswp) + '": unrecognized unit, reset it to "0".')
-                maxswp = 0
-            item = QTableWidgetItem()
-            item.setData(Qt.DisplayRole, int(maxswp))
-            self.hostsTabTable.setItem(i, j, item)
-
-    def hostsTabCheckClick(self, item=None):
+            self.hostsTabProxyModel.setFilterFunction(lambda record: queue in record[2].split())
+
+    def getHostsTabQueueHostList(self):
+        """
+        Get the hosts which are shown on self.hostsTabTable.
+        """
+        return([self.hostsTabProxyModel.getRecord(self.hostsTabProxyModel.index(row, 0))[0] for row in range(self.hostsTabProxyModel.rowCount())])
+
+    def getHostsTabNumericValue(self, commandDic, key, host):
+        """
+        Get the numeric host value (memory size is in M) from bhosts/lshosts/lsload commandTable, reset the invalid value to "0".
+        """
+        value = commandDic.getNumericValue(key, host)
+
+        if math.isnan(value):
+            common.printWarning('*Warning*: host(' + str(host) + ') ' + str(key) + ' info "' + str(commandDic.getValue(key, host)) + '": invalid value, reset it to "0".')
+            value = 0
+
+        return(value)
+
+    def hostsTabCheckClick(self, index=None):
         """
         If click the host name (or Njobs number), jump to the jobs Tab and show the host related jobs.
         """
-        if item != None:
-            currentRow = self.hostsTabTable.currentRow()
-            host = self.hostsTabTable.item(currentRow, 0).text().strip()
-            njobsNum = self.hostsTabTable.item(currentRow, 3).text().strip()
+        if (index != None) and index.isValid():
+            hostRecord = self.hostsTabProxyModel.getRecord(index)
+            host = hostRecord[0]
+            njobsNum = hostRecord[3]
 
-            if (item.column() == 0) or (item.column() == 3):
-                if int(njobsNum) > 0:
+            if (index.column() == 0) or (index.column() == 3):
+                if njobsNum > 0:
                     self.jobsTabUserLine.setText('')
                     self.setJobsTabStatusCombo()
                     self.setJobsTabQueueCombo()
 
-                    hostList = copy.deepcopy(self.queueHostList)
+                    hostList = self.getHostsTabQueueHostList()
                     hostList.remove(host)
                     hostList.insert(0, host)
                     hostList.insert(1, 'ALL')
@@ -852,8 +943,11 @@ class mainWindow(QMainWindow):
         self.bqueuesFilesDic = {}
 
         # self.queuesTab
-        self.queuesTabTable = QTableWidget(self.queuesTab)
-        self.queuesTabTable.itemClicked.connect(self.queuesTabCheckClick)
+        (self.queuesTabTable, self.queuesTabModel, self.queuesTabProxyModel) = self.genTableView(self.queuesTab, queuesTabColumnList, lambda record, column: (column == 1) and (record[1] > 0), lambda record: record[0])
+        self.queuesTabTable.clicked.connect(self.queuesTabCheckClick)
+
+        # Hide the vertical header
+        self.queuesTabTable.verticalHeader().setVisible(False)
 
         self.queuesTabFrame0 = QFrame(self.queuesTab)
         self.queuesTabFrame0.setFrameShadow(QFrame.Raised)
@@ -882,64 +976,55 @@ class mainWindow(QMainWindow):
 
         self.queuesTab.setLayout(queuesTabGrid)
 
-        # Generate sub-frame
-        self.genQueuesTabTable()
+        # Generate sub-frame, the table is loaded after the queue list (updateMainInfo).
         self.genQueuesTabFrame0()
         self.genQueuesTabFrame1()
 
     def genQueuesTabTable(self):
-        self.queuesTabTable.setShowGrid(True)
-        self.queuesTabTable.setColumnCount(3)
-        self.queuesTabTable.setHorizontalHeaderLabels(['QUEUE', 'PEND', 'RUN'])
-
-        # Hide the vertical header
-        self.queuesTabTable.verticalHeader().setVisible(False)
+        self.queryLoader.load('queues', self.loadQueuesInfo)
 
+    def loadQueuesInfo(self, request):
+        """
+        Get the queue records (queue, pend, run) of all of the queues, and the sum record ('ALL', pend, run).
+        """
         queuesDic = openlava_common.getBqueuesInfo()
-        self.queuesTabTable.setRowCount(len(self.queueList)+1)
-        queueList = copy.deepcopy(self.queueList)
-        queueList.append('ALL')
+        queueRecordList = []
         pendSum = 0
         runSum = 0
 
-        for i in range(len(queueList)):
-            queue = queueList[i]
-            if i < len(queueList)-1:
-                index = queuesDic['QUEUE_NAME'].index(queue)
-
-            j = 0
-            item = QTableWidgetItem(queue)
-            self.queuesTabTable.setItem(i, j, item)
-
-            j = j+1
-            if i == len(queueList)-1:
-                pend = str(pendSum)
-            else:
-                pend = queuesDic['PEND'][index]
-                pendSum += int(pend)
-            item = QTableWidgetItem(pend)
-            if int(pend) > 0:
-                item.setFont(QFont('song', 10, QFont.Bold))
-                item.setForeground(QBrush(Qt.red))
-            self.queuesTabTable.setItem(i, j, item)
-
-            j = j+1
-            if i == len(queueList)-1:
-                run = str(runSum)
-            else:
-                run = queuesDic['RUN'][index]
-                runSum += int(run)
-            item = QTableWidgetItem(run)
-            self.queuesTabTable.setItem(i, j, item)
+        for queue in self.queueList:
+            index = queuesDic.getRow(queue)
+
+            if index is None:
+                continue
+
+            pend = int(queuesDic['PEND'][index])
+            run = int(queuesDic['RUN'][index])
+            pendSum += pend
+            runSum += run
+            queueRecordList.append((queue, pend, run))
+
+        queueRecordList.append(('ALL', pendSum, runSum))
+
+        return(queueRecordList)
+
+    def updateQueuesTabTable(self, queueRecordList):
+        """
+        Show the queues PEND/RUN job number on self.queuesTabTable.
+        """
+        # The queue rows are only added/removed on the queue configuration change, reset the table then, so 'ALL' is always the last row.
+        if [record[0] for record in queueRecordList] != [self.queuesTabModel.getRecord(row)[0] for row in range(self.queuesTabModel.rowCount())]:
+            self.queuesTabModel.setRecords(queueRecordList)
+        else:
+            self.showUpdateMessage('QUEUES', self.queuesTabModel.updateRecords(queueRecordList))
 
     def genQueuesTabFrame0(self):
         # self.queuesTabFrame0
-        self.queuesTabJobNumCurveLabel = QLabel('queue (PEND/RUN) job number curve', self.queuesTabFrame0)
-        self.queuesTabJobNumCurveLabel.setAlignment(Qt.AlignCenter)
+        self.queuesTabJobNumCurveCanvas = pyqt5_common.curveCanvas('queue (PEND/RUN) job number curve', self.queuesTabFrame0)
 
         # self.queuesTabFrame0 - Grid
         queuesTabFrame0Grid = QGridLayout()
-        queuesTabFrame0Grid.addWidget(self.queuesTabJobNumCurveLabel, 0, 0)
+        queuesTabFrame0Grid.addWidget(self.queuesTabJobNumCurveCanvas, 0, 0)
         self.queuesTabFrame0.setLayout(queuesTabFrame0Grid)
 
     def genQueuesTabFrame1(self):
@@ -951,24 +1036,21 @@ class mainWindow(QMainWindow):
         queuesTabFrame1Grid.addWidget(self.queuesTabText, 0, 0)
         self.queuesTabFrame1.setLayout(queuesTabFrame1Grid)
 
-    def queuesTabCheckClick(self, item=None):
+    def queuesTabCheckClick(self, index=None):
         """
         If click the queue name, jump to the jobs Tab and show the queue related jobs.
         If click the PEND number, jump the jobs Tab and show the queue PEND related jobs.
         If click the RUN number, jump the jobs Tab and show the queue RUN related jobs.
         """
-        if item != None:
-            currentRow = self.queuesTabTable.currentRow()
-            queue      = self.queuesTabTable.item(currentRow, 0).text().strip()
-            pendNum    = self.queuesTabTable.item(currentRow, 1).text().strip()
-            runNum     = self.queuesTabTable.item(currentRow, 2).text().strip()
+        if (index != None) and index.isValid():
+            (queue, pendNum, runNum) = self.queuesTabProxyModel.getRecord(index)
 
-            if item.column() == 0:
+            if index.column() == 0:
                 print('* Checking queue "' + str(queue) + '".')
                 self.updateQueueTabFrame0(queue)
-                self.updateQueueTabFrame1(queue)
-            elif item.column() == 1:
-                if (pendNum != '') and (int(pendNum) > 0):
+                self.queryLoader.load('queueInfo', self.loadQueueInfo, queue)
+            elif index.column() == 1:
+                if pendNum > 0:
                     self.jobsTabUserLine.setText('')
 
                     statusList = ['PEND', 'RUN', 'ALL']
@@ -986,8 +1068,8 @@ class mainWindow(QMainWindow):
                     self.setJobsTabStartedOnCombo()
                     self.genJobsTabTable()
                     self.mainTab.setCurrentWidget(self.jobsTab)
-            elif item.column() == 2:
-                if (runNum != '') and (int(runNum) > 0):
+            elif index.column() == 2:
+                if runNum > 0:
                     self.jobsTabUserLine.setText('')
 
                     statusList = ['RUN', 'PEND', 'ALL']
@@ -1008,30 +1090,35 @@ class mainWindow(QMainWindow):
 
     def updateQueueTabFrame0(self, queue):
         """
-        Draw queue (PEND/RUN) job number current job, save the png picture and show it on self.queuesTabFrame0.
+        Load the queue (PEND/RUN) job number curve data on the background thread, it is drawn on self.queuesTabFrame0 with updateQueueTabJobNumCurve.
         """
-        self.queuesTabJobNumCurveLabel.setText('queue (PEND/RUN) job number curve')
+        self.queuesTabJobNumCurveCanvas.clearCurves()
+        self.queryLoader.load('queueJobNumCurve', self.loadQueueJobNumCurve, queue)
 
-        # Generate queue job number curve with the specified job id
-        self.myDrawCurve.drawQueueJobNumCurve(queue)
-        queueJobNumCurveFig = str(config.tmpPath) + '/' + str(user) + '_' + str(queue) + '_jobNum.png'
+    def loadQueueJobNumCurve(self, request, queue):
+        return(queue, self.myDrawCurve.getQueueJobNumCurveData(queue))
+
+    def updateQueueTabJobNumCurve(self, result):
+        """
+        Draw the queue (PEND/RUN) job number curve on self.queuesTabJobNumCurveCanvas.
+        """
+        (queue, curveData) = result
 
-        if os.path.exists(queueJobNumCurveFig):
-            pixMap = QPixmap(queueJobNumCurveFig).scaled(self.queuesTabJobNumCurveLabel.width(), self.queuesTabJobNumCurveLabel.height())
-            self.queuesTabJobNumCurveLabel.setPixmap(pixMap)
+        if curveData is None:
+            self.guiWarning('*Warning*: Not find PEND/RUN job number curve data of queue "' + str(queue) + '".')
         else:
-            warningMessage = '*Warning*: Not find queue job number curve fig "' + str(queueJobNumCurveFig) + '".'
-            self.guiWarning(warningMessage)
+            (dateList, pendList, runList) = curveData
+            self.queuesTabJobNumCurveCanvas.setCurves(list(range(len(dateList))), [pendList, runList], 'DATE', 'NUM', ['PEND', 'RUN'], xTickLabels=dateList, title='queue : ' + str(queue))
 
-    def updateQueueTabFrame1(self, queue):
+    def loadQueueInfo(self, request, queue):
+        return(openlava_common.getCommandLines('bqueues -l ' + str(queue)))
+
+    def updateQueueTabFrame1(self, lines):
         """
-        Show queue detailed informations on self.queuesTabText.
+        Show queue detailed informations (command "bqueues -l <queue>" output lines) on self.queuesTabText.
         """
         self.queuesTabText.clear()
 
-        command = 'bqueues -l ' + str(queue)
-        lines = os.popen(command).readlines()
-
         for line in lines:
             self.queuesTabText.insertPlainText(line)
 
@@ -4,7 +4,6 @@
 import os
 import sys
 import argparse
-import datetime
 import time
 from multiprocessing import Process
 
@@ -74,7 +73,6 @@ class sampling:
                 sys.exit(1)
 
     def getDateInfo(self):
-        self.sampleTime = datetime.datetime.today().strftime('%Y%m%d_%H%M%S')
         self.currentSeconds = int(time.time())
 
     def sampleJobInfo(self):
@@ -87,69 +85,46 @@ class sampling:
 
         bjobsDic = openlava_common.getBjobsUfInfo()
         jobList = list(bjobsDic.keys())
+
+        # Share the running job info with jobResourceSample.py and jobResourceMonitor.py.
+        openlava_common.saveBjobsSnapshot(bjobsDic, self.currentSeconds)
         jobRangeDic = common.getJobRangeDic(jobList)
-        jobSqlDic = {}
 
-        keyList = ['sampleTime', 'mem']
+        # The samples of the job which are one hour ago are from an old job with the same job id.
+        staleSampleTime = self.currentSeconds-3600
 
         for jobRange in jobRangeDic.keys():
             jobDbFile = str(self.dbPath) + '/job/' + str(jobRange) + '.db'
-            (result, jobDbConn) = sqlite3_common.connectDbFile(jobDbFile, mode='read')
+            (result, jobDbConn) = sqlite3_common.connectDbFile(jobDbFile, mode='write')
+            if result != 'passed':
+                return
 
-            if result == 'passed':
-                jobTableList = sqlite3_common.getSqlTableList(jobDbFile, jobDbConn)
-            else:
-                jobTableList = []
+            if not sqlite3_common.checkSqlSchemaVersion(jobDbFile, jobDbConn, mode='write'):
+                jobDbConn.close()
+                return
 
-            for job in jobRangeDic[jobRange]:
-                jobTableName='job_' + str(job)
-                print('    Sampling for job "' + str(job) + '" ...')
-                jobSqlDic[job] = {
-                                  'drop': False,
-                                  'keyString': '',
-                                  'valueString': '',
-                                 }
+            sqlite3_common.createJobSampleTable(jobDbFile, jobDbConn, commit=False)
 
-                # If job table (with old data) has been on the jobDbFile, drop it.
-                if jobTableName in jobTableList:
-                    dataDic = sqlite3_common.getSqlTableData(jobDbFile, jobDbConn, jobTableName, ['sampleTime'])
-                    if dataDic:
-                        if len(dataDic['sampleTime']) > 0:
-                            lastSampleTime = dataDic['sampleTime'][-1]
-                            lastSeconds = int(time.mktime(datetime.datetime.strptime(str(lastSampleTime), "%Y%m%d_%H%M%S").timetuple()))
-                            if self.currentSeconds-lastSeconds > 3600:
-                                common.printWarning('    *Warning*: table "' + str(jobTableName) + '" already existed even one hour ago, will drop it.')
-                                jobSqlDic[job]['drop'] = True
-                                jobTableList.remove(jobTableName)
-
-                # If job table is not on the jobDbFile, create it.
-                if jobTableName not in jobTableList:
-                    keyString = sqlite3_common.genSqlTableKeyString(keyList)
-                    jobSqlDic[job]['keyString'] = keyString
-
-                # Insert sql table value.
-                valueList = [self.sampleTime, bjobsDic[job]['mem']]
-                valueString = sqlite3_common.genSqlTableValueString(valueList)
-                jobSqlDic[job]['valueString'] = valueString
-
-            if result == 'passed':
-                jobDbConn.commit()
-                jobDbConn.close()
+            # If job samples (with old data) have been on the jobDbFile, drop them.
+            staleJobList = sqlite3_common.getStaleJobList(jobDbFile, jobDbConn, jobRangeDic[jobRange], staleSampleTime)
 
-        for jobRange in jobRangeDic.keys():
-            jobDbFile = str(self.dbPath) + '/job/' + str(jobRange) + '.db'
-            (result, jobDbConn) = sqlite3_common.connectDbFile(jobDbFile, mode='write')
-            if result != 'passed':
-                return
+            if len(staleJobList) > 0:
+                common.printWarning('    *Warning*: samples of job "' + ' '.join(staleJobList) + '" already existed even one hour ago, will drop them.')
+                sqlite3_common.deleteJobSamples(jobDbFile, jobDbConn, staleJobList, commit=False)
+
+            valueTupleList = []
 
             for job in jobRangeDic[jobRange]:
-                jobTableName='job_' + str(job)
-                if jobSqlDic[job]['drop']:
-                    sqlite3_common.dropSqlTable(jobDbFile, jobDbConn, jobTableName, commit=False)
-                if jobSqlDic[job]['keyString'] != '':
-                    sqlite3_common.createSqlTable(jobDbFile, jobDbConn, jobTableName, jobSqlDic[job]['keyString'], commit=False)
-                if jobSqlDic[job]['valueString'] != '':
-                    sqlite3_common.insertIntoSqlTable(jobDbFile, jobDbConn, jobTableName, jobSqlDic[job]['valueString'], commit=False)
+                print('    Sampling for job "' + str(job) + '" ...')
+
+                # bjobs MEM is Mbytes, save it as G.
+                mem = bjobsDic[job].mem
+                if mem is not None:
+                    mem = mem/1024
+                valueTupleList.append((job, self.currentSeconds, bjobsDic[job].startedOn, None, mem))
+
+            # Insert sql table values, all of the jobs of the range file with one statement.
+            sqlite3_common.insertIntoSqlTableMany(jobDbFile, jobDbConn, sqlite3_common.jobSampleTableName, valueTupleList, commit=False)
 
             jobDbConn.commit()
             jobDbConn.close()
@@ -167,44 +142,48 @@ class sampling:
         if result != 'passed':
             return
 
+        if not sqlite3_common.checkSqlSchemaVersion(queueDbFile, queueDbConn, mode='write'):
+            queueDbConn.close()
+            return
+
         print('>>> Sampling queue info into ' + str(queueDbFile) + ' ...')
 
         queueTableList = sqlite3_common.getSqlTableList(queueDbFile, queueDbConn)
         bqueuesDic = openlava_common.getBqueuesInfo()
-        queueList = bqueuesDic['QUEUE_NAME']
+        queueList = list(bqueuesDic['QUEUE_NAME'])
         queueList.append('ALL')
         queueSqlDic = {}
 
-        keyList = ['sampleTime', 'NJOBS', 'PEND', 'RUN', 'SUSP']
+        (keyList, keyTypeList) = sqlite3_common.sampleTableSchemaDic['queue']
+        numericColumnDic = dict([(key, [sqlite3_common.numberToSqlValue(value) for value in bqueuesDic.getNumericColumn(key)]) for key in keyList[1:]])
 
         for i in range(len(queueList)):
             queue = queueList[i]
             queueSqlDic[queue] = {
                                   'keyString': '',
-                                  'valueString': '',
+                                  'valueList': [],
                                  }
             queueTableName = 'queue_' + str(queue)
             print('    Sampling for queue "' + str(queue) + '" ...')
 
             # Generate sql table.
             if queueTableName not in queueTableList:
-                keyString = sqlite3_common.genSqlTableKeyString(keyList)
+                keyString = sqlite3_common.genSqlTableKeyString(keyList, keyTypeList)
                 queueSqlDic[queue]['keyString'] = keyString
 
             # Insert sql table value.
             if queue == 'ALL':
-                valueList = [self.sampleTime, sum([int(i) for i in bqueuesDic['NJOBS']]), sum([int(i) for i in bqueuesDic['PEND']]), sum([int(i) for i in bqueuesDic['RUN']]), sum([int(i) for i in bqueuesDic['SUSP']])]
+                valueList = [self.currentSeconds] + [sum([value for value in numericColumnDic[key] if value is not None]) for key in keyList[1:]]
             else:
-                valueList = [self.sampleTime, bqueuesDic['NJOBS'][i], bqueuesDic['PEND'][i], bqueuesDic['RUN'][i], bqueuesDic['SUSP'][i]]
-            valueString = sqlite3_common.genSqlTableValueString(valueList)
-            queueSqlDic[queue]['valueString'] = valueString
+                valueList = [self.currentSeconds] + [numericColumnDic[key][i] for key in keyList[1:]]
+            queueSqlDic[queue]['valueList'] = valueList
 
         for queue in queueList:
             queueTableName = 'queue_' + str(queue)
             if queueSqlDic[queue]['keyString'] != '':
                 sqlite3_common.createSqlTable(queueDbFile, queueDbConn, queueTableName, queueSqlDic[queue]['keyString'], commit=False)
-            if queueSqlDic[queue]['valueString'] != '':
-                sqlite3_common.insertIntoSqlTable(queueDbFile, queueDbConn, queueTableName, queueSqlDic[queue]['valueString'], commit=False)
+            if len(queueSqlDic[queue]['valueList']) > 0:
+                sqlite3_common.insertIntoSqlTableMany(queueDbFile, queueDbConn, queueTableName, [queueSqlDic[queue]['valueList'],], commit=False)
 
         print('    Committing the update to sqlite3 ...')
 
@@ -233,6 +212,10 @@ class sampling:
         if result != 'passed':
             return
 
+        if not sqlite3_common.checkSqlSchemaVersion(hostDbFile, hostDbConn, mode='write'):
+            hostDbConn.close()
+            return
+
         print('>>> Sampling host info into ' + str(hostDbFile) + ' ...')
 
         hostTableList = sqlite3_common.getSqlTableList(hostDbFile, hostDbConn)
@@ -240,33 +223,33 @@ class sampling:
         hostList = bhostsDic['HOST_NAME']
         hostSqlDic = {}
 
-        keyList = ['sampleTime', 'MAX', 'NJOBS', 'RUN', 'SSUSP', 'USUSP']
+        (keyList, keyTypeList) = sqlite3_common.sampleTableSchemaDic['host']
+        numericColumnDic = dict([(key, [sqlite3_common.numberToSqlValue(value) for value in bhostsDic.getNumericColumn(key)]) for key in keyList[1:]])
 
         for i in range(len(hostList)):
             host = hostList[i]
             hostSqlDic[host] = {
                                 'keyString': '',
-                                'valueString': '',
+                                'valueList': [],
                                }
             hostTableName = 'host_' + str(host)
             print('    Sampling for host "' + str(host) + '" ...')
 
             # Generate sql table.
             if hostTableName not in hostTableList:
-                keyString = sqlite3_common.genSqlTableKeyString(keyList)
+                keyString = sqlite3_common.genSqlTableKeyString(keyList, keyTypeList)
                 hostSqlDic[host]['keyString'] = keyString
 
             # Insert sql table value.
-            valueList = [self.sampleTime, bhostsDic['MAX'][i], bhostsDic['NJOBS'][i], bhostsDic['RUN'][i], bhostsDic['SSUSP'][i], bhostsDic['USUSP'][i]]
-            valueString = sqlite3_common.genSqlTableValueString(valueList)
-            hostSqlDic[host]['valueString'] = valueString
+            valueList = [self.currentSeconds] + [numericColumnDic[key][i] for key in keyList[1:]]
+            hostSqlDic[host]['valueList'] = valueList
 
         for host in hostList:
             hostTableName = 'host_' + str(host)
             if hostSqlDic[host]['keyString'] != '':
                 sqlite3_common.createSqlTable(hostDbFile, hostDbConn, hostTableName, hostSqlDic[host]['keyString'], commit=False)
-            if hostSqlDic[host]['valueString'] != '':
-                sqlite3_common.insertIntoSqlTable(hostDbFile, hostDbConn, hostTableName, hostSqlDic[host]['valueString'], commit=False)
+            if len(hostSqlDic[host]['valueList']) > 0:
+                sqlite3_common.insertIntoSqlTableMany(hostDbFile, hostDbConn, hostTableName, [hostSqlDic[host]['valueList'],], commit=False)
 
         print('    Committing the update to sqlite3 ...')
 
@@ -295,6 +278,10 @@ class sampling:
         if result != 'passed':
             return
 
+        if not sqlite3_common.checkSqlSchemaVersion(loadDbFile, loadDbConn, mode='write'):
+            loadDbConn.close()
+            return
+
         print('>>> Sampling host load info into ' + str(loadDbFile) + ' ...')
 
         loadTableList = sqlite3_common.getSqlTableList(loadDbFile, loadDbConn)
@@ -302,33 +289,37 @@ class sampling:
         hostList = lsloadDic['HOST_NAME']
         loadSqlDic = {}
 
-        keyList = ['sampleTime', 'ut', 'tmp', 'swp', 'mem']
+        (keyList, keyTypeList) = sqlite3_common.sampleTableSchemaDic['load']
+        numericColumnDic = dict([(key, [sqlite3_common.numberToSqlValue(value) for value in lsloadDic.getNumericColumn(key)]) for key in keyList[1:]])
+
+        # tmp/swp/mem are switched into M by commandTable, save them as G.
+        for key in ['tmp', 'swp', 'mem']:
+            numericColumnDic[key] = [(value/1024 if value is not None else None) for value in numericColumnDic[key]]
 
         for i in range(len(hostList)):
             host = hostList[i]
             loadSqlDic[host] = {
                                 'keyString': '',
-                                'valueString': '',
+                                'valueList': [],
                                }
             loadTableName = 'load_' + str(host)
             print('    Sampling for host "' + str(host) + '" ...')
 
             # Generate sql table.
             if loadTableName not in loadTableList:
-                keyString = sqlite3_common.genSqlTableKeyString(keyList)
+                keyString = sqlite3_common.genSqlTableKeyString(keyList, keyTypeList)
                 loadSqlDic[host]['keyString'] = keyString
 
             # Insert sql table value.
-            valueList = [self.sampleTime, lsloadDic['ut'][i], lsloadDic['tmp'][i], lsloadDic['swp'][i], lsloadDic['mem'][i]]
-            valueString = sqlite3_common.genSqlTableValueString(valueList)
-            loadSqlDic[host]['valueString'] = valueString
+            valueList = [self.currentSeconds] + [numericColumnDic[key][i] for key in keyList[1:]]
+            loadSqlDic[host]['valueList'] = valueList
 
         for host in hostList:
             loadTableName = 'load_' + str(host)
             if loadSqlDic[host]['keyString'] != '':
                 sqlite3_common.createSqlTable(loadDbFile, loadDbConn, loadTableName, loadSqlDic[host]['keyString'], commit=False)
-            if loadSqlDic[host]['valueString'] != '':
-                sqlite3_common.insertIntoSqlTable(loadDbFile, loadDbConn, loadTableName, loadSqlDic[host]['valueString'], commit=False)
+            if len(loadSqlDic[host]['valueList']) > 0:
+                sqlite3_common.insertIntoSqlTableMany(loadDbFile, loadDbConn, loadTableName, [loadSqlDic[host]['valueList'],], commit=False)
 
         print('    Committing the update to sqlite3 ...')
 
@@ -357,6 +348,10 @@ class sampling:
         if result != 'passed':
             return
 
+        if not sqlite3_common.checkSqlSchemaVersion(userDbFile, userDbConn, mode='write'):
+            userDbConn.close()
+            return
+
         print('>>> Sampling user info into ' + str(userDbFile) + ' ...')
 
         userTableList = sqlite3_common.getSqlTableList(userDbFile, userDbConn)
@@ -364,33 +359,33 @@ class sampling:
         userList = busersDic['USER/GROUP']
         userSqlDic = {}
 
-        keyList = ['sampleTime', 'NJOBS', 'PEND', 'RUN', 'SSUSP', 'USUSP']
+        (keyList, keyTypeList) = sqlite3_common.sampleTableSchemaDic['user']
+        numericColumnDic = dict([(key, [sqlite3_common.numberToSqlValue(value) for value in busersDic.getNumericColumn(key)]) for key in keyList[1:]])
 
         for i in range(len(userList)):
             user = userList[i]
             userSqlDic[user] = {
                                 'keyString': '',
-                                'valueString': '',
+                                'valueList': [],
                                }
             userTableName = 'user_' + str(user)
             print('    Sampling for user "' + str(user) + '" ...')
 
             # Generate sql table.
             if userTableName not in userTableList:
-                keyString = sqlite3_common.genSqlTableKeyString(keyList)
+                keyString = sqlite3_common.genSqlTableKeyString(keyList, keyTypeList)
                 userSqlDic[user]['keyString'] = keyString
 
             # Insert sql table value.
-            valueList = [self.sampleTime, busersDic['NJOBS'][i], busersDic['PEND'][i], busersDic['RUN'][i], busersDic['SSUSP'][i], busersDic['USUSP'][i]]
-            valueString = sqlite3_common.genSqlTableValueString(valueList)
-            userSqlDic[user]['valueString'] = valueString
+            valueList = [self.currentSeconds] + [numericColumnDic[key][i] for key in keyList[1:]]
+            userSqlDic[user]['valueList'] = valueList
 
         for user in userList:
             userTableName = 'user_' + str(user)
             if userSqlDic[user]['keyString'] != '':
                 sqlite3_common.createSqlTable(userDbFile, userDbConn, userTableName, userSqlDic[user]['keyString'], commit=False)
-            if userSqlDic[user]['valueString'] != '':
-                sqlite3_common.insertIntoSqlTable(userDbFile, userDbConn, userTableName, userSqlDic[user]['valueString'], commit=False)
+            if len(userSqlDic[user]['valueList']) > 0:
+                sqlite3_common.insertIntoSqlTableMany(userDbFile, userDbConn, userTableName, [userSqlDic[user]['valueList'],], commit=False)
 
         print('    Committing the update to sqlite3 ...')
 
@@ -0,0 +1,102 @@
+#!PYTHONPATH
+# -*- coding: utf-8 -*-
+#
+# Save the job sample records of jobResourceSample.py ("--output spool"/"--output stdout")
+# into the job range db files, all of the hosts' records are merged and saved with one
+# transaction per job range db file.
+# Execute this script on crontab (Interval : 5 minutes) on the db server host.
+
+import os
+import sys
+import glob
+import argparse
+
+sys.path.append('MONITORPATH')
+from common import common
+from common import sqlite3_common
+from conf import config
+
+os.environ["PYTHONUNBUFFERED"]="1"
+
+def readArgs():
+    """
+    Read arguments.
+    """
+    parser = argparse.ArgumentParser()
+
+    parser.add_argument("-f", "--files",
+                        nargs='+',
+                        default=[],
+                        help='Specify the json line record files ("-" for stdin), default is all of the spool files under the spool directory.')
+    parser.add_argument("-s", "--spool",
+                        default=sqlite3_common.jobSampleSpoolPath,
+                        help='Specify the spool directory, default is "' + str(sqlite3_common.jobSampleSpoolPath) + '".')
+    parser.add_argument("-k", "--keep",
+                        action='store_true',
+                        default=False,
+                        help='Keep the spool files after saving them into the db files.')
+
+    args = parser.parse_args()
+
+    if len(args.files) == 0:
+        args.files = sorted(glob.glob(str(args.spool) + '/*.jsonl'))
+
+    return(args.files, args.keep)
+
+def readRecordFiles(fileList):
+    """
+    Get the job sample value tuples from the json line record files.
+    Return (valueTupleList, readFileList), the files which fail on reading are not on readFileList.
+    """
+    valueTupleList = []
+    readFileList = []
+
+    for recordFile in fileList:
+        if recordFile == '-':
+            valueTupleList.extend(sqlite3_common.parseJobSampleRecords(sys.stdin))
+            readFileList.append(recordFile)
+            continue
+
+        try:
+            with open(recordFile, 'r') as RF:
+                valueTupleList.extend(sqlite3_common.parseJobSampleRecords(RF))
+        except Exception as error:
+            common.printError('*Error*: Failed on reading record file "' + str(recordFile) + '", keep it for the next run: ' + str(error))
+        else:
+            readFileList.append(recordFile)
+
+    return(valueTupleList, readFileList)
+
+def ingest(fileList, keep=False):
+    if len(fileList) == 0:
+        print('*Info*: No job sample record file.')
+        return
+
+    print('>>> Reading ' + str(len(fileList)) + ' job sample record files ...')
+    (valueTupleList, readFileList) = readRecordFiles(fileList)
+
+    print('>>> Saving ' + str(len(valueTupleList)) + ' job samples into sqlite3 ...')
+    savedNum = sqlite3_common.saveJobSamples(str(config.dbPath) + '/resource/job', valueTupleList)
+
+    if savedNum != len(valueTupleList):
+        common.printError('*Error*: Only ' + str(savedNum) + ' of ' + str(len(valueTupleList)) + ' job samples are saved, keep the record files for the next run.')
+        return
+
+    # Only remove the record files which are read and saved.
+    if not keep:
+        for recordFile in readFileList:
+            if recordFile != '-':
+                try:
+                    os.remove(recordFile)
+                except Exception as error:
+                    common.printWarning('*Warning*: Failed on removing record file "' + str(recordFile) + '": ' + str(error))
+
+################
+# Main Process #
+################
+def main():
+    (fileList, keep) = readArgs()
+    ingest(fileList, keep)
+
+if __name__ == '__main__':
+    main()
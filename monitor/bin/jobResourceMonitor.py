@@ -9,7 +9,9 @@ import os
 import sys
 import time
 import datetime
+import bisect
 import argparse
+import collections
 
 sys.path.append('MONITORPATH')
 from common import common
@@ -32,6 +34,73 @@ def readArgs():
     args = parser.parse_args()
     return(args.jobs)
 
+def getMultiHostPeakValue(sampleTimeList, hostList, valueList):
+    """
+    Get the peak of the summed values of the multi-hosts job samples.
+    Every sample which is not collected yet starts a group, the group collects the following samples (sampleTimeList is
+    ascending epoch seconds) on other hosts within 5 seconds, the peak value is the max group sum.
+    Sort and sweep with prefix sums, O(n log n).
+    """
+    sampleNum = len(sampleTimeList)
+
+    if sampleNum == 0:
+        return(0)
+
+    # Make sure the samples are ascending (getJobSampleData returns the samples ordered by sample_time).
+    orderList = sorted(range(sampleNum), key=lambda i: sampleTimeList[i])
+    secondsList = [sampleTimeList[i] for i in orderList]
+    hostList = [hostList[i] for i in orderList]
+    valueList = [valueList[i] for i in orderList]
+
+    # Prefix sums of all of the samples, and the sample indexes and prefix sums of every host.
+    prefixSumList = [0]
+
+    for value in valueList:
+        prefixSumList.append(prefixSumList[-1] + value)
+
+    hostIndexDic = {}
+    hostPrefixSumDic = {}
+
+    for i in range(sampleNum):
+        host = hostList[i]
+
+        if host not in hostIndexDic:
+            hostIndexDic[host] = []
+            hostPrefixSumDic[host] = [0]
+
+        hostIndexDic[host].append(i)
+        hostPrefixSumDic[host].append(hostPrefixSumDic[host][-1] + valueList[i])
+
+    # The group start samples of the last 5 seconds, and their number on every host.
+    startQueue = collections.deque()
+    startHostNumDic = collections.defaultdict(int)
+    peakValue = None
+
+    for i in range(sampleNum):
+        seconds = secondsList[i]
+        host = hostList[i]
+
+        while (len(startQueue) > 0) and (seconds-secondsList[startQueue[0]] > 5):
+            startHostNumDic[hostList[startQueue.popleft()]] -= 1
+
+        # The sample is collected by a group start sample on other host.
+        if len(startQueue) - startHostNumDic[host] > 0:
+            continue
+
+        startQueue.append(i)
+        startHostNumDic[host] += 1
+
+        # Sum of the sample and the following samples on other hosts within 5 seconds.
+        endIndex = bisect.bisect_right(secondsList, seconds+5, i+1)
+        hostBeginNum = bisect.bisect_right(hostIndexDic[host], i)
+        hostEndNum = bisect.bisect_left(hostIndexDic[host], endIndex, hostBeginNum)
+        sumValue = valueList[i] + (prefixSumList[endIndex] - prefixSumList[i+1]) - (hostPrefixSumDic[host][hostEndNum] - hostPrefixSumDic[host][hostBeginNum])
+
+        if (peakValue is None) or (sumValue > peakValue):
+            peakValue = sumValue
+
+    return(peakValue)
+
 class jobResourceMonitor:
     """
     If the job is 'RUN' on last sampling and "DONE/EXIT" on latest sampling, monitor it's memory usage, send mail if any issue.
@@ -52,39 +121,52 @@ class jobResourceMonitor:
                 print('*Error*: Failed on creating sqlite user db directory "' + str(userDbPath) + '".')
                 sys.exit(1)
 
-    def getLastJobList(self):
-        lastJobList = []
+    def getLastJobSet(self):
+        """
+        Get the job set of the last sampling from the job list file (sorted, one job per line).
+        """
+        lastJobSet = set()
         lastJobListFile = str(self.dbPath) + '/job.list'
 
         if os.path.exists(lastJobListFile):
             with open(lastJobListFile, 'r') as LJLF:
-                for line in LJLF:
-                    lastJobList.append(line.strip())
+                lastJobSet = set(line.strip() for line in LJLF)
 
-        return(lastJobList)
+            lastJobSet.discard('')
 
-    def getLatestJobList(self):
+        return(lastJobSet)
+
+    def getLatestJobSet(self):
         """
-        Sample job info with command 'bjobs -u all -a -UF'.
+        Get the running jobs from the bjobs snapshot of bsample.py (command 'bjobs -u all -r -w' if the snapshot is stale),
+        save the job list file (sorted, one job per line) for the next sampling.
         """
         currentTime = datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')
         print('[' + str(currentTime) + ']  Sampling job info ...')
 
         if len(self.specifiedJobs) == 0:
-            latestJobDic = openlava_common.getBjobsInfo()
+            snapshotDic = openlava_common.getBjobsSnapshot()
+
+            if snapshotDic is not None:
+                latestJobSet = set(snapshotDic.keys())
+            else:
+                print('    bjobs snapshot is missing or stale, query the running jobs with bjobs.')
+                latestJobSet = set(openlava_common.getBjobsInfo().get('JOBID', []))
         else:
             jobsString = ' '.join(self.specifiedJobs)
             command='bjobs -w ' + str(jobsString)
-            latestJobDic = openlava_common.getBjobsInfo(command)
+            latestJobSet = set(openlava_common.getBjobsInfo(command).get('JOBID', []))
 
-        latestJobList = latestJobDic['JOBID']
         latestJobListFile = str(self.dbPath) + '/job.list'
+        tmpJobListFile = str(latestJobListFile) + '.' + str(os.getpid())
+
+        # Write a temporary file then rename it, so the job list file is always complete.
+        with open(tmpJobListFile, 'w') as LJLF:
+            LJLF.write(''.join([str(job) + '\n' for job in sorted(latestJobSet)]))
 
-        with open(latestJobListFile, 'w') as LJLF:
-            for job in latestJobList:
-                LJLF.write(str(job) + '\n')
+        os.rename(tmpJobListFile, latestJobListFile)
 
-        return(latestJobList)
+        return(latestJobSet)
 
     def getFinishedJobs(self):
         """
@@ -93,44 +175,46 @@ class jobResourceMonitor:
         if len(self.specifiedJobs) > 0:
             self.finishedJobList = self.specifiedJobs
         else:
-            self.finishedJobList = []
+            lastJobSet = self.getLastJobSet()
+            latestJobSet = self.getLatestJobSet()
 
-            lastJobList = self.getLastJobList()
-            latestJobList = self.getLatestJobList()
+            self.finishedJobList = sorted(lastJobSet - latestJobSet)
 
-            self.finishedJobList = [job for job in lastJobList if job not in latestJobList]
+        if len(self.finishedJobList) == 0:
+            self.finishedJobDic = {}
+            return
 
-        finishedJobString = ' '.join(self.finishedJobList)
-        self.finishedJobDic = openlava_common.getBjobsUfInfo('bjobs -UF ' + str(finishedJobString))
+        self.finishedJobDic = openlava_common.getJobsBjobsUfInfo(self.finishedJobList)
 
         if len(self.specifiedJobs) == 0:
-            for job in self.finishedJobList:
-                if job in self.finishedJobDic:
-                    jobStatus = self.finishedJobDic[job]['status']
-                    if (jobStatus != 'DONE') and (jobStatus != 'EXIT'):
-                        self.finishedJobList.remove(job)
+            self.finishedJobList = [job for job in self.finishedJobList if (job not in self.finishedJobDic) or (self.finishedJobDic[job].status in ['DONE', 'EXIT'])]
 
     def connectUserDb(self, user):
         dbFile= str(self.dbPath) + '/user/' + str(user) + '.db'
-        (result, dbConn) = sqlite3_common.connectDbFile(dbFile, mode='write')
+        (result, dbConn) = sqlite3_common.connectCachedDbFile(dbFile, mode='write')
 
         if result != 'passed':
             tableList = []
             print('*Error*: Failed on connecting sqlite3 database "' + str(dbFile) + '".')
+        elif not sqlite3_common.checkSqlSchemaVersion(dbFile, dbConn, mode='write'):
+            result = 'failed'
+            tableList = []
         else:
             tableList = sqlite3_common.getSqlTableList(dbFile, dbConn)
 
         return(result, dbFile, dbConn, tableList)
 
-    def writeUserData(self, job, jobRequestedProcessorsString, jobAvgCpuString, jobPeakCpuString, jobRusageMemString, jobAvgMemString, jobPeakMemString, jobRunTime):
-        jobUser = self.finishedJobDic[job]['user']
-        jobStatus = self.finishedJobDic[job]['status']
-        jobCwd = self.finishedJobDic[job]['cwd']
-        jobCommand = self.finishedJobDic[job]['command']
+    def writeUserData(self, job, jobRequestedProcessors, jobAvgCpu, jobPeakCpu, jobRusageMem, jobAvgMem, jobPeakMem, jobRunTime):
+        """
+        Save the job resource usage into the user database, memory unit is G, None (NULL) for the missing value.
+        """
+        jobUser = self.finishedJobDic[job].user
+        jobStatus = self.finishedJobDic[job].status
+        jobCwd = self.finishedJobDic[job].cwd
+        jobCommand = self.finishedJobDic[job].command
         tableName = jobUser
 
-        keyList = ['SAMPLE_TIME', 'JOB', 'STATUS', 'CPU_RESERVED', 'CPU_AVG', 'CPU_PEAK', 'MEM_RESERVED', 'MEM_AVG', 'MEM_PEAK', 'RUN_TIME', 'CWD', 'COMMAND']
-        keyTypeList = ['VARCHAR(20)', 'VARCHAR(10)', 'VARCHAR(10)', 'VARCHAR(10)', 'VARCHAR(10)', 'VARCHAR(10)', 'VARCHAR(10)', 'VARCHAR(10)', 'VARCHAR(10)', 'VARCHAR(10)', 'VARCHAR(1000)', 'VARCHAR(1000)']
+        (keyList, keyTypeList) = sqlite3_common.sampleTableSchemaDic['userJob']
         keyString = sqlite3_common.genSqlTableKeyString(keyList, keyTypeList, autoIncrement=True)
 
         (result, dbFile, dbConn, tableList) = self.connectUserDb(jobUser)
@@ -139,9 +223,9 @@ class jobResourceMonitor:
             if tableName not in tableList:
                 sqlite3_common.createSqlTable(dbFile, dbConn, tableName, keyString)
 
-            valueList = [self.sampleTime, job, jobStatus, jobRequestedProcessorsString, jobAvgCpuString, jobPeakCpuString, jobRusageMemString, jobAvgMemString, jobPeakMemString, jobRunTime, jobCwd, jobCommand]
-            valueString = sqlite3_common.genSqlTableValueString(valueList, autoIncrement=True)
-            sqlite3_common.insertIntoSqlTable(dbFile, dbConn, tableName, valueString)
+            # The first value (None) is for the auto increment id.
+            valueList = [None, self.currentSeconds, job, jobStatus, jobRequestedProcessors, jobAvgCpu, jobPeakCpu, jobRusageMem, jobAvgMem, jobPeakMem, jobRunTime, jobCwd, jobCommand]
+            sqlite3_common.insertIntoSqlTableMany(dbFile, dbConn, tableName, [valueList,])
 
     def sampleTimeCheck(self, job, sampleTimeList):
         """
@@ -157,8 +241,7 @@ class jobResourceMonitor:
                 return(1)
             else:
                 # lastSampleTime is too long time ago, fail.
-                lastSampleTime = sampleTimeList[-1]
-                lastSeconds = int(time.mktime(datetime.datetime.strptime(str(lastSampleTime), "%Y-%m-%d %H:%M:%S").timetuple()))
+                lastSeconds = sampleTimeList[-1]
 
                 if self.currentSeconds-lastSeconds > 3600:
                     print('    * For job "' + str(job) + '", last sampleTime info is on long time ago.')
@@ -167,8 +250,7 @@ class jobResourceMonitor:
                 # Data sample have ever been broken, fail.
                 lastSeconds = ''
 
-                for sampleTime in sampleTimeList:
-                    seconds = int(time.mktime(datetime.datetime.strptime(str(sampleTime), "%Y-%m-%d %H:%M:%S").timetuple()))
+                for seconds in sampleTimeList:
                     if lastSeconds == '':
                         lastSeconds = seconds
                     else:
@@ -180,105 +262,57 @@ class jobResourceMonitor:
 
                 return(0)
 
-    def getMultiHostPeakValue(self, sampleTimeList, hostList, valueList):
-        # Update sampleTimeList to secondsList.
-        secondsList = []
-
-        for sampleTime in sampleTimeList:
-            seconds = int(time.mktime(datetime.datetime.strptime(str(sampleTime), "%Y-%m-%d %H:%M:%S").timetuple()))
-            secondsList.append(seconds)
-
-        # Mark near by seconds.
-        usedNum = []
-        nearBySecondsList = []
-
-        for i in range(len(secondsList)):
-            if i in usedNum:
-                continue
-            else:
-                usedNum.append(i)
-                tmpNumList = [i]
-                host = hostList[i]
-                tmpHostList = [host]
-                seconds = secondsList[i]
-                for j in range(i+1, len(secondsList)):
-                    newSeconds = secondsList[j]
-                    if -5 <= newSeconds-seconds <= 5:
-                        host = hostList[j]
-                        if host not in tmpHostList:
-                            usedNum.append(j)
-                            tmpNumList.append(j)
-                nearBySecondsList.append(tmpNumList)
-
-        # Get collected values into sumValueList.
-        sumValueList = []
-
-        for nearBySeconds in nearBySecondsList:
-            sumValue = 0
-            for num in nearBySeconds:
-                value = valueList[num]
-                sumValue += value
-            sumValueList.append(sumValue)
-
-        peakValue = max(sumValueList)
-        return(peakValue)
-
     def connectJobDb(self, job):
         jobRangeDic = common.getJobRangeDic([job,])
         jobRangeList = list(jobRangeDic.keys())
         jobRange = jobRangeList[0]
 
         dbFile= str(self.dbPath) + '/job/' + str(jobRange) + '.db'
-        (result, dbConn) = sqlite3_common.connectDbFile(dbFile, mode='read')
+        (result, dbConn) = sqlite3_common.connectCachedDbFile(dbFile, mode='read')
 
         if result != 'passed':
-            tableList = []
             print('*Error*: Failed on connecting sqlite3 database "' + str(dbFile) + '".')
-        else:
-            tableList = sqlite3_common.getSqlTableList(dbFile, dbConn)
+        elif not sqlite3_common.checkSqlSchemaVersion(dbFile, dbConn):
+            result = 'failed'
 
-        return(result, dbFile, dbConn, tableList)
+        return(result, dbFile, dbConn)
 
     def getJobPeakAvg(self, job):
         """
-        Get Job peak cpu info from job resource database file.
+        Get Job peak cpu info from job resource database file, None for the missing value.
         """
         jobRunTime = 0
-        jobPeakCpu = ''
-        jobAvgCpu = ''
-        jobPeakMem = ''
-        jobAvgMem = ''
+        jobPeakCpu = None
+        jobAvgCpu = None
+        jobPeakMem = None
+        jobAvgMem = None
 
-        tableName = job
-        (result, dbFile, dbConn, tableList) = self.connectJobDb(job)
+        (result, dbFile, dbConn) = self.connectJobDb(job)
 
         if result == 'passed':
-            if tableName not in tableList:
-                print('    * For job "' + str(job) + '", job table "' + str(tableName) + '" is missing on sqlite3.')
+            dataDic = sqlite3_common.getJobSampleData(dbFile, dbConn, job, keyList=['sample_time', 'host', 'cpu', 'mem'])
+
+            if 'sample_time' not in dataDic.keys():
+                print('    * For job "' + str(job) + '", job samples are missing on sqlite3.')
             else:
-                dataDic = sqlite3_common.getSqlTableData(dbFile, dbConn, tableName, keyList=['SAMPLE_TIME', 'HOST_NAME', 'CPU', 'MEMORY'])
-                if 'SAMPLE_TIME' not in dataDic.keys():
-                    print('    * For job "' + str(job) + '", SAMPLE_TIME info is missing on sqlite3 (table empty?).')
-                else:
-                    sampleTimeList = dataDic['SAMPLE_TIME']
-                    returnCode = self.sampleTimeCheck(job, sampleTimeList)
-                    if returnCode == 0:
-                        jobRunTime = self.getJobRunTime(job)
-                        cpuValueList = dataDic['CPU']
-                        memValueList = dataDic['MEMORY']
-                        cpuValueFloatList = [float(i) for i in cpuValueList]
-                        memValueFloatList = [float(i) for i in memValueList]
-                        jobAvgCpu = sum(cpuValueFloatList)/len(cpuValueFloatList)
-                        jobAvgMem = sum(memValueFloatList)/len(memValueFloatList)
-                        origHostList = dataDic['HOST_NAME']
-                        hostList = list(set(origHostList))
-                        if len(hostList) > 1:
-                            print('    * Notice: job "' + str(job) + '" use multi-hosts.')
-                            jobPeakCpu = self.getMultiHostPeakValue(sampleTimeList, origHostList, cpuValueFloatList)
-                            jobPeakMem = self.getMultiHostPeakValue(sampleTimeList, origHostList, memValueFloatList)
-                        else:
-                            jobPeakCpu = max(cpuValueFloatList)
-                            jobPeakMem = max(memValueFloatList)
+                sampleTimeList = dataDic['sample_time']
+                returnCode = self.sampleTimeCheck(job, sampleTimeList)
+                if returnCode == 0:
+                    jobRunTime = self.getJobRunTime(job)
+                    # cpu/mem are REAL, NULL (None) is counted as 0.
+                    cpuValueFloatList = [(value or 0.0) for value in dataDic['cpu']]
+                    memValueFloatList = [(value or 0.0) for value in dataDic['mem']]
+                    jobAvgCpu = sum(cpuValueFloatList)/len(cpuValueFloatList)
+                    jobAvgMem = sum(memValueFloatList)/len(memValueFloatList)
+                    origHostList = dataDic['host']
+                    hostList = list(set(origHostList))
+                    if len(hostList) > 1:
+                        print('    * Notice: job "' + str(job) + '" use multi-hosts.')
+                        jobPeakCpu = getMultiHostPeakValue(sampleTimeList, origHostList, cpuValueFloatList)
+                        jobPeakMem = getMultiHostPeakValue(sampleTimeList, origHostList, memValueFloatList)
+                    else:
+                        jobPeakCpu = max(cpuValueFloatList)
+                        jobPeakMem = max(memValueFloatList)
 
         return(jobRunTime, jobPeakCpu, jobAvgCpu, jobPeakMem, jobAvgMem)
 
@@ -286,16 +320,11 @@ class jobResourceMonitor:
         jobRunTime = 0
 
         if job in self.finishedJobDic.keys():
-            jobStartedTime = self.finishedJobDic[job]['startedTime']
-            jobFinishedTime = self.finishedJobDic[job]['finishedTime']
-            if (jobStartedTime != '') and (jobFinishedTime != ''):
-                jobStartedSeconds = int(time.mktime(datetime.datetime.strptime(str(jobStartedTime), "%a %b %d %H:%M:%S").timetuple()))
-                jobFinishedSeconds = int(time.mktime(datetime.datetime.strptime(str(jobFinishedTime), "%a %b %d %H:%M:%S").timetuple()))
+            jobStartedSeconds = self.finishedJobDic[job].startedTime
+            jobFinishedSeconds = self.finishedJobDic[job].finishedTime
+            if (jobStartedSeconds is not None) and (jobFinishedSeconds is not None):
                 jobRunTime = jobFinishedSeconds-jobStartedSeconds
 
-                if jobRunTime < 0:
-                    jobRunTime += 31536000
-
         return(jobRunTime)
 
     def monitorResourceUsage(self):
@@ -308,49 +337,54 @@ class jobResourceMonitor:
 
         for job in self.finishedJobList:
             if job in self.finishedJobDic:
-                jobUser = self.finishedJobDic[job]['user']
-                jobStatus = self.finishedJobDic[job]['status']
-                jobRequestedProcessors = self.finishedJobDic[job]['processorsRequested']
-                jobRusageMem = self.finishedJobDic[job]['rusageMem']
+                jobUser = self.finishedJobDic[job].user
+                jobStatus = self.finishedJobDic[job].status
+                jobRequestedProcessors = self.finishedJobDic[job].processorsRequested
+                jobRusageMem = self.finishedJobDic[job].rusageMem
 
                 (jobRunTime, jobPeakCpu, jobAvgCpu, jobPeakMem, jobAvgMem) = self.getJobPeakAvg(job)
 
                 # For cpu
-                if jobRequestedProcessors != '':
+                if jobRequestedProcessors is not None:
                     jobRequestedProcessorsString = str(jobRequestedProcessors)
                 else:
                     jobRequestedProcessorsString = 'NA'
 
-                if str(jobAvgCpu) != '':
-                    jobAvgCpuString = str(round(float(jobAvgCpu), 1))
+                if jobAvgCpu is not None:
+                    jobAvgCpu = round(jobAvgCpu, 1)
+                    jobAvgCpuString = str(jobAvgCpu)
                 else:
                     jobAvgCpuString = 'NA'
 
-                if str(jobPeakCpu) != '':
-                    jobPeakCpuString = str(round(float(jobPeakCpu), 1))
+                if jobPeakCpu is not None:
+                    jobPeakCpu = round(jobPeakCpu, 1)
+                    jobPeakCpuString = str(jobPeakCpu)
                 else:
                     jobPeakCpuString = 'NA'
 
-                # For mem
-                if str(jobRusageMem) != '':
-                    jobRusageMemString = str(round(float(jobRusageMem)/1024, 3)) + 'G'
+                # For mem (unit is G)
+                if jobRusageMem is not None:
+                    jobRusageMem = round(jobRusageMem/1024, 3)
+                    jobRusageMemString = str(jobRusageMem) + 'G'
                 else:
                     jobRusageMemString = 'NA'
 
-                if str(jobAvgMem) != '':
-                    jobAvgMemString = str(round(float(jobAvgMem), 3)) + 'G'
+                if jobAvgMem is not None:
+                    jobAvgMem = round(jobAvgMem, 3)
+                    jobAvgMemString = str(jobAvgMem) + 'G'
                 else:
                     jobAvgMemString = 'NA'
 
-                if str(jobPeakMem) != '':
-                    jobPeakMemString = str(round(float(jobPeakMem), 3)) + 'G'
+                if jobPeakMem is not None:
+                    jobPeakMem = round(jobPeakMem, 3)
+                    jobPeakMemString = str(jobPeakMem) + 'G'
                 else:
                     jobPeakMemString = 'NA'
 
                 print('    %-10s%-16s%-10s%-13s%-14s%-14s%-13s%-14s%-14s%-14s'%(job, jobUser, jobStatus, jobRequestedProcessorsString, jobAvgCpuString, jobPeakCpuString, jobRusageMemString, jobAvgMemString, jobPeakMemString, jobRunTime))
 
                 if len(self.specifiedJobs) == 0:
-                    self.writeUserData(job, jobRequestedProcessorsString, jobAvgCpuString, jobPeakCpuString, jobRusageMemString, jobAvgMemString, jobPeakMemString, jobRunTime)
+                    self.writeUserData(job, jobRequestedProcessors, jobAvgCpu, jobPeakCpu, jobRusageMem, jobAvgMem, jobPeakMem, jobRunTime)
 
         print('    =========\n')
 
@@ -359,7 +393,6 @@ class jobResourceMonitor:
         Get finished jobs.
         Monitor the cpu/memory usage, send warning email if any reserve-use mismatch.
         """
-        self.sampleTime = datetime.datetime.today().strftime('%Y-%m-%d %H:%M:%S')
         self.currentSeconds = int(time.time())
 
         self.getFinishedJobs()
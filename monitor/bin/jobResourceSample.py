@@ -4,260 +4,299 @@
 import os
 import re
 import sys
+import json
 import time
 import datetime
+import signal
 import socket
-import psutil
+import argparse
+import collections
 
 sys.path.append('MONITORPATH')
 from common import common
 from common import openlava_common
+from common import proc_common
+from common import cgroup_common
 from common import sqlite3_common
 from conf import config
 
 os.environ["PYTHONUNBUFFERED"]="1"
 
 hostname = socket.gethostname()
-sampleTime = datetime.datetime.today().strftime('%Y-%m-%d %H:%M:%S')
 currentDay = datetime.datetime.today().strftime('%Y%m%d')
 currentSeconds = int(time.time())
 
+def readArgs():
+    """
+    Read arguments.
+    """
+    parser = argparse.ArgumentParser()
+
+    parser.add_argument("-o", "--output",
+                        default='db',
+                        choices=['db', 'stdout', 'spool'],
+                        help='Specify where to save the job samples, "db" (the job range db files), "stdout" (json line records for batchRun.py/jobResourceIngest.py) or "spool" (json line records file for jobResourceIngest.py), default is "db".')
+    parser.add_argument("-s", "--spool",
+                        default=sqlite3_common.jobSampleSpoolPath,
+                        help='Specify the spool directory for "--output spool", default is "' + str(sqlite3_common.jobSampleSpoolPath) + '".')
+    parser.add_argument("-d", "--daemon",
+                        action='store_true',
+                        default=False,
+                        help='Run as a persistent sampler, sample every "--interval" seconds and save the job samples every "--flush" seconds.')
+    parser.add_argument("-i", "--interval",
+                        type=int,
+                        default=30,
+                        help='Specify the sample interval seconds of the daemon mode, default is 30.')
+    parser.add_argument("-f", "--flush",
+                        type=int,
+                        default=300,
+                        help='Specify the flush interval seconds of the daemon mode, the average cpu and the peak memory of the samples are saved, default is 300.')
+
+    parser.add_argument("-b", "--backend",
+                        default='auto',
+                        choices=['auto', 'cgroup', 'proc'],
+                        help='Specify how to get the job resource usage, "cgroup" (the job cgroup accounting files), "proc" (the job process tree) or "auto" (cgroup for the jobs with a job cgroup, process tree for the others), default is "auto".')
+
+    args = parser.parse_args()
+
+    if args.daemon and ((args.interval < 1) or (args.flush < args.interval)):
+        common.printError('*Error*: interval must be bigger than 0, and flush must not be smaller than interval.')
+        sys.exit(1)
+
+    return(args.output, args.spool, args.daemon, args.interval, args.flush, args.backend)
+
 class jobResourceSample:
     """
     Get job related processes.
     Sample process related cpu and memory information.
     Save data into sqlite3.
     """
-    def __init__(self):
+    def __init__(self, output='db', spoolPath=sqlite3_common.jobSampleSpoolPath, backend='auto'):
+        self.output = output
+        self.spoolPath = spoolPath
+        self.backend = backend
+        self.cgroupRoot = getattr(config, 'cgroupRoot', '/sys/fs/cgroup')
+        self.cgroupVersion = 0
+        self.jobCgroupCompile = re.compile(getattr(config, 'jobCgroupPattern', cgroup_common.jobCgroupPattern))
+        self.stateFile = str(getattr(config, 'jobSampleStatePath', config.tmpPath)) + '/jobResourceSample.' + str(hostname) + '.state'
+        self.bootTime = proc_common.getBootTime()
+        self.pidsSeconds = 0
+        self.sampleSeconds = currentSeconds
         self.dbPath = str(config.dbPath) + '/resource'
-        jobDbPath = str(self.dbPath) + '/job'
 
-        if not os.path.exists(jobDbPath):
-            try:
-                os.system('mkdir -p ' + str(jobDbPath))
-            except:
-                print('*Error*: Failed on creating sqlite job db directory "' + str(jobDbPath) + '".')
-                sys.exit(1)
+        if self.output == 'db':
+            self.createDir(str(self.dbPath) + '/job')
+        elif self.output == 'spool':
+            self.createDir(self.spoolPath)
 
-    def getAllNoRootPids(self):
-        print('>>> Getting all no root pids ...')
+        if self.backend != 'proc':
+            self.cgroupVersion = cgroup_common.getCgroupVersion(self.cgroupRoot)
 
-        pids = []
-        command = "ps -U root -u root -N | awk '{print $1}' | grep -v PID"
-        (returnCode, stdout, stderr) = common.subprocessPopen(command)
-        stdout = str(stdout, 'utf-8')
-
-        for line in stdout.split():
-            pids.append(int(line.strip()))
+            if (self.backend == 'cgroup') and (self.cgroupVersion == 0):
+                common.printError('*Error*: No cgroup v1/v2 memory/cpu accounting on "' + str(self.cgroupRoot) + '".')
+                sys.exit(1)
 
-        return(pids)
+    def createDir(self, dirPath):
+        if not os.path.exists(dirPath):
+            try:
+                os.system('mkdir -p ' + str(dirPath))
+            except:
+                print('*Error*: Failed on creating directory "' + str(dirPath) + '".')
+                sys.exit(1)
 
-    def getPidInfos(self, pid, pidProcess=''):
+    def getPidsDic(self):
         """
-        psutil manuel please see https://blog.csdn.net/zhouzhiwengang/article/details/72461295.
+        Get the information of all of the no root processes with one pass on /proc, cmdline is only read for the "res" processes.
         """
-        pidDic = {
-                 'hostname' : hostname,
-                 'username' : '',
-                 'pid' : pid,
-                 'ppid' : 0,
-                 'create_time' : 0.0,
-                 'status' : '',
-                 'cpu_percent' : 0.0,
-                 'memory' : 0.0,
-                 'num_threads' : 1,
-                 'name' : '',
-                 'cmdline' : [],
-                 'children_pids' : [],
-                 }
-
-        if str(pidProcess) == '':
-            try:
-                pidProcess = psutil.Process(pid)
-            except Exception as warning:
-                print('        *Warning*: ' + str(warning))
-                return(pidDic, pidProcess)
-
-        # The process name.
-        try:
-            pidName = pidProcess.name()
-            pidDic['name'] = pidName
-        except:
-            pass
-
-        # The command line this process has been called with.
-        try:
-            pidCmdline = pidProcess.cmdline()
-            pidDic['cmdline'] = pidCmdline
-        except:
-            pass
-
-        # The process creation time as a floating point number expressed in seconds since the epoch.
-        try:
-            pidCreateTime = pidProcess.create_time()
-            pidDic['create_time'] = pidCreateTime
-        except:
-            pass
-
-        # The current process status as a string. The returned string is one of the psutil.STATUS_* constants.
-        try:
-            pidStatus = pidProcess.status()
-            pidDic['status'] = pidStatus
-        except:
-            pass
-
-        # The name of the user that owns the process. On UNIX this is calculated by using real process uid.
-        try:
-            pidUsername = pidProcess.username()
-            pidDic['username'] = pidUsername
-        except:
-            pass
-
-        # The number of threads used by this process.
-        try:
-            pidNumThreads = pidProcess.num_threads()
-            pidDic['num_threads'] = pidNumThreads
-        except:
-            pass
-
-        # The process parent pid.
-        try:
-            pidPpid = pidProcess.ppid()
-            pidDic['ppid'] = pidPpid
-        except:
-            pass
-
-        # Return the children of this process as a list of Process objects, preemptively checking whether PID has been reused. 
-        # If recursive is True return all the parent descendants. Example assuming A == this process:
-        # 
-        # A ─┐
-        #    │
-        #    ├─ B (child) ─┐
-        #    │             └─ X (grandchild) ─┐
-        #    │                                └─ Y (great grandchild)
-        #    ├─ C (child)
-        #    └─ D (child)
-        # 
-        # >>> p.children()
-        # B, C, D
-        # >>> p.children(recursive=True)
-        # B, X, Y, C, D
-        try:
-            pidChildren = pidProcess.children(recursive=True)
-            for item in pidChildren:
-                pid = item.pid
-                pidDic['children_pids'].append(pid)
-        except:
-            pass
-
-        # Return a float representing the process CPU utilization as a percentage. 
-        # The returned value refers to the utilization of a single CPU, i.e. it is not evenly split between the number of available CPU cores. 
-        # When interval is > 0.0 compares process times to system CPU times elapsed before and after the interval (blocking). 
-        # When interval is 0.0 or None compares process times to system CPU times elapsed since last call, returning immediately.
-        # That means the first time this is called it will return a meaningless 0.0 value which you are supposed to ignore. 
-        # In this case is recommended for accuracy that this function be called a second time with at least 0.1 seconds between calls.
-        try:
-            pidCpuPercent = pidProcess.cpu_percent(interval=None)
-            cpu = round(pidCpuPercent/100, 4)
-            pidDic['cpu_percent'] = cpu
-        except Exception as error:
-            pass
-
-        # Return a namedtuple with variable fields depending on the platform representing memory information about the process. 
-        # The “portable” fields available on all plaforms are rss and vms. All numbers are expressed in bytes.
-        # * rss: aka “Resident Set Size”, this is the non-swapped physical memory a process has used. On UNIX it matches “top“‘s RES column (seedoc). 
-        #        On Windows this is an alias for wset field and it matches “Mem Usage” column of taskmgr.exe.
-        # * vms: aka “Virtual Memory Size”, this is the total amount of virtual memory used by the process. 
-        #        On UNIX it matches “top“‘s VIRT column (seedoc). On Windows this is an alias for pagefile field and it matches “Mem Usage” “VM Size” column of taskmgr.exe.
-        # * shared: (Linux) memory that could be potentially shared with other processes. This matches “top“‘s SHR column (see doc).
-        # * text (Linux, BSD): aka TRS (text resident set) the amount of memory devoted to executable code. This matches “top“‘s CODE column (seedoc).
-        # * data (Linux, BSD): aka DRS (data resident set) the amount of physical memory devoted to other than executable code. It matches “top“‘s DATA column (see doc).
-        # * lib (Linux): the memory used by shared libraries.
-        # * dirty (Linux): the number of dirty pages.
-        try:
-            pidMemoryInfo = pidProcess.memory_info()
-            rss = pidMemoryInfo.rss
-            shared = pidMemoryInfo.shared
-            memory = round((int(rss)-int(shared))/1024/1024/1024, 4)
-            pidDic['memory'] = memory
-        except:
-            pass
-
-        return(pidDic, pidProcess)
-
-    def getPidsDic(self, pids, pidProcessDic={}):
         print('>>> Getting pid informations ...')
 
         currentTime = datetime.datetime.today().strftime('%Y-%m-%d %H:%M:%S')
         print('    [' + str(currentTime) + '] Sample start.')
 
-        pidsDic = {}
-
-        for pid in pids:
-            if pid in pidProcessDic.keys():
-                pidProcess = pidProcessDic[pid]
-            else:
-                pidProcess = ''
-
-            (pidDic, pidProcess) = self.getPidInfos(pid, pidProcess)
-            pidsDic[pid] = pidDic
-
-            if pid not in pidProcessDic.keys():
-                pidProcessDic[pid] = pidProcess
+        pidsDic = proc_common.scanProcs(skipUidList=[0], cmdlineNameList=['res'])
+        self.pidsSeconds = time.time()
 
         currentTime = datetime.datetime.today().strftime('%Y-%m-%d %H:%M:%S')
         print('    [' + str(currentTime) + '] Sample end.')
 
-        return(pidsDic, pidProcessDic)
+        return(pidsDic)
 
-    def getJobPidListDicFromProcessTree(self, pidsDic, inputJob):
-        jobPidList = []
+    def getResJobDic(self, pidsDic):
+        """
+        Get the openlava job of the "res" processes, return a dict of job: res pid.
+        """
+        resJobDic = {}
         lsbatch1Compile = re.compile('^.*/sbin/res .*/[0-9]+\.([0-9]+)\.([0-9+])$')
         lsbatch2Compile = re.compile('^.*/sbin/res .*/[0-9]+\.([0-9]+)$')
 
         for pid in pidsDic.keys():
             pidDic = pidsDic[pid]
             if pidDic['name'] == 'res':
-                pidCommand = pidDic['cmdline']
-                pidCommandString = ' '.join(pidCommand)
-                pidChildrenPidList = []
+                pidCommandString = ' '.join(pidDic['cmdline'])
 
                 if lsbatch1Compile.match(pidCommandString):
                     myMatch = lsbatch1Compile.match(pidCommandString)
                     jobHead = myMatch.group(1)
                     jobTail = myMatch.group(2)
                     job = str(jobHead) + '[' + str(jobTail) + ']'
-                    if job == inputJob:
-                        jobPidList = [pid,]
-                        pidChildrenPidList = pidsDic[pid]['children_pids']
-                        jobPidList.extend(pidChildrenPidList)
+                    resJobDic[job] = pid
                 elif lsbatch2Compile.match(pidCommandString):
                     myMatch = lsbatch2Compile.match(pidCommandString)
                     job = myMatch.group(1)
-                    if job == inputJob:
-                        jobPidList = [pid,]
-                        pidChildrenPidList = pidsDic[pid]['children_pids']
-                        jobPidList.extend(pidChildrenPidList)
+                    resJobDic[job] = pid
+
+        return(resJobDic)
+
+    def getRunningJobDic(self):
+        """
+        Get the running jobs of the host from the bjobs snapshot of bsample.py, run command "bjobs -m <host>" only if the snapshot is stale.
+        """
+        print('>>> Getting running openlava jobs ...')
 
-        return(jobPidList)
+        bjobsUfDic = openlava_common.getBjobsSnapshot(host=hostname)
 
-    def getJobPidListDic(self, pidsDic):
+        if bjobsUfDic is None:
+            print('    bjobs snapshot is missing or stale, query the running jobs with bjobs.')
+            bjobsUfDic = openlava_common.getBjobsUfInfo(command='bjobs -u all -r -m ' + str(hostname) + ' -UF')
+
+        return(bjobsUfDic)
+
+    def getJobCgroupDic(self, jobList):
+        """
+        Get the cgroups of the specified jobs (job: cgroup path), empty for the "proc" backend or no cgroup.
+        """
+        jobCgroupDic = {}
+
+        if self.cgroupVersion == 0:
+            return(jobCgroupDic)
+
+        print('>>> Getting openlava job cgroups ...')
+
+        allJobCgroupDic = cgroup_common.findJobCgroups(self.cgroupRoot, self.jobCgroupCompile)
+
+        for job in jobList:
+            if job in allJobCgroupDic:
+                jobCgroupDic[job] = allJobCgroupDic[job]
+            elif self.backend == 'cgroup':
+                common.printWarning('*Warning*: No cgroup for job "' + str(job) + '", will ignore it.')
+
+        return(jobCgroupDic)
+
+    def getProcJobList(self, jobList, jobCgroupDic):
+        """
+        Get the jobs which are sampled with the process tree.
+        """
+        if self.backend == 'cgroup':
+            return([])
+
+        return([job for job in jobList if job not in jobCgroupDic])
+
+    def sumJobCgroupResource(self, jobUsageDic, prevJobUsageDic, seconds):
+        """
+        Get the cpu/memory usage of the job cgroups with the cgroup usage delta since prevJobUsageDic, the new job cgroups are ignored.
+        The memory is the sampled anonymous memory (the daemon keeps the max of the samples), the kernel peak includes the page cache.
+        """
+        jobResourceDic = {}
+
+        for job in jobUsageDic.keys():
+            if job not in prevJobUsageDic:
+                continue
+
+            usageDic = jobUsageDic[job]
+            prevUsageDic = prevJobUsageDic[job]
+
+            jobResourceDic[job] = {
+                                   'cpu' : cgroup_common.getCpuUsage(usageDic['cpu_usec'], prevUsageDic['cpu_usec'], seconds),
+                                   'memory' : round(usageDic['memory']/1024/1024/1024, 4),
+                                  }
+
+        return(jobResourceDic)
+
+    def getJobPidListDic(self, pidsDic, bjobsUfDic, jobList):
         print('>>> Getting openlava job related pids ...')
 
-        bjobsUfDic = openlava_common.getBjobsUfInfo(command='bjobs -u all -r -m ' + str(hostname) + ' -UF')
+        resJobDic = self.getResJobDic(pidsDic)
         jobPidListDic = {}
 
-        for job in bjobsUfDic.keys():
+        for job in jobList:
             if ('pids' in bjobsUfDic[job]) and (len(bjobsUfDic[job]['pids']) > 0):
                 jobPidListDic[job] = [int(x) for x in bjobsUfDic[job]['pids']]
-            else:
-                jobPidList = self.getJobPidListDicFromProcessTree(pidsDic, job)
-                if len(jobPidList) > 0:
-                    jobPidListDic[job] = self.getJobPidListDicFromProcessTree(pidsDic, job)
+            elif job in resJobDic:
+                resPid = resJobDic[job]
+                jobPidListDic[job] = [resPid,] + proc_common.getDescendantPidList(pidsDic, resPid)
 
         return(jobPidListDic)
 
-    def getJobDic(self, jobPidListDic, pidProcessDic):
+    def setCpuUsage(self, pidsDic, prevCpuTicksDic, seconds, prevSeconds=None):
+        """
+        Set the used cpu number (cpu_percent) of the processes with the cpu ticks delta since prevCpuTicksDic (pid: (startTicks, cpuTicks)).
+        The processes which are started after prevSeconds (epoch seconds) count all of their cpu ticks, the other new processes (or the re-used pids) are set to 0.0.
+        """
+        for pid in pidsDic.keys():
+            pidDic = pidsDic[pid]
+            pidDic['cpu_percent'] = 0.0
+
+            if (pid in prevCpuTicksDic) and (prevCpuTicksDic[pid][0] == pidDic['start_ticks']):
+                pidDic['cpu_percent'] = proc_common.getCpuUsage(pidDic['cpu_ticks'], prevCpuTicksDic[pid][1], seconds)
+            elif (prevSeconds is not None) and (proc_common.getStartSeconds(pidDic['start_ticks'], self.bootTime) >= prevSeconds):
+                pidDic['cpu_percent'] = proc_common.getCpuUsage(pidDic['cpu_ticks'], 0, seconds)
+
+    def loadState(self):
+        """
+        Load the cpu ticks of the processes and the job cgroup usage of the last run from the state file.
+        The state is ignored if it is missing, broken, saved before the last boot or one hour ago.
+        """
+        stateDic = {'procSeconds' : None, 'pids' : {}, 'cgroupSeconds' : None, 'cgroups' : {}}
+
+        if not os.path.exists(self.stateFile):
+            return(stateDic)
+
+        try:
+            with open(self.stateFile, 'r') as SF:
+                savedStateDic = json.load(SF)
+
+            if (savedStateDic['bootTime'] != self.bootTime) or (time.time() - savedStateDic['seconds'] > 3600):
+                return(stateDic)
+
+            if savedStateDic['procSeconds'] is not None:
+                stateDic['procSeconds'] = savedStateDic['procSeconds']
+                stateDic['pids'] = dict([(int(pid), tuple(cpuTicks)) for (pid, cpuTicks) in savedStateDic['pids'].items()])
+
+            if savedStateDic['cgroupSeconds'] is not None:
+                stateDic['cgroupSeconds'] = savedStateDic['cgroupSeconds']
+                stateDic['cgroups'] = savedStateDic['cgroups']
+        except Exception as warning:
+            common.printWarning('*Warning*: Failed on loading state file "' + str(self.stateFile) + '", ignore it: ' + str(warning))
+
+        return(stateDic)
+
+    def saveState(self, procSeconds, pidsDic, cgroupSeconds, jobUsageDic):
+        """
+        Save the cpu ticks of the processes and the job cgroup usage into the state file (write a tmp file then rename it) for the next run.
+        """
+        savedStateDic = {
+                         'bootTime' : self.bootTime,
+                         'seconds' : time.time(),
+                         'procSeconds' : procSeconds,
+                         'pids' : dict([(str(pid), [pidDic['start_ticks'], pidDic['cpu_ticks']]) for (pid, pidDic) in pidsDic.items()]),
+                         'cgroupSeconds' : cgroupSeconds,
+                         'cgroups' : jobUsageDic,
+                        }
+        tmpStateFile = str(self.stateFile) + '.' + str(os.getpid())
+
+        try:
+            with open(tmpStateFile, 'w') as SF:
+                json.dump(savedStateDic, SF)
+
+            os.rename(tmpStateFile, self.stateFile)
+        except Exception as warning:
+            common.printWarning('*Warning*: Failed on saving state file "' + str(self.stateFile) + '": ' + str(warning))
+
+    def getJobDic(self, jobPidListDic, pidsDic, jobCgroupDic={}):
+        """
+        The cpu usage is the average since the last run (the state file), then no sleep is required.
+        Only the job pids on the first run (no state) and the new job cgroups are sampled for 1 second.
+        """
         print('>>> Getting openlava job related pid cpu/memory usage information ...')
 
         jobRelatedPids = []
@@ -266,8 +305,65 @@ class jobResourceSample:
             jobPids = jobPidListDic[job]
             jobRelatedPids.extend(jobPids)
 
+        stateDic = self.loadState()
+        jobUsageDic = cgroup_common.getJobCgroupUsageDic(self.cgroupRoot, jobCgroupDic, self.cgroupVersion)
+        cgroupSeconds = time.time()
+        primeJobList = [job for job in jobUsageDic.keys() if job not in stateDic['cgroups']]
+        jobResourceDic = {}
+
+        if len(jobPidListDic) > 0:
+            if stateDic['procSeconds'] is not None:
+                self.setCpuUsage(pidsDic, stateDic['pids'], self.pidsSeconds-stateDic['procSeconds'], stateDic['procSeconds'])
+                jobResourceDic.update(self.sumJobResource(jobPidListDic, pidsDic))
+            else:
+                primeJobList.extend(list(jobPidListDic.keys()))
+
+        jobResourceDic.update(self.sumJobCgroupResource(jobUsageDic, stateDic['cgroups'], cgroupSeconds-(stateDic['cgroupSeconds'] or cgroupSeconds)))
+
+        if len(primeJobList) > 0:
+            print('    No previous sample for job "' + ' '.join(primeJobList) + '", sample them for 1 second.')
+            jobResourceDic.update(self.getPrimeJobDic(jobPidListDic, pidsDic, jobCgroupDic, primeJobList))
+
+        # The state of all of the pids (not only the job pids), the new job pids of the next run are counted from the last run.
+        self.saveState((self.pidsSeconds if (len(pidsDic) > 0) else None), pidsDic, cgroupSeconds, jobUsageDic)
+
+        return(jobResourceDic)
+
+    def getPrimeJobDic(self, jobPidListDic, pidsDic, jobCgroupDic, primeJobList):
+        """
+        Sample the specified jobs for 1 second (re-read the cpu ticks of the job pids and the job cgroups after 1 second).
+        """
+        primeJobPidListDic = dict([(job, jobPidListDic[job]) for job in primeJobList if job in jobPidListDic])
+        primeJobCgroupDic = dict([(job, jobCgroupDic[job]) for job in primeJobList if job in jobCgroupDic])
+        primePids = []
+
+        for job in primeJobPidListDic.keys():
+            primePids.extend(primeJobPidListDic[job])
+
+        prevCpuTicksDic = proc_common.getCpuTicksDic(primePids)
+        prevJobUsageDic = cgroup_common.getJobCgroupUsageDic(self.cgroupRoot, primeJobCgroupDic, self.cgroupVersion)
+        prevSeconds = time.time()
         time.sleep(1)
-        (jobRelatedPidDic, pidProcessDic) = self.getPidsDic(jobRelatedPids, pidProcessDic)
+        cpuTicksDic = proc_common.getCpuTicksDic(primePids)
+        jobUsageDic = cgroup_common.getJobCgroupUsageDic(self.cgroupRoot, primeJobCgroupDic, self.cgroupVersion)
+        seconds = time.time() - prevSeconds
+        primePidDic = {}
+
+        for pid in cpuTicksDic.keys():
+            if pid in pidsDic:
+                primePidDic[pid] = dict(pidsDic[pid])
+                (primePidDic[pid]['start_ticks'], primePidDic[pid]['cpu_ticks']) = cpuTicksDic[pid]
+
+        self.setCpuUsage(primePidDic, prevCpuTicksDic, seconds)
+        jobResourceDic = self.sumJobResource(primeJobPidListDic, primePidDic)
+        jobResourceDic.update(self.sumJobCgroupResource(jobUsageDic, prevJobUsageDic, seconds))
+
+        return(jobResourceDic)
+
+    def sumJobResource(self, jobPidListDic, pidsDic):
+        """
+        Sum the cpu/memory usage of the job related pids.
+        """
         jobResourceDic = {}
 
         for job in jobPidListDic.keys():
@@ -275,8 +371,11 @@ class jobResourceSample:
             jobPids = jobPidListDic[job]
 
             for pid in jobPids:
-                cpu = jobRelatedPidDic[pid]['cpu_percent']
-                memory = jobRelatedPidDic[pid]['memory']
+                if pid not in pidsDic:
+                    continue
+
+                cpu = pidsDic[pid]['cpu_percent']
+                memory = pidsDic[pid]['memory']
 
                 if 'cpu' in jobResourceDic[job].keys():
                     jobResourceDic[job]['cpu'] = jobResourceDic[job]['cpu'] + cpu
@@ -288,8 +387,8 @@ class jobResourceSample:
                 else:
                     jobResourceDic[job]['memory'] = memory
 
-            jobResourceDic[job]['cpu'] = round(jobResourceDic[job]['cpu'], 4)
-            jobResourceDic[job]['memory'] = round(jobResourceDic[job]['memory'], 4)
+            jobResourceDic[job]['cpu'] = round(jobResourceDic[job].get('cpu', 0.0), 4)
+            jobResourceDic[job]['memory'] = round(jobResourceDic[job].get('memory', 0.0), 4)
 
         return(jobResourceDic)
 
@@ -316,107 +415,219 @@ class jobResourceSample:
         print('===========================')
         print('')
 
-    def checkOldSqlTable(self, dbFile, orig_conn, tableName, keyList=['SAMPLE_TIME',]):
-        dataDic = sqlite3_common.getSqlTableData(dbFile, orig_conn, tableName, keyList)
+    def getJobSampleList(self, jobResourceDic):
+        """
+        Switch jobResourceDic into the job sample value tuples (job_id, sample_time, host, cpu, mem).
+        """
+        valueTupleList = []
 
-        if dataDic:
-            if len(dataDic['SAMPLE_TIME']) > 0:
-                lastSampleTime = dataDic['SAMPLE_TIME'][-1]
-                lastSeconds = int(time.mktime(datetime.datetime.strptime(str(lastSampleTime), "%Y-%m-%d %H:%M:%S").timetuple()))
-                if currentSeconds-lastSeconds > 3600:
-                    common.printWarning('*Warning*: table "' + str(tableName) + '" already existed even one hour ago, will drop it.')
-                    return(1)
+        for job in jobResourceDic.keys():
+            valueTupleList.append((job, self.sampleSeconds, hostname, jobResourceDic[job]['cpu'], jobResourceDic[job]['memory']))
 
-        return(0)
+        return(valueTupleList)
 
     def saveJobDb(self, jobResourceDic):
         print('>>> Saving job related cpu/memory information into sqlite3 ...')
         common.debug('Saving job resource info into sqlite3 ...')
+        valueTupleList = self.getJobSampleList(jobResourceDic)
+        savedNum = sqlite3_common.saveJobSamples(str(self.dbPath) + '/job', valueTupleList)
 
-        jobList = list(jobResourceDic.keys())
-        jobRangeDic = common.getJobRangeDic(jobList)
+        if savedNum != len(valueTupleList):
+            common.printError('*Error*: Only ' + str(savedNum) + ' of ' + str(len(valueTupleList)) + ' job samples are saved.')
 
-        keyList = ['SAMPLE_TIME', 'HOST_NAME', 'CPU', 'MEMORY']
-        keyString = sqlite3_common.genSqlTableKeyString(keyList)
+        common.debug('Saving job resource info done.')
 
-        for jobRange in jobRangeDic.keys():
-            jobResourceSqlDic = {}
-            dbFile = str(self.dbPath) +'/job/' + str(jobRange) + '.db'
-            (result, dbConn) = sqlite3_common.connectDbFile(dbFile, mode='write')
+    def printJobRecords(self, jobResourceDic):
+        """
+        Print the job samples as json line records, batchRun.py collects them from the ssh output.
+        """
+        for valueTuple in self.getJobSampleList(jobResourceDic):
+            print(sqlite3_common.genJobSampleRecord(valueTuple))
 
-            if result == 'passed':
-                jobTableList = sqlite3_common.getSqlTableList(dbFile, dbConn)
-            else:
-                jobTableList = []
-                print('*Error*: Failed on connecting sqlite3 database "' + str(dbFile) + '".')
-                continue
+    def saveJobSpool(self, jobResourceDic):
+        """
+        Save the job samples as json line records into a new spool file (write a tmp file then rename it, so jobResourceIngest.py never reads a partial file).
+        """
+        print('>>> Saving job related cpu/memory information into spool directory "' + str(self.spoolPath) + '" ...')
 
-            for job in jobRangeDic[jobRange]:
-                jobResourceSqlDic[job] = {
-                                  'drop': False,
-                                  'keyString': '',
-                                  'valueString': '',
-                                 }
-                tableName = job
-                print('    Sampling for job "' + str(job) + '" ...')
-
-                if tableName in jobTableList:
-                    returnCode = self.checkOldSqlTable(dbFile, dbConn, tableName)
-                    if returnCode == 1:
-                        jobResourceSqlDic[job]['drop'] = True
-                        jobResourceSqlDic[job]['keyString'] = keyString
-                else:
-                    jobResourceSqlDic[job]['keyString'] = keyString
-
-                valueList = [sampleTime, hostname, jobResourceDic[job]['cpu'], jobResourceDic[job]['memory']]
-                valueString = sqlite3_common.genSqlTableValueString(valueList)
-                jobResourceSqlDic[job]['valueString'] = valueString
-
-            for job in jobResourceSqlDic.keys():
-                tableName = job
-                if jobResourceSqlDic[job]['drop']:
-                    print('    Dropping table "' + str(tableName) + '" ...')
-                    sqlite3_common.dropSqlTable(dbFile, dbConn, tableName, commit=False)
-                if jobResourceSqlDic[job]['keyString'] != '':
-                    print('    Creating table "' + str(tableName) + '" ...')
-                    sqlite3_common.createSqlTable(dbFile, dbConn, tableName, jobResourceSqlDic[job]['keyString'], commit=False)
-                if jobResourceSqlDic[job]['valueString'] != '':
-                    print('    Updating table "' + str(tableName) + '" with content "' + str(jobResourceSqlDic[job]['valueString']) + '" ...')
-                    sqlite3_common.insertIntoSqlTable(dbFile, dbConn, tableName, jobResourceSqlDic[job]['valueString'], commit=False)
-
-            if result == 'passed':
-                dbConn.commit()
-                dbConn.close()
-                common.debug('Saving job resource info done.')
+        valueTupleList = self.getJobSampleList(jobResourceDic)
+
+        if len(valueTupleList) == 0:
+            return
+
+        sqlite3_common.saveJobSampleSpool(self.spoolPath, str(hostname) + '_' + str(self.sampleSeconds), valueTupleList)
 
     def sample(self):
-        # Get all pids on current host.
-        pids = self.getAllNoRootPids()
+        # Get the running jobs on current host, and the job cgroups.
+        bjobsUfDic = self.getRunningJobDic()
+        jobCgroupDic = self.getJobCgroupDic(list(bjobsUfDic.keys()))
+        procJobList = self.getProcJobList(list(bjobsUfDic.keys()), jobCgroupDic)
+        pidsDic = {}
+        jobPidListDic = {}
 
-        # Get pids informatins (pidsDic) and pid psutil Process (pidProcessDic).
-        (pidsDic, pidProcessDic) = self.getPidsDic(pids)
+        # Only scan the processes for the jobs without job cgroup.
+        if len(procJobList) > 0:
+            # Get all no root pids informations (pidsDic) on current host.
+            pidsDic = self.getPidsDic()
 
-        # Get job related pids (jobPidListDic, job: [pid1 pid2 ...]).
-        jobPidListDic = self.getJobPidListDic(pidsDic)
+            # Get job related pids (jobPidListDic, job: [pid1 pid2 ...]).
+            jobPidListDic = self.getJobPidListDic(pidsDic, bjobsUfDic, procJobList)
 
         # Print debug information for pid/job.
         #self.debugPrint(pidsDic, jobPidListDic)
 
         # Re-collect job related pid informations (especially the cpu_percent information).
-        (jobResourceDic) = self.getJobDic(jobPidListDic, pidProcessDic)
+        (jobResourceDic) = self.getJobDic(jobPidListDic, pidsDic, jobCgroupDic)
 
         # Show result.
         self.resultPrint(jobResourceDic)
 
-        # Save database;
-        self.saveJobDb(jobResourceDic)
+        # Save job samples.
+        self.save(jobResourceDic)
+
+    def save(self, jobResourceDic):
+        if self.output == 'stdout':
+            self.printJobRecords(jobResourceDic)
+        elif self.output == 'spool':
+            self.saveJobSpool(jobResourceDic)
+        else:
+            self.saveJobDb(jobResourceDic)
+
+    def expandJobPidListDic(self, jobPidListDic, pidsDic):
+        """
+        Add the current children of the job pids, the job processes could be started after the last bjobs query.
+        """
+        expandedJobPidListDic = {}
+
+        for job in jobPidListDic.keys():
+            jobPidList = [pid for pid in jobPidListDic[job] if pid in pidsDic]
+            jobPidSet = set(jobPidList)
+
+            for pid in list(jobPidList):
+                for childPid in proc_common.getDescendantPidList(pidsDic, pid):
+                    if childPid not in jobPidSet:
+                        jobPidSet.add(childPid)
+                        jobPidList.append(childPid)
+
+            if len(jobPidList) > 0:
+                expandedJobPidListDic[job] = jobPidList
+
+        return(expandedJobPidListDic)
+
+    def accumulate(self, jobAggregateDic, jobResourceDic):
+        """
+        Accumulate the sample into the per-job aggregate (cpu sum/sample number for the average cpu, peak memory).
+        """
+        for job in jobResourceDic.keys():
+            if job not in jobAggregateDic:
+                jobAggregateDic[job] = {'cpuSum' : 0.0, 'sampleNum' : 0, 'memoryPeak' : 0.0}
+
+            jobAggregateDic[job]['cpuSum'] += jobResourceDic[job]['cpu']
+            jobAggregateDic[job]['sampleNum'] += 1
+            jobAggregateDic[job]['memoryPeak'] = max(jobAggregateDic[job]['memoryPeak'], jobResourceDic[job]['memory'])
+
+    def flush(self, jobAggregateDic):
+        """
+        Save the average cpu and the peak memory of the accumulated samples.
+        """
+        jobResourceDic = {}
+
+        for job in jobAggregateDic.keys():
+            jobResourceDic[job] = {
+                                   'cpu' : round(jobAggregateDic[job]['cpuSum']/jobAggregateDic[job]['sampleNum'], 4),
+                                   'memory' : round(jobAggregateDic[job]['memoryPeak'], 4),
+                                  }
+
+        self.sampleSeconds = int(time.time())
+        self.resultPrint(jobResourceDic)
+        self.save(jobResourceDic)
+        jobAggregateDic.clear()
+
+    def daemon(self, interval=30, flush=300):
+        """
+        Keep the cpu ticks of every pid and the job cgroup usage across the samples, then the cpu usage is the usage since the last sample without priming.
+        The job pids are updated from bjobs on every flush, and from the process tree on every sample.
+        """
+        print('>>> Start job resource sampler daemon (interval ' + str(interval) + ' seconds, flush ' + str(flush) + ' seconds) ...')
+
+        # Flush the accumulated samples on "kill".
+        signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+
+        prevCpuTicksDic = {}
+        prevJobUsageDic = {}
+        prevSeconds = time.time()
+        bjobsUfDic = {}
+        jobCgroupDic = {}
+        procJobList = []
+        jobPidListDic = {}
+        jobAggregateDic = collections.OrderedDict()
+        nextSampleSeconds = time.time()
+        nextFlushSeconds = nextSampleSeconds + flush
+        nextJobSeconds = nextSampleSeconds
+
+        try:
+            while True:
+                updateJob = False
+
+                if time.time() >= nextJobSeconds:
+                    bjobsUfDic = self.getRunningJobDic()
+                    jobCgroupDic = self.getJobCgroupDic(list(bjobsUfDic.keys()))
+                    procJobList = self.getProcJobList(list(bjobsUfDic.keys()), jobCgroupDic)
+                    # nextFlushSeconds is not moved forward until the flush below, so count from the current sample.
+                    nextJobSeconds = nextSampleSeconds + flush
+                    updateJob = True
+
+                sampleSeconds = time.time()
+                seconds = sampleSeconds - prevSeconds
+                jobResourceDic = {}
+
+                # The job cgroups.
+                jobUsageDic = cgroup_common.getJobCgroupUsageDic(self.cgroupRoot, jobCgroupDic, self.cgroupVersion)
+                jobResourceDic.update(self.sumJobCgroupResource(jobUsageDic, prevJobUsageDic, seconds))
+                prevJobUsageDic = jobUsageDic
+
+                # The job process trees, the first sample only primes the cpu ticks.
+                if len(procJobList) > 0:
+                    pidsDic = self.getPidsDic()
+                    self.setCpuUsage(pidsDic, prevCpuTicksDic, seconds, (prevSeconds if (len(prevCpuTicksDic) > 0) else None))
+
+                    if updateJob:
+                        jobPidListDic = self.getJobPidListDic(pidsDic, bjobsUfDic, procJobList)
+
+                    jobPidListDic = self.expandJobPidListDic(jobPidListDic, pidsDic)
+
+                    if len(prevCpuTicksDic) > 0:
+                        jobResourceDic.update(self.sumJobResource(jobPidListDic, pidsDic))
+
+                    # Only keep the alive processes.
+                    prevCpuTicksDic = dict([(pid, (pidDic['start_ticks'], pidDic['cpu_ticks'])) for (pid, pidDic) in pidsDic.items()])
+                else:
+                    prevCpuTicksDic = {}
+
+                prevSeconds = sampleSeconds
+                self.accumulate(jobAggregateDic, jobResourceDic)
+
+                if time.time() >= nextFlushSeconds:
+                    self.flush(jobAggregateDic)
+                    nextFlushSeconds += flush
+
+                nextSampleSeconds += interval
+                time.sleep(max(0, nextSampleSeconds - time.time()))
+        except (KeyboardInterrupt, SystemExit):
+            if len(jobAggregateDic) > 0:
+                self.flush(jobAggregateDic)
 
 #################
 # Main Function #
 #################
 def main():
-    myJobResourceSample = jobResourceSample()
-    myJobResourceSample.sample()
+    (output, spoolPath, daemon, interval, flush, backend) = readArgs()
+    myJobResourceSample = jobResourceSample(output, spoolPath, backend)
+
+    if daemon:
+        myJobResourceSample.daemon(interval, flush)
+    else:
+        myJobResourceSample.sample()
 
 if __name__ == '__main__':
     main()
@@ -0,0 +1,196 @@
+import os
+import re
+
+# Read the job resource usage from the job cgroups (cgroup v1 or v2), one cgroup per job.
+# cgroup v2 : <cgroupRoot>/.../<jobCgroup>/{cpu.stat, memory.stat, memory.current, memory.peak}
+# cgroup v1 : <cgroupRoot>/memory/.../<jobCgroup>/{memory.stat, memory.usage_in_bytes, memory.max_usage_in_bytes}
+#             <cgroupRoot>/cpuacct/.../<jobCgroup>/cpuacct.usage
+# The cgroup memory usage includes the page cache, the job memory is the anonymous memory (v2 "anon", v1 "total_rss" of
+# memory.stat) instead, it is comparable with the rss minus shared memory of the process tree (proc_common).
+
+# The default job cgroup name is "job.<jobId>[.<index>[.<anything>]]", group 1 is the job id, group 3 is the array job index (0 for the non-array job).
+jobCgroupPattern = '^job\.([0-9]+)(\.([0-9]+))?(\..*)?$'
+
+def readCgroupFile(cgroupFile):
+    """
+    Read the content of the cgroup file, return '' if the cgroup is removed or the file doesn't exist.
+    """
+    try:
+        with open(cgroupFile, 'r') as CF:
+            return(CF.read().strip())
+    except (IOError, OSError):
+        return('')
+
+def getCgroupVersion(cgroupRoot='/sys/fs/cgroup'):
+    """
+    Get the cgroup version of cgroupRoot, 2 for the unified hierarchy, 1 for the memory/cpuacct hierarchies, 0 for no cgroup.
+    """
+    if os.path.exists(str(cgroupRoot) + '/cgroup.controllers'):
+        return(2)
+    elif os.path.isdir(str(cgroupRoot) + '/memory') and (getCpuacctRoot(cgroupRoot) != ''):
+        return(1)
+    else:
+        return(0)
+
+def getCpuacctRoot(cgroupRoot):
+    """
+    Get the cgroup v1 cpuacct hierarchy, it could be mounted together with the cpu controller.
+    """
+    for name in ['cpuacct', 'cpu,cpuacct', 'cpuacct,cpu']:
+        if os.path.isdir(str(cgroupRoot) + '/' + str(name)):
+            return(str(cgroupRoot) + '/' + str(name))
+
+    return('')
+
+def getJobFromCgroupName(cgroupName, jobCompile):
+    """
+    Get the openlava job id ("123" or "123[4]") from the job cgroup name, return '' for the other cgroups.
+    """
+    myMatch = jobCompile.match(cgroupName)
+
+    if not myMatch:
+        return('')
+
+    job = myMatch.group(1)
+
+    if (len(myMatch.groups()) >= 3) and myMatch.group(3) and (int(myMatch.group(3)) != 0):
+        job = str(job) + '[' + str(myMatch.group(3)) + ']'
+
+    return(job)
+
+def findJobCgroups(cgroupRoot='/sys/fs/cgroup', jobCompile=re.compile(jobCgroupPattern), maxDepth=4):
+    """
+    Find the job cgroups on the memory hierarchy (cgroup v1) or the unified hierarchy (cgroup v2), at most maxDepth levels under the hierarchy root.
+    Return a dict of job: cgroup path (relative to the hierarchy root).
+    """
+    jobCgroupDic = {}
+    version = getCgroupVersion(cgroupRoot)
+
+    if version == 0:
+        return(jobCgroupDic)
+    elif version == 1:
+        hierarchyRoot = str(cgroupRoot) + '/memory'
+    else:
+        hierarchyRoot = str(cgroupRoot)
+
+    cgroupPathList = ['']
+
+    for depth in range(maxDepth):
+        subCgroupPathList = []
+
+        for cgroupPath in cgroupPathList:
+            try:
+                nameList = os.listdir(str(hierarchyRoot) + '/' + str(cgroupPath))
+            except (IOError, OSError):
+                continue
+
+            for name in nameList:
+                subCgroupPath = str(cgroupPath) + '/' + str(name)
+
+                if not os.path.isdir(str(hierarchyRoot) + str(subCgroupPath)):
+                    continue
+
+                job = getJobFromCgroupName(name, jobCompile)
+
+                # The sub cgroups of the job cgroup (like the job steps) are counted on the job cgroup.
+                if job != '':
+                    jobCgroupDic[job] = subCgroupPath.lstrip('/')
+                else:
+                    subCgroupPathList.append(subCgroupPath)
+
+        cgroupPathList = subCgroupPathList
+
+    return(jobCgroupDic)
+
+def readStatFile(statFile):
+    """
+    Read the "<key> <number>" lines of the cgroup stat file (like memory.stat), return a dict of key: number.
+    """
+    statDic = {}
+
+    for line in readCgroupFile(statFile).splitlines():
+        itemList = line.split()
+
+        if (len(itemList) == 2) and itemList[1].isdigit():
+            statDic[itemList[0]] = int(itemList[1])
+
+    return(statDic)
+
+def getCgroupUsage(cgroupRoot, cgroupPath, version=None):
+    """
+    Get the resource usage of the specified cgroup, return a dict (cpu_usec: cumulative cpu time in micro seconds, memory: current memory bytes, memory_peak: peak memory bytes or None), None if the cgroup is removed.
+    memory is the anonymous memory without the page cache (the cgroup usage if memory.stat is missing).
+    memory_peak is the raw kernel peak usage, the kernel records it with the page cache of that moment, so it is only an upper bound of
+    the job memory peak, don't use it as the job memory.
+    """
+    if version is None:
+        version = getCgroupVersion(cgroupRoot)
+
+    if version == 2:
+        cgroupDir = str(cgroupRoot) + '/' + str(cgroupPath)
+        cpuStat = readCgroupFile(cgroupDir + '/cpu.stat')
+        memory = readCgroupFile(cgroupDir + '/memory.current')
+        memoryPeak = readCgroupFile(cgroupDir + '/memory.peak')
+        memoryStatDic = readStatFile(cgroupDir + '/memory.stat')
+        (anonKey, cacheKey) = ('anon', 'file')
+        cpuUsec = None
+
+        for line in cpuStat.splitlines():
+            if line.startswith('usage_usec '):
+                cpuUsec = int(line.split()[1])
+                break
+    elif version == 1:
+        memoryDir = str(cgroupRoot) + '/memory/' + str(cgroupPath)
+        memory = readCgroupFile(memoryDir + '/memory.usage_in_bytes')
+        memoryPeak = readCgroupFile(memoryDir + '/memory.max_usage_in_bytes')
+        # The "total_" items include the sub cgroups (like the job steps).
+        memoryStatDic = readStatFile(memoryDir + '/memory.stat')
+        (anonKey, cacheKey) = ('total_rss', 'total_cache')
+        cpuUsage = readCgroupFile(str(getCpuacctRoot(cgroupRoot)) + '/' + str(cgroupPath) + '/cpuacct.usage')
+        cpuUsec = None
+
+        if cpuUsage.isdigit():
+            cpuUsec = int(cpuUsage)//1000
+    else:
+        return(None)
+
+    if (cpuUsec is None) or (not memory.isdigit()):
+        return(None)
+
+    usageDic = {
+                'cpu_usec' : cpuUsec,
+                'memory' : memoryStatDic.get(anonKey, int(memory)),
+                'memory_peak' : None,
+               }
+
+    # memory.peak is only on linux 5.19 or later.
+    if memoryPeak.isdigit():
+        usageDic['memory_peak'] = int(memoryPeak)
+
+    return(usageDic)
+
+def getJobCgroupUsageDic(cgroupRoot, jobCgroupDic, version=None):
+    """
+    Get the resource usage (see getCgroupUsage) of the job cgroups (job: cgroup path), the removed job cgroups are ignored.
+    """
+    jobUsageDic = {}
+
+    if version is None:
+        version = getCgroupVersion(cgroupRoot)
+
+    for job in jobCgroupDic.keys():
+        usageDic = getCgroupUsage(cgroupRoot, jobCgroupDic[job], version)
+
+        if usageDic is not None:
+            jobUsageDic[job] = usageDic
+
+    return(jobUsageDic)
+
+def getCpuUsage(cpuUsec, prevCpuUsec, seconds):
+    """
+    Get the used cpu number with the cpu time (micro seconds) delta on the seconds.
+    """
+    if seconds <= 0:
+        return(0.0)
+
+    return(round(max(0, cpuUsec-prevCpuUsec)/1000000/seconds, 4))
@@ -2,9 +2,13 @@ import os
 import re
 import sys
 import stat
+import time
+import shlex
 import pexpect
 import datetime
 import subprocess
+import collections
+import concurrent.futures
 
 def printError(message):
     """
@@ -80,10 +84,11 @@ def drawPlot(xList, yList, xLabel, yLabel, xIsString=False, yUnit='', title='',
     # Show the peak value.
     pyplot.text(xMin, yMax, 'peak: ' + str(yMax) + str(yUnit))
 
-    # Save fig, or show it.
+    # Save fig (then close it, so the pyplot figures are not leaked), or show it.
     if saveName != '':
         fig.savefig(saveName)
         os.chmod(saveName, stat.S_IRWXU|stat.S_IRWXG|stat.S_IRWXO)
+        pyplot.close(fig)
     else:
         fig.show()
 
@@ -128,10 +133,11 @@ def drawPlots(xList, yLists, xLabel, yLabel, yLabels, xIsString=False, title='',
     if title != '':
         pyplot.title(title)
 
-    # Save fig, or show it.
+    # Save fig (then close it, so the pyplot figures are not leaked), or show it.
     if saveName != '':
         fig.savefig(saveName)
         os.chmod(saveName, stat.S_IRWXU|stat.S_IRWXG|stat.S_IRWXO)
+        pyplot.close(fig)
     else:
         fig.show()
 
@@ -181,6 +187,92 @@ def sshRun(host, inputCommand, timeout=20):
 
     return(outputList)
 
+def sshRunCommand(host, inputCommand, timeout=20, retry=0, sshCommand='ssh'):
+    """
+    (ssh) Run specified command on specified host with subprocess (no tty, no password prompt).
+    The ssh connection failure (return code 255) is retried "retry" times, the command is not retried on the other failures because it could have been executed.
+    Return the result dict (host/status/returnCode/attempts/seconds/output), status is "passed", "failed" or "timeout".
+    """
+    command = shlex.split(sshCommand) + ['-o', 'BatchMode=yes', '-o', 'ConnectTimeout=' + str(min(timeout, 30)), str(host), str(inputCommand)]
+    resultDic = {
+                 'host' : host,
+                 'status' : '',
+                 'returnCode' : None,
+                 'attempts' : 0,
+                 'seconds' : 0.0,
+                 'output' : [],
+                }
+    startTime = time.time()
+
+    for attempt in range(retry+1):
+        resultDic['attempts'] = attempt+1
+
+        try:
+            SP = subprocess.Popen(command, stdin=subprocess.DEVNULL, stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
+        except Exception as error:
+            resultDic['status'] = 'failed'
+            resultDic['output'] = [str(error)]
+            break
+
+        try:
+            (stdout, stderr) = SP.communicate(timeout=timeout)
+        except subprocess.TimeoutExpired:
+            SP.kill()
+            (stdout, stderr) = SP.communicate()
+            resultDic['status'] = 'timeout'
+            resultDic['output'] = [line.strip() for line in str(stdout, encoding='utf-8', errors='replace').split('\n') if line.strip() != '']
+            break
+
+        resultDic['returnCode'] = SP.returncode
+        resultDic['output'] = [line.strip() for line in str(stdout, encoding='utf-8', errors='replace').split('\n') if line.strip() != '']
+
+        if SP.returncode == 0:
+            resultDic['status'] = 'passed'
+            break
+
+        resultDic['status'] = 'failed'
+
+        if SP.returncode != 255:
+            break
+
+        if attempt < retry:
+            time.sleep(min(2**attempt, 10))
+
+    resultDic['seconds'] = round(time.time()-startTime, 3)
+
+    return(resultDic)
+
+def sshRunHosts(hostList, inputCommand, concurrency=64, timeout=20, retry=0, sshCommand='ssh', callback=None):
+    """
+    (ssh) Run specified command on the specified hosts with a bounded worker pool, at most "concurrency" ssh sessions at the same time.
+    callback(resultDic) is called on every finished host.
+    Return the result dicts (see sshRunCommand) with the hostList order.
+    """
+    resultDic = collections.OrderedDict([(host, None) for host in hostList])
+
+    if len(hostList) == 0:
+        return([])
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=max(1, min(concurrency, len(hostList)))) as executor:
+        futureDic = {}
+
+        for host in hostList:
+            future = executor.submit(sshRunCommand, host, inputCommand, timeout, retry, sshCommand)
+            futureDic[future] = host
+
+        for future in concurrent.futures.as_completed(futureDic):
+            host = futureDic[future]
+
+            try:
+                resultDic[host] = future.result()
+            except Exception as error:
+                resultDic[host] = {'host' : host, 'status' : 'failed', 'returnCode' : None, 'attempts' : 0, 'seconds' : 0.0, 'output' : [str(error)]}
+
+            if callback is not None:
+                callback(resultDic[host])
+
+    return(list(resultDic.values()))
+
 def debug(message, clear=False):
     """
     If environment variable 'METHODOLOGY_DEBUG' is set to '1', print the debug message.
@@ -0,0 +1,85 @@
+import math
+
+# Min/max bucket decimation for the long curves (like the job memory curve), the points are split into equal-sized buckets,
+# the min point and the max point of every bucket (and the first/last point of the curve) are kept, so the peak (and the valley)
+# of the curve is kept exactly while the drawn point number is capped.
+# numpy is optional, the pure python implementation is used if it is not installed.
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+def getBucketSize(pointNum, maxPoints, curveNum=1):
+    """
+    Get the bucket size, then the kept points (first + last + min/max of every bucket of every curve) are no more than maxPoints.
+    """
+    bucketNum = max(1, int((maxPoints-2)/(2*curveNum)))
+    return(int(math.ceil(pointNum/bucketNum)))
+
+def getMinMaxIndexSet(yList, bucketSize):
+    """
+    Get the indexes of the min/max points of every bucket (pure python).
+    """
+    indexSet = set()
+
+    for begin in range(0, len(yList), bucketSize):
+        indexRange = range(begin, min(begin+bucketSize, len(yList)))
+        indexSet.add(min(indexRange, key=yList.__getitem__))
+        indexSet.add(max(indexRange, key=yList.__getitem__))
+
+    return(indexSet)
+
+def getMinMaxIndexArray(yList, bucketSize):
+    """
+    Get the indexes of the min/max points of every bucket (numpy), the last bucket is padded with +inf/-inf.
+    """
+    yArray = numpy.asarray(yList, dtype=float)
+    bucketNum = int(math.ceil(len(yArray)/bucketSize))
+    offsetArray = numpy.arange(bucketNum)*bucketSize
+    paddedArray = numpy.empty(bucketNum*bucketSize)
+
+    paddedArray[len(yArray):] = numpy.inf
+    paddedArray[:len(yArray)] = yArray
+    minIndexArray = paddedArray.reshape(bucketNum, bucketSize).argmin(axis=1) + offsetArray
+
+    paddedArray[len(yArray):] = -numpy.inf
+    maxIndexArray = paddedArray.reshape(bucketNum, bucketSize).argmax(axis=1) + offsetArray
+
+    return(numpy.concatenate((minIndexArray, maxIndexArray)))
+
+def getDownsampleIndexList(yLists, maxPoints, useNumpy=True):
+    """
+    Get the ascending indexes of the kept points of the curves (yLists share the same x values), no more than maxPoints.
+    All of the points are kept if the point number is no more than maxPoints (or maxPoints is 0).
+    At least 2+2*len(yLists) points (the first/last point and the min/max point of every curve) are kept for the small maxPoints.
+    """
+    pointNum = len(yLists[0]) if yLists else 0
+
+    if (maxPoints <= 0) or (pointNum <= maxPoints):
+        return(list(range(pointNum)))
+
+    bucketSize = getBucketSize(pointNum, maxPoints, len(yLists))
+
+    if useNumpy and (numpy is not None):
+        indexArray = numpy.concatenate([getMinMaxIndexArray(yList, bucketSize) for yList in yLists] + [numpy.array([0, pointNum-1])])
+        return(numpy.unique(indexArray).tolist())
+
+    indexSet = set([0, pointNum-1])
+
+    for yList in yLists:
+        indexSet.update(getMinMaxIndexSet(yList, bucketSize))
+
+    return(sorted(indexSet))
+
+def downsampleCurves(xList, yLists, maxPoints, useNumpy=True):
+    """
+    Downsample the curves (yLists share xList, the y values must be numbers) into no more than maxPoints points with the min/max
+    bucket decimation, return (xList, yLists) of the kept points, the original values (and types) are kept.
+    """
+    indexList = getDownsampleIndexList(yLists, maxPoints, useNumpy)
+
+    if len(indexList) == len(xList):
+        return(xList, yLists)
+
+    return([xList[i] for i in indexList], [[yList[i] for i in indexList] for yList in yLists])
@@ -1,20 +1,232 @@
 import os
 import re
 import sys
+import json
+import time
+import array
+import socket
+import threading
 import collections
 import subprocess
 
 sys.path.append('MONITORPATH')
+from conf import config
 from common import common
 
+# Unit of the memory size values on openlava command output, switch them into M.
+memUnitDic = {'K': 1.0/1024, 'M': 1.0, 'G': 1024.0, 'T': 1024.0*1024}
+
+def commandValueToNumber(value):
+    """
+    Switch (common) openlava command value into float number.
+    Memory size value (like "5120M" or "35G") is switched into M, percentage value (like "19%") is switched into the number.
+    Return nan for the invalid value (like "-").
+    """
+    value = value.strip()
+
+    if value.endswith('%'):
+        value = value[:-1]
+        unit = 1.0
+    elif value[-1:] in memUnitDic:
+        unit = memUnitDic[value[-1]]
+        value = value[:-1]
+    else:
+        unit = 1.0
+
+    try:
+        number = float(value)*unit
+    except ValueError:
+        number = float('nan')
+
+    return(number)
+
+class commandTable(collections.OrderedDict):
+    """
+    Columnar (common) openlava command info, key: [value1, value2, ...] like before.
+    The row index of the first column (HOST_NAME/QUEUE_NAME/USER/GROUP) is built once, and numeric
+    columns are parsed once (on first use) into typed arrays, so the callers needn't "list.index()"
+    and re-parse the string values row by row.
+    """
+    def __init__(self):
+        super().__init__()
+        self.rowIndexDic = {}
+        self.numericColumnDic = {}
+
+    def buildRowIndex(self):
+        """
+        Build name -> row index with the first column.
+        """
+        self.rowIndexDic = {}
+        self.numericColumnDic = {}
+
+        if len(self) > 0:
+            nameList = next(iter(self.values()))
+            for i in range(len(nameList)):
+                self.rowIndexDic.setdefault(nameList[i], i)
+
+    def getRow(self, name):
+        """
+        Get the row index of the specified name (host/queue/user), return None if it is missing.
+        """
+        return(self.rowIndexDic.get(name))
+
+    def getValue(self, key, name, default=''):
+        """
+        Get the string value of the specified key for the specified name (host/queue/user).
+        """
+        row = self.rowIndexDic.get(name)
+
+        if (row is None) or (key not in self):
+            return(default)
+        else:
+            return(self[key][row])
+
+    def getNumericColumn(self, key):
+        """
+        Get the specified column as an array of float (memory size is in M, invalid value is nan).
+        """
+        if key not in self.numericColumnDic:
+            self.numericColumnDic[key] = array.array('d', [commandValueToNumber(value) for value in self[key]])
+
+        return(self.numericColumnDic[key])
+
+    def getNumericValue(self, key, name, default=float('nan')):
+        """
+        Get the numeric value of the specified key for the specified name (host/queue/user).
+        """
+        row = self.rowIndexDic.get(name)
+
+        if (row is None) or (key not in self):
+            return(default)
+        else:
+            return(self.getNumericColumn(key)[row])
+
+# Cache the output of the openlava commands (with the same command line) for a while, the key is the command name,
+# the value is the TTL (seconds), 0 means no cache. Update it with "commandCacheTtlDic" on config.py.
+commandCacheTtlDic = {
+                      'lshosts' : 3600,
+                      'bmgroup' : 3600,
+                      'bugroup' : 3600,
+                      'bhosts'  : 30,
+                      'bqueues' : 30,
+                      'lsload'  : 30,
+                      'busers'  : 30,
+                      'bjobs'   : 0,
+                     }
+commandCacheTtlDic.update(getattr(config, 'commandCacheTtlDic', {}))
+
+# commandCacheDic is command: (expireTime, lines, parsedDic), parsedDic keeps the parsed output (see getParsedCommandOutput) with the same TTL.
+# commandParsedMemoDic is (command, parseFunction): parsed output, the session memo of the parsed output of the commands without cache
+# TTL (see getParsedCommandOutput), it is only dropped by clearCommandCache.
+commandCacheLock = threading.Lock()
+commandCacheDic = {}
+commandParsedMemoDic = {}
+commandInFlightDic = {}
+commandCacheGeneration = 0
+
+def getCommandCacheTtl(command):
+    """
+    Get the cache TTL (seconds) of the command with the command name, 0 for the unknown command.
+    """
+    commandItemList = command.split()
+
+    if len(commandItemList) == 0:
+        return(0)
+
+    return(commandCacheTtlDic.get(os.path.basename(commandItemList[0]), 0))
+
+def clearCommandCache():
+    """
+    Invalidate all of the cached command output (and the parsed output, like the host/user group members), the running commands don't save their output into the cache either.
+    """
+    global commandCacheGeneration
+
+    with commandCacheLock:
+        commandCacheDic.clear()
+        commandParsedMemoDic.clear()
+        commandCacheGeneration += 1
+
+def getCommandLines(command, ttl=None):
+    """
+    Get the output lines of the command, the output is cached for ttl seconds (getCommandCacheTtl by default).
+    The concurrent callers of the same command share one subprocess, the first caller runs it and the others wait for its output.
+    """
+    if ttl is None:
+        ttl = getCommandCacheTtl(command)
+
+    if ttl <= 0:
+        return(os.popen(command).readlines())
+
+    while True:
+        with commandCacheLock:
+            if (command in commandCacheDic) and (commandCacheDic[command][0] > time.time()):
+                return(list(commandCacheDic[command][1]))
+
+            event = commandInFlightDic.get(command)
+
+            if event is None:
+                event = threading.Event()
+                commandInFlightDic[command] = event
+                generation = commandCacheGeneration
+                break
+
+        # Another caller is running the command, wait for it then check the cache again.
+        event.wait()
+
+    try:
+        lines = os.popen(command).readlines()
+
+        with commandCacheLock:
+            if generation == commandCacheGeneration:
+                commandCacheDic[command] = (time.time() + ttl, lines, {})
+    finally:
+        with commandCacheLock:
+            del commandInFlightDic[command]
+
+        event.set()
+
+    return(list(lines))
+
+def getParsedCommandOutput(command, parseFunction):
+    """
+    Get parseFunction(output lines of the command), the parsed output is cached together with the command output (the same TTL),
+    so the command output is parsed only once until it expires. If the command has no cache TTL, the parsed output is kept
+    on the session memo until clearCommandCache, so the command runs only once per session. The parsed output is shared,
+    don't change it.
+    """
+    ttl = getCommandCacheTtl(command)
+    memoKey = (command, parseFunction)
+
+    with commandCacheLock:
+        if ttl > 0:
+            if (command in commandCacheDic) and (commandCacheDic[command][0] > time.time()) and (parseFunction in commandCacheDic[command][2]):
+                return(commandCacheDic[command][2][parseFunction])
+        elif memoKey in commandParsedMemoDic:
+            return(commandParsedMemoDic[memoKey])
+
+        generation = commandCacheGeneration
+
+    lines = getCommandLines(command, ttl)
+    parsedOutput = parseFunction(lines)
+
+    # Only attach the parsed output to the cached output which it is parsed from, and skip it if the cache is cleared meanwhile.
+    with commandCacheLock:
+        if ttl > 0:
+            if (command in commandCacheDic) and (commandCacheDic[command][1] == lines):
+                commandCacheDic[command][2][parseFunction] = parsedOutput
+        elif generation == commandCacheGeneration:
+            commandParsedMemoDic[memoKey] = parsedOutput
+
+    return(parsedOutput)
+
 def getCommandDict(command):
     """
-    Collect (common) openlava command info into a dict.
+    Collect (common) openlava command info into a commandTable (a dict of key: value list).
     It only works with the Title-Item type informations.
     """
-    myDic = collections.OrderedDict()
+    myDic = commandTable()
     keyList = []
-    lines = os.popen(command).readlines()
+    lines = getCommandLines(command)
 
     for i in range(len(lines)):
         line = lines[i].strip()
@@ -41,6 +253,8 @@ def getCommandDict(command):
                     value = ''
                 myDic[key].append(value)
 
+    myDic.buildRowIndex()
+
     return(myDic)
 
 def getBjobsInfo(command='bjobs -u all -r -w'):
@@ -110,9 +324,207 @@ def getBusersInfo(command='busers all'):
     busersDic = getCommandDict(command)
     return(busersDic)
 
-def getBjobsUfInfo(command='bjobs -u all -r -UF'):
+# Compiled patterns for the job info lines of command "bjobs -UF", grouped by line keyword.
+# The keyword is a necessary condition for the patterns to match, so a line only
+# tries the patterns whose keywords are on it (found with one combined regex).
+bjobsUfJobCompile = re.compile('.*Job <([0-9]+(\[[0-9]+\])?)>.*')
+bjobsUfFinishedTimeCompile = re.compile('(.*): (Done successfully|Exited with).*')
+bjobsUfFieldDic = {
+                   'Job Name <'            : [('jobName', re.compile('.*Job Name <([^>]+)>.*'), 1)],
+                   'User <'                : [('user', re.compile('.*User <([^>]+)>.*'), 1)],
+                   'Project <'             : [('project', re.compile('.*Project <([^>]+)>.*'), 1)],
+                   'Status <'              : [('status', re.compile('.*Status <([A-Z]+)>*'), 1)],
+                   'Queue <'               : [('queue', re.compile('.*Queue <([^>]+)>.*'), 1)],
+                   'Command <'             : [('command', re.compile('.*Command <(.+)>\s*$'), 1)],
+                   'Submitted from host'   : [('submittedFrom', re.compile('.*Submitted from host <([^>]+)>.*'), 1),
+                                              ('submittedTime', re.compile('(.*): Submitted from host.*'), 1)],
+                   'CWD <'                 : [('cwd', re.compile('.*CWD <([^>]+)>.*'), 1)],
+                   'Processors Requested'  : [('processorsRequested', re.compile('.* ([1-9][0-9]*) Processors Requested.*'), 1)],
+                   'Requested Resources <' : [('requestedResources', re.compile('.*Requested Resources <(.+)>;.*'), 1),
+                                              ('spanHosts', re.compile('.*Requested Resources <.*span\[hosts=([1-9][0-9]*).*>.*'), 1),
+                                              ('rusageMem', re.compile('.*Requested Resources <.*rusage\[mem=([1-9][0-9]*).*>.*'), 1)],
+                   'tarted on'             : [('startedOn', re.compile('.*[sS]tarted on ([0-9]+ Hosts/Processors )?([^;,]+).*'), 2),
+                                              ('startedTime', re.compile('(.*): (\[\d+\])?\s*[sS]tarted on.*'), 1)],
+                   'Done successfully'     : [('finishedTime', bjobsUfFinishedTimeCompile, 1)],
+                   'Exited with'           : [('finishedTime', bjobsUfFinishedTimeCompile, 1)],
+                   'The CPU time used is'  : [('cpuTime', re.compile('.*The CPU time used is ([1-9][0-9]*) seconds.*'), 1)],
+                   'MEM: '                 : [('mem', re.compile('.*MEM: ([1-9][0-9]*) Mbytes.*'), 1)],
+                  }
+bjobsUfKeywordCompile = re.compile('|'.join([re.escape(keyword) for keyword in bjobsUfFieldDic.keys()]))
+bjobsUfKeyList = ['jobId', 'jobName', 'user', 'project', 'status', 'queue', 'command', 'submittedFrom', 'submittedTime', 'cwd', 'processorsRequested', 'requestedResources', 'spanHosts', 'rusageMem', 'startedOn', 'startedTime', 'finishedTime', 'cpuTime', 'mem']
+
+bjobsUfIntKeyList = ['processorsRequested', 'spanHosts', 'rusageMem', 'cpuTime', 'mem']
+bjobsUfTimeKeyList = ['submittedTime', 'startedTime', 'finishedTime']
+monthDic = {'Jan': 1, 'Feb': 2, 'Mar': 3, 'Apr': 4, 'May': 5, 'Jun': 6, 'Jul': 7, 'Aug': 8, 'Sep': 9, 'Oct': 10, 'Nov': 11, 'Dec': 12}
+
+def bjobsTimeToSeconds(timeString, currentSeconds=None):
+    """
+    Switch openlava time string (like "Sun May 13 18:08:26", year is optional) into epoch seconds.
+    Without year, the latest year which doesn't make the time later than currentSeconds is used.
+    Return None for the unrecognized time string.
+    """
+    timeItemList = timeString.split()
+
+    if (len(timeItemList) < 4) or (len(timeItemList) > 5) or (timeItemList[1] not in monthDic):
+        return(None)
+
+    try:
+        month = monthDic[timeItemList[1]]
+        day = int(timeItemList[2])
+        (hour, minute, second) = [int(i) for i in timeItemList[3].split(':')]
+
+        if len(timeItemList) == 5:
+            year = int(timeItemList[4])
+        else:
+            if currentSeconds is None:
+                currentSeconds = time.time()
+            year = time.localtime(currentSeconds).tm_year
+
+        seconds = int(time.mktime((year, month, day, hour, minute, second, 0, 0, -1)))
+
+        if (len(timeItemList) == 4) and (seconds > currentSeconds + 86400):
+            seconds = int(time.mktime((year-1, month, day, hour, minute, second, 0, 0, -1)))
+    except (ValueError, OverflowError):
+        return(None)
+
+    return(seconds)
+
+def secondsToBjobsTime(seconds):
+    """
+    Switch epoch seconds into openlava time string (like "Sun May  3 18:08:26"), the day is space padded as bjobs does,
+    and the year is appended (like "Sun May  3 18:08:26 2017") if it is not the current year, so bjobsTimeToSeconds
+    gets the same seconds back.
+    """
+    timeStruct = time.localtime(seconds)
+    timeString = time.strftime('%a %b ', timeStruct) + '%2d' % (timeStruct.tm_mday) + time.strftime(' %H:%M:%S', timeStruct)
+
+    if timeStruct.tm_year != time.localtime().tm_year:
+        timeString = timeString + ' ' + str(timeStruct.tm_year)
+
+    return(timeString)
+
+class jobRecord:
+    """
+    Compact job info record which is parsed from command "bjobs -UF".
+    processorsRequested/spanHosts/rusageMem(M)/cpuTime(s)/mem(M) are int, submittedTime/startedTime/finishedTime
+    are epoch seconds, the missing values are None. jobInfo (the raw job info text) is '' unless it is kept on parsing.
+    Dict-style access (record['mem']) returns the original "bjobs -UF" string value, it is for the callers which
+    still use the old dict interface.
+    """
+    __slots__ = bjobsUfKeyList + ['jobInfo']
+
+    def __init__(self, jobDic, jobInfo=''):
+        for key in bjobsUfKeyList:
+            value = jobDic[key]
+
+            if key in bjobsUfIntKeyList:
+                value = int(value) if value != '' else None
+            elif key in bjobsUfTimeKeyList:
+                value = bjobsTimeToSeconds(value) if value != '' else None
+
+            setattr(self, key, value)
+
+        self.jobInfo = jobInfo
+
+    def __getitem__(self, key):
+        if key not in self.__slots__:
+            raise KeyError(key)
+
+        value = getattr(self, key)
+
+        if value is None:
+            value = ''
+        elif key in bjobsUfTimeKeyList:
+            value = secondsToBjobsTime(value)
+        elif key in bjobsUfIntKeyList:
+            value = str(value)
+
+        return(value)
+
+    def __contains__(self, key):
+        return(key in self.__slots__)
+
+    def keys(self):
+        return(list(self.__slots__))
+
+    def get(self, key, default=None):
+        if key in self.__slots__:
+            return(self[key])
+        else:
+            return(default)
+
+    def toDic(self):
+        """
+        Switch the record into the (old style) job info dict.
+        """
+        jobDic = collections.OrderedDict()
+
+        for key in self.__slots__:
+            jobDic[key] = self[key]
+
+        return(jobDic)
+
+def parseBjobsUfLines(lines, keepJobInfo=False):
+    """
+    Parse "bjobs -UF" output lines one by one, yield (job, jobRecord) once the job info is complete.
+    The lines can be any iterable (a list, a file, a pipe), they are not read ahead.
+    The raw job info text is only saved into jobRecord.jobInfo with keepJobInfo=True.
     """
-    Parse job info which are from command 'bjobs -u all -r -UF'.
+    job = ''
+    jobDic = None
+    jobInfoList = []
+
+    for line in lines:
+        if ('> is not found' in line) and re.match('Job <' + str(job) + '> is not found', line):
+            continue
+
+        if 'Job <' in line:
+            myMatch = bjobsUfJobCompile.match(line)
+            if myMatch:
+                if jobDic is not None:
+                    yield(job, jobRecord(jobDic, '\n'.join(jobInfoList)))
+
+                job = myMatch.group(1)
+
+                # Initialization for jobDic.
+                jobDic = dict.fromkeys(bjobsUfKeyList, '')
+                jobDic['jobId'] = job
+                jobInfoList = []
+
+        if jobDic is None:
+            continue
+
+        if keepJobInfo:
+            jobInfoList.append(line)
+
+        for keyword in set(bjobsUfKeywordCompile.findall(line)):
+            for (key, keyCompile, group) in bjobsUfFieldDic[keyword]:
+                myMatch = keyCompile.match(line)
+                if myMatch:
+                    value = myMatch.group(group)
+                    if key == 'startedOn':
+                        value = value.replace('<', '').replace('>', '')
+                    jobDic[key] = value
+
+    if jobDic is not None:
+        yield(job, jobRecord(jobDic, '\n'.join(jobInfoList)))
+
+def iterBjobsUfInfo(command='bjobs -u all -r -UF', keepJobInfo=False):
+    """
+    Run command 'bjobs -UF', read the output incrementally and yield (job, jobRecord) for every job.
+    """
+    p = subprocess.Popen(command, shell=True, stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
+
+    try:
+        for (job, myJobRecord) in parseBjobsUfLines((str(line.strip(), 'utf-8') for line in p.stdout), keepJobInfo):
+            yield(job, myJobRecord)
+    finally:
+        p.stdout.close()
+        p.wait()
+
+def getBjobsUfInfo(command='bjobs -u all -r -UF', keepJobInfo=False):
+    """
+    Parse job info which are from command 'bjobs -u all -r -UF', return a dict of job: jobRecord.
     ====
     Job <205>, User <liyanqing>, Project <default>, Status <PEND>, Queue <normal>, Command <sleep 1000>
     Sun May 13 18:08:26: Submitted from host <lavaHost1>, CWD <$HOME>, 2 Processors Requested, Requested Resources <rusage[mem=1234] span[hosts=1]>;
@@ -129,130 +541,124 @@ def getBjobsUfInfo(command='bjobs -u all -r -UF'):
     Effective: rusage[mem=1234] span[hosts=1]
     ====
     """
-    jobCompileDic = {
-                     'jobCompile'                 : re.compile('.*Job <([0-9]+(\[[0-9]+\])?)>.*'),
-                     'jobNameCompile'             : re.compile('.*Job Name <([^>]+)>.*'),
-                     'userCompile'                : re.compile('.*User <([^>]+)>.*'),
-                     'projectCompile'             : re.compile('.*Project <([^>]+)>.*'),
-                     'statusCompile'              : re.compile('.*Status <([A-Z]+)>*'),
-                     'queueCompile'               : re.compile('.*Queue <([^>]+)>.*'),
-                     'commandCompile'             : re.compile('.*Command <(.+)>\s*$'),
-                     'submittedFromCompile'       : re.compile('.*Submitted from host <([^>]+)>.*'),
-                     'submittedTimeCompile'       : re.compile('(.*): Submitted from host.*'),
-                     'cwdCompile'                 : re.compile('.*CWD <([^>]+)>.*'),
-                     'processorsRequestedCompile' : re.compile('.* ([1-9][0-9]*) Processors Requested.*'),
-                     'requestedResourcesCompile'  : re.compile('.*Requested Resources <(.+)>;.*'),
-                     'spanHostsCompile'           : re.compile('.*Requested Resources <.*span\[hosts=([1-9][0-9]*).*>.*'),
-                     'rusageMemCompile'           : re.compile('.*Requested Resources <.*rusage\[mem=([1-9][0-9]*).*>.*'),
-                     'startedOnCompile'           : re.compile('.*[sS]tarted on ([0-9]+ Hosts/Processors )?([^;,]+).*'),
-                     'startedTimeCompile'         : re.compile('(.*): (\[\d+\])?\s*[sS]tarted on.*'),
-                     'finishedTimeCompile'        : re.compile('(.*): (Done successfully|Exited with).*'),
-                     'cpuTimeCompile'             : re.compile('.*The CPU time used is ([1-9][0-9]*) seconds.*'),
-                     'memCompile'                 : re.compile('.*MEM: ([1-9][0-9]*) Mbytes.*'),
-                    }
+    myDic = collections.OrderedDict()
 
+    for (job, myJobRecord) in iterBjobsUfInfo(command, keepJobInfo):
+        myDic[job] = myJobRecord
+
+    return(myDic)
+
+# Max length of the job list on one "bjobs -UF <jobs>" command line, the command is run with "sh -c", so the whole
+# command is one argument, which is limited by MAX_ARG_STRLEN (128K on linux).
+bjobsJobListMaxLength = 65536
+
+def getJobsBjobsUfInfo(jobList, keepJobInfo=False):
+    """
+    Parse the job info of the specified jobs with batched 'bjobs -UF <job1> <job2> ...' commands (chunked to a safe command length),
+    return a dict of job: jobRecord.
+    """
     myDic = collections.OrderedDict()
-    job = ''
-    #lines = os.popen(command).readlines()
+    subJobList = []
+    subJobListLength = 0
 
-    p = subprocess.Popen(command, shell=True, stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
-    lines = p.stdout.readlines()
+    for job in list(jobList) + [None]:
+        if (job is None) or (subJobListLength + len(str(job)) + 1 > bjobsJobListMaxLength):
+            if len(subJobList) > 0:
+                myDic.update(getBjobsUfInfo('bjobs -UF ' + ' '.join(subJobList), keepJobInfo))
 
-    for line in lines:
-        line = str(line.strip(), 'utf-8')
+            subJobList = []
+            subJobListLength = 0
 
-        if re.match('Job <' + str(job) + '> is not found', line):
-            continue
-        else:
-            if jobCompileDic['jobCompile'].match(line):
-                myMatch = jobCompileDic['jobCompile'].match(line)
-                job = myMatch.group(1)
+        if job is not None:
+            subJobList.append(str(job))
+            subJobListLength += len(str(job)) + 1
 
-                # Initialization for myDic[job].
-                myDic[job] = collections.OrderedDict()
-                myDic[job]['jobId'] = job
-                myDic[job]['jobName'] = ''
-                myDic[job]['user'] = ''
-                myDic[job]['project'] = ''
-                myDic[job]['status'] = ''
-                myDic[job]['queue'] = ''
-                myDic[job]['command'] = ''
-                myDic[job]['submittedFrom'] = ''
-                myDic[job]['submittedTime'] = ''
-                myDic[job]['cwd'] = ''
-                myDic[job]['processorsRequested'] = ''
-                myDic[job]['requestedResources'] = ''
-                myDic[job]['spanHosts'] = ''
-                myDic[job]['rusageMem'] = ''
-                myDic[job]['startedOn'] = ''
-                myDic[job]['startedTime'] = ''
-                myDic[job]['finishedTime'] = ''
-                myDic[job]['cpuTime'] = ''
-                myDic[job]['mem'] = ''
-
-            if job != '':
-                if 'jobInfo' in myDic[job].keys():
-                    myDic[job]['jobInfo'] = str(myDic[job]['jobInfo']) + '\n' + str(line)
-                else:
-                    myDic[job]['jobInfo'] = line
-
-                if jobCompileDic['jobNameCompile'].match(line):
-                    myMatch = jobCompileDic['jobNameCompile'].match(line)
-                    myDic[job]['jobName'] = myMatch.group(1)
-                if jobCompileDic['userCompile'].match(line):
-                    myMatch = jobCompileDic['userCompile'].match(line)
-                    myDic[job]['user'] = myMatch.group(1)
-                if jobCompileDic['projectCompile'].match(line):
-                    myMatch = jobCompileDic['projectCompile'].match(line)
-                    myDic[job]['project'] = myMatch.group(1)
-                if jobCompileDic['statusCompile'].match(line):
-                    myMatch = jobCompileDic['statusCompile'].match(line)
-                    myDic[job]['status'] = myMatch.group(1)
-                if jobCompileDic['queueCompile'].match(line):
-                    myMatch = jobCompileDic['queueCompile'].match(line)
-                    myDic[job]['queue'] = myMatch.group(1)
-                if jobCompileDic['commandCompile'].match(line):
-                    myMatch = jobCompileDic['commandCompile'].match(line)
-                    myDic[job]['command'] = myMatch.group(1)
-                if jobCompileDic['submittedFromCompile'].match(line):
-                    myMatch = jobCompileDic['submittedFromCompile'].match(line)
-                    myDic[job]['submittedFrom'] = myMatch.group(1)
-                if jobCompileDic['submittedTimeCompile'].match(line):
-                    myMatch = jobCompileDic['submittedTimeCompile'].match(line)
-                    myDic[job]['submittedTime'] = myMatch.group(1)
-                if jobCompileDic['cwdCompile'].match(line):
-                    myMatch = jobCompileDic['cwdCompile'].match(line)
-                    myDic[job]['cwd'] = myMatch.group(1)
-                if jobCompileDic['processorsRequestedCompile'].match(line):
-                    myMatch = jobCompileDic['processorsRequestedCompile'].match(line)
-                    myDic[job]['processorsRequested'] = myMatch.group(1)
-                if jobCompileDic['requestedResourcesCompile'].match(line):
-                    myMatch = jobCompileDic['requestedResourcesCompile'].match(line)
-                    myDic[job]['requestedResources'] = myMatch.group(1)
-                if jobCompileDic['spanHostsCompile'].match(line):
-                    myMatch = jobCompileDic['spanHostsCompile'].match(line)
-                    myDic[job]['spanHosts'] = myMatch.group(1)
-                if jobCompileDic['rusageMemCompile'].match(line):
-                    myMatch = jobCompileDic['rusageMemCompile'].match(line)
-                    myDic[job]['rusageMem'] = myMatch.group(1)
-                if jobCompileDic['startedOnCompile'].match(line):
-                    myMatch = jobCompileDic['startedOnCompile'].match(line)
-                    startedHost = myMatch.group(2)
-                    startedHost = re.sub('<', '', startedHost)
-                    startedHost = re.sub('>', '', startedHost)
-                    myDic[job]['startedOn'] = startedHost
-                if jobCompileDic['startedTimeCompile'].match(line):
-                    myMatch = jobCompileDic['startedTimeCompile'].match(line)
-                    myDic[job]['startedTime'] = myMatch.group(1)
-                if jobCompileDic['finishedTimeCompile'].match(line):
-                    myMatch = jobCompileDic['finishedTimeCompile'].match(line)
-                    myDic[job]['finishedTime'] = myMatch.group(1)
-                if jobCompileDic['cpuTimeCompile'].match(line):
-                    myMatch = jobCompileDic['cpuTimeCompile'].match(line)
-                    myDic[job]['cpuTime'] = myMatch.group(1)
-                if jobCompileDic['memCompile'].match(line):
-                    myMatch = jobCompileDic['memCompile'].match(line)
-                    myDic[job]['mem'] = myMatch.group(1)
+    return(myDic)
+
+# The running job snapshot which is written by bsample.py once per sampling cycle, the per-host samplers and
+# jobResourceMonitor.py read it instead of querying mbatchd again, and run the live query only if it is stale.
+bjobsSnapshotVersion = 1
+bjobsSnapshotFile = getattr(config, 'bjobsSnapshotFile', str(config.dbPath) + '/monitor/bjobs.snapshot')
+bjobsSnapshotMaxAge = getattr(config, 'bjobsSnapshotMaxAge', 360)
+
+def saveBjobsSnapshot(bjobsUfDic, sampleSeconds=None, snapshotFile=bjobsSnapshotFile, command='bjobs -u all -r -UF'):
+    """
+    Save the running job info (job: jobRecord, from command 'bjobs -u all -r -UF') into the snapshot file with the version stamp.
+    The job values are saved as the typed jobRecord values (bjobsUfKeyList order), write a temporary file then rename it, so the readers always get a complete snapshot.
+    """
+    if sampleSeconds is None:
+        sampleSeconds = int(time.time())
+
+    snapshotDic = collections.OrderedDict()
+    snapshotDic['version'] = bjobsSnapshotVersion
+    snapshotDic['sample_time'] = sampleSeconds
+    snapshotDic['host'] = socket.gethostname()
+    snapshotDic['command'] = command
+    snapshotDic['keys'] = bjobsUfKeyList
+    snapshotDic['jobs'] = [[getattr(myJobRecord, key) for key in bjobsUfKeyList] for myJobRecord in bjobsUfDic.values()]
+
+    snapshotDir = os.path.dirname(snapshotFile)
+    tmpSnapshotFile = str(snapshotFile) + '.' + str(os.getpid())
+
+    try:
+        if (snapshotDir != '') and (not os.path.exists(snapshotDir)):
+            os.makedirs(snapshotDir)
+
+        with open(tmpSnapshotFile, 'w') as SF:
+            SF.write(json.dumps(snapshotDic, separators=(',', ':')))
+
+        os.rename(tmpSnapshotFile, snapshotFile)
+    except (IOError, OSError) as error:
+        common.printWarning('*Warning* (saveBjobsSnapshot) : Failed on saving bjobs snapshot file "' + str(snapshotFile) + '", ' + str(error))
+        return(False)
+
+    return(True)
+
+def isJobOnHost(myJobRecord, host):
+    """
+    Check the job is started on the specified host or not, startedOn is like "host1" or "2*host1 2*host2".
+    The short host names are compared, the host (like socket.gethostname()) could be a FQDN while openlava shows the short names, or vice versa.
+    """
+    if myJobRecord.startedOn is None:
+        return(False)
+
+    shortHost = str(host).split('.')[0]
+
+    for hostItem in myJobRecord.startedOn.split():
+        if hostItem.split('*')[-1].split('.')[0] == shortHost:
+            return(True)
+
+    return(False)
+
+def getBjobsSnapshot(host='', maxAge=bjobsSnapshotMaxAge, snapshotFile=bjobsSnapshotFile):
+    """
+    Get the running job info (job: jobRecord) from the bjobs snapshot file, only the jobs which are started on the host if host is specified.
+    Return None if the snapshot file is missing, broken, on the other version or older than maxAge seconds, the caller should run the live query then.
+    """
+    try:
+        with open(snapshotFile, 'r') as SF:
+            snapshotDic = json.load(SF)
+    except (IOError, OSError, ValueError):
+        return(None)
+
+    if (not isinstance(snapshotDic, dict)) or (snapshotDic.get('version') != bjobsSnapshotVersion) or (snapshotDic.get('keys') != bjobsUfKeyList):
+        return(None)
+
+    if time.time() - snapshotDic.get('sample_time', 0) > maxAge:
+        return(None)
+
+    myDic = collections.OrderedDict()
+
+    for valueList in snapshotDic.get('jobs', []):
+        myJobRecord = jobRecord.__new__(jobRecord)
+
+        for (key, value) in zip(bjobsUfKeyList, valueList):
+            setattr(myJobRecord, key, value)
+
+        myJobRecord.jobInfo = ''
+
+        if (host == '') or isJobOnHost(myJobRecord, host):
+            myDic[myJobRecord.jobId] = myJobRecord
 
     return(myDic)
  
@@ -272,56 +678,80 @@ def getQueueList():
     queueList = bqueuesDic['QUEUE_NAME']
     return(queueList)
 
-def getHostGroupMembers(hostGroupName):
+def parseGroupLines(lines):
     """
-    Get host group members with bmgroup.
+    Parse the output lines of command "bmgroup -r"/"bugroup -r" (all of the groups), return a dict of group: member list.
+    The long member list could be wrapped, the indented line is the following members of the last group.
     ====
-    [yanqing.li@nxnode03 openlavaMonitor]$ bmgroup pd
     GROUP_NAME    HOSTS
-    pd           dm006 dm007 dm010 dm009 dm002 dm003 dm005 
+    pd           dm006 dm007 dm010 dm009 dm002 dm003 dm005
     ====
     """
-    hostList = []
-    lines = os.popen('bmgroup -r ' + str(hostGroupName)).readlines()
+    groupDic = collections.OrderedDict()
+    group = ''
 
     for line in lines:
-        if re.search('No such user/host group', line):
-            break
-        elif re.match('^' + str(hostGroupName) + ' .*$', line):
-            myList = line.split()
-            hostList = myList[1:]
+        if (line.strip() == '') or line.startswith('GROUP_NAME') or re.search('No such user/host group', line):
+            continue
 
-    return(hostList)
+        itemList = line.split()
+
+        if line[0].isspace():
+            if group != '':
+                groupDic[group].extend(itemList)
+        else:
+            group = itemList[0]
+            groupDic[group] = itemList[1:]
+
+    return(groupDic)
+
+def getHostGroupDic():
+    """
+    Get the members of all of the host groups (group: host list) with one "bmgroup -r" command, the result is cached with the "bmgroup" TTL
+    (or kept until clearCommandCache if the TTL is 0).
+    """
+    return(getParsedCommandOutput('bmgroup -r', parseGroupLines))
+
+def getUserGroupDic():
+    """
+    Get the members of all of the user groups (group: user list) with one "bugroup -r" command, the result is cached with the "bugroup" TTL
+    (or kept until clearCommandCache if the TTL is 0).
+    """
+    return(getParsedCommandOutput('bugroup -r', parseGroupLines))
+
+def getHostGroupMembers(hostGroupName):
+    """
+    Get host group members with bmgroup, empty list for the unknown group.
+    ====
+    [yanqing.li@nxnode03 openlavaMonitor]$ bmgroup pd
+    GROUP_NAME    HOSTS
+    pd           dm006 dm007 dm010 dm009 dm002 dm003 dm005 
+    ====
+    """
+    return(list(getHostGroupDic().get(hostGroupName, [])))
 
 def getUserGroupMembers(userGroupName):
     """
-    Get user group members with bugroup.
+    Get user group members with bugroup, empty list for the unknown group.
     ====
     [yanqing.li@nxnode03 openlavaMonitor]$ bugroup pd
     GROUP_NAME    USERS
     pd           yanqing.li san.zhang si.li
     ====
     """
-    userList = []
-    lines = os.popen('bugroup -r ' + str(userGroupName)).readlines()
-
-    for line in lines:
-        if re.match('^' + str(userGroupName) + ' .*$', line):
-            myList = line.split()
-            userList = myList[1:]
-
-    return(userList)
+    return(list(getUserGroupDic().get(userGroupName, [])))
 
 def getQueueHostInfo():
     """
     Get hosts on (specified) queues.
     """
     queueHostDic = {}
+    allHostList = None
     queueCompile = re.compile('^QUEUE:\s*(\S+)\s*$')
     hostsCompile= re.compile('^HOSTS:\s*(.*?)\s*$')
     queue = ''
 
-    lines = os.popen('bqueues -l').readlines()
+    lines = getCommandLines('bqueues -l')
     for line in lines:
         line = line.strip()
         if queueCompile.match(line):
@@ -333,7 +763,11 @@ def getQueueHostInfo():
             hostsString = myMatch.group(1)
             if re.search('all hosts used by the OpenLava system', hostsString):
                 common.printWarning('*Warning* (getQueueHostInfo) : queue "' + str(queue) + '" is not well configured, all of the hosts are on the same queue.')
-                queueHostDic[queue] = getHostList()
+                # Get the host list only once for all of the queues.
+                if allHostList is None:
+                    allHostList = getHostList()
+
+                queueHostDic[queue] = list(allHostList)
             else:
                 queueHostDic.setdefault(queue, [])
                 hostsList = hostsString.split()
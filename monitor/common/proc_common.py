@@ -0,0 +1,181 @@
+import os
+import collections
+
+# Read the process information from the linux procfs directly, one pass on /proc, every process
+# is read with stat/statm/status (and cmdline for the specified process names) only once.
+
+clockTicks = os.sysconf('SC_CLK_TCK')
+pageSize = os.sysconf('SC_PAGE_SIZE')
+
+def readProcFile(procFile):
+    """
+    Read the content of the procfs file, return '' if the process exits.
+    """
+    try:
+        with open(procFile, 'rb') as PF:
+            return(str(PF.read(), encoding='utf-8', errors='replace'))
+    except (IOError, OSError):
+        return('')
+
+def parseStat(stat):
+    """
+    Parse /proc/<pid>/stat, return (name, status, ppid, cpuTicks (utime+stime), numThreads, startTicks), None for the invalid content.
+    The process name could have spaces and brackets, it is between the first "(" and the last ")".
+    """
+    nameBegin = stat.find('(')
+    nameEnd = stat.rfind(')')
+
+    if (nameBegin == -1) or (nameEnd == -1):
+        return(None)
+
+    fieldList = stat[nameEnd+2:].split()
+
+    if len(fieldList) < 20:
+        return(None)
+
+    return(stat[nameBegin+1:nameEnd], fieldList[0], int(fieldList[1]), int(fieldList[11])+int(fieldList[12]), int(fieldList[17]), int(fieldList[19]))
+
+def getPidList(procPath='/proc'):
+    """
+    Get all of the pids on procfs.
+    """
+    pidList = []
+
+    for name in os.listdir(procPath):
+        if name.isdigit():
+            pidList.append(int(name))
+
+    return(sorted(pidList))
+
+def getProcInfo(pid, procPath='/proc', skipUidList=[], cmdlineNameList=None):
+    """
+    Get the process information dict of the specified pid, return None if the process exits or its real/effective uid is on skipUidList.
+    cmdline is read only for the process names on cmdlineNameList (all of the processes if cmdlineNameList is None).
+    memory is rss minus shared (unit is G).
+    """
+    pidPath = str(procPath) + '/' + str(pid)
+    status = readProcFile(pidPath + '/status')
+    uid = None
+
+    for line in status.splitlines():
+        if line.startswith('Uid:'):
+            uidList = line.split()
+            uid = int(uidList[1])
+
+            if (uid in skipUidList) or (int(uidList[2]) in skipUidList):
+                return(None)
+
+            break
+
+    if uid is None:
+        return(None)
+
+    statInfo = parseStat(readProcFile(pidPath + '/stat'))
+    statmList = readProcFile(pidPath + '/statm').split()
+
+    if (statInfo is None) or (len(statmList) < 3):
+        return(None)
+
+    (name, procStatus, ppid, cpuTicks, numThreads, startTicks) = statInfo
+    rss = int(statmList[1])*pageSize
+    shared = int(statmList[2])*pageSize
+    cmdline = []
+
+    if (cmdlineNameList is None) or (name in cmdlineNameList):
+        cmdline = [item for item in readProcFile(pidPath + '/cmdline').split('\0') if item != '']
+
+    procDic = {
+               'pid' : pid,
+               'ppid' : ppid,
+               'uid' : uid,
+               'name' : name,
+               'status' : procStatus,
+               'cmdline' : cmdline,
+               'num_threads' : numThreads,
+               'start_ticks' : startTicks,
+               'cpu_ticks' : cpuTicks,
+               'rss' : rss,
+               'shared' : shared,
+               'memory' : round((rss-shared)/1024/1024/1024, 4),
+               'children_pids' : [],
+              }
+
+    return(procDic)
+
+def scanProcs(procPath='/proc', skipUidList=[0], cmdlineNameList=None):
+    """
+    Get the process information dicts (see getProcInfo) of all of the processes, the processes of skipUidList (root by default) are ignored.
+    The direct children of every process (children_pids) are built on the same pass.
+    Return an OrderedDict of pid: procDic.
+    """
+    procsDic = collections.OrderedDict()
+
+    for pid in getPidList(procPath):
+        procDic = getProcInfo(pid, procPath, skipUidList, cmdlineNameList)
+
+        if procDic is not None:
+            procsDic[pid] = procDic
+
+    for (pid, procDic) in procsDic.items():
+        if procDic['ppid'] in procsDic:
+            procsDic[procDic['ppid']]['children_pids'].append(pid)
+
+    return(procsDic)
+
+def getDescendantPidList(procsDic, pid):
+    """
+    Get all of the descendant pids (children, grandchildren ...) of the specified pid.
+    """
+    descendantPidList = []
+
+    if pid not in procsDic:
+        return(descendantPidList)
+
+    pidList = list(procsDic[pid]['children_pids'])
+    i = 0
+
+    while i < len(pidList):
+        descendantPidList.append(pidList[i])
+        pidList.extend(procsDic[pidList[i]]['children_pids'])
+        i += 1
+
+    return(descendantPidList)
+
+def getCpuTicksDic(pidList, procPath='/proc'):
+    """
+    Re-read the cpu ticks of the specified pids, return a dict of pid: (startTicks, cpuTicks) for the alive processes.
+    """
+    cpuTicksDic = {}
+
+    for pid in pidList:
+        statInfo = parseStat(readProcFile(str(procPath) + '/' + str(pid) + '/stat'))
+
+        if statInfo is not None:
+            cpuTicksDic[pid] = (statInfo[5], statInfo[3])
+
+    return(cpuTicksDic)
+
+def getCpuUsage(cpuTicks, prevCpuTicks, seconds):
+    """
+    Get the used cpu number with the cpu ticks delta on the seconds.
+    """
+    if seconds <= 0:
+        return(0.0)
+
+    return(round(max(0, cpuTicks-prevCpuTicks)/clockTicks/seconds, 4))
+
+def getBootTime(procPath='/proc'):
+    """
+    Get the system boot time (epoch seconds) from /proc/stat, 0 if it is unknown.
+    """
+    for line in readProcFile(str(procPath) + '/stat').splitlines():
+        if line.startswith('btime '):
+            return(int(line.split()[1]))
+
+    return(0)
+
+def getStartSeconds(startTicks, bootTime):
+    """
+    Switch the process start ticks (since boot) into epoch seconds.
+    """
+    return(bootTime + startTicks/clockTicks)
@@ -1,5 +1,11 @@
-from PyQt5.QtWidgets import QDesktopWidget
-from PyQt5.QtGui import QTextCursor
+import traceback
+import collections
+
+from PyQt5.QtWidgets import QDesktopWidget, QWidget, QLabel, QVBoxLayout
+from PyQt5.QtGui import QTextCursor, QBrush, QFont
+from PyQt5.QtCore import Qt, QObject, QRunnable, QThreadPool, QAbstractTableModel, QSortFilterProxyModel, QModelIndex, QVariant, pyqtSignal
+
+from common import common
 
 def centerWindow(window):
     """
@@ -23,3 +29,498 @@ def textEditVisiblePosition(textEditItem, position='End'):
 
     textEditItem.setTextCursor(cursor)
     textEditItem.ensureCursorVisible()
+
+class queryRequest:
+    """
+    The handle of one query on queryLoader, it is passed to the query function as the first argument.
+    The query function could check isCanceled() to stop early (the request is superseded by a newer one with the same name),
+    and report the progress (like the loaded job number) with setProgress().
+    """
+    def __init__(self, name, requestId, loader, signals):
+        self.name = name
+        self.requestId = requestId
+        self.loader = loader
+        self.signals = signals
+
+    def isCanceled(self):
+        return(self.loader.getRequestId(self.name) != self.requestId)
+
+    def setProgress(self, number):
+        if not self.isCanceled():
+            self.signals.progress.emit(self.name, self.requestId, number)
+
+class queryWorkerSignals(QObject):
+    """
+    The signals of queryWorker, they are emitted on the worker thread and delivered on the GUI thread.
+    """
+    finished = pyqtSignal(str, int, object)
+    failed = pyqtSignal(str, int, str)
+    progress = pyqtSignal(str, int, int)
+
+class queryWorker(QRunnable):
+    """
+    Run the query function (function(request, *args)) on QThreadPool, send the result with the signals.
+    """
+    def __init__(self, request, function, args):
+        super().__init__()
+        self.request = request
+        self.function = function
+        self.args = args
+
+    def run(self):
+        try:
+            result = self.function(self.request, *self.args)
+        except Exception:
+            self.request.signals.failed.emit(self.request.name, self.request.requestId, traceback.format_exc())
+        else:
+            self.request.signals.finished.emit(self.request.name, self.request.requestId, result)
+
+class queryLoader(QObject):
+    """
+    Run the (slow) openlava/sqlite3 queries on the background threads, so the GUI keeps responsive.
+    Every query has a name (like 'jobs'), a new query supersedes the running query with the same name, the superseded query
+    is canceled (see queryRequest.isCanceled) and its result is dropped.
+    loaded(name, result)  : the result of the latest query of the name.
+    failed(name, message) : the latest query of the name raises an exception.
+    progress(name, number): the progress of the latest query of the name.
+    busy(number)          : the number of the running queries (the superseded ones are not counted).
+    """
+    loaded = pyqtSignal(str, object)
+    failed = pyqtSignal(str, str)
+    progress = pyqtSignal(str, int)
+    busy = pyqtSignal(int)
+
+    def __init__(self, parent=None, maxThreadCount=4):
+        super().__init__(parent)
+        self.threadPool = QThreadPool(self)
+        self.threadPool.setMaxThreadCount(maxThreadCount)
+        self.requestIdDic = {}
+        self.lastRequestId = 0
+        self.runningNameSet = set()
+        self.signalsSet = set()
+
+    def isBusy(self):
+        """
+        Whether any query is running.
+        """
+        return(len(self.runningNameSet) > 0)
+
+    def getRequestId(self, name):
+        """
+        Get the request id of the latest query of the name, 0 for no query.
+        """
+        return(self.requestIdDic.get(name, 0))
+
+    def load(self, name, function, *args):
+        """
+        Run function(request, *args) on the thread pool, cancel the running query with the same name, return the request id.
+        """
+        self.lastRequestId += 1
+        self.requestIdDic[name] = self.lastRequestId
+
+        # The signals object must be alive until the worker finishes.
+        signals = queryWorkerSignals()
+        signals.finished.connect(self.workerFinished)
+        signals.failed.connect(self.workerFailed)
+        signals.progress.connect(self.workerProgress)
+        self.signalsSet.add(signals)
+
+        request = queryRequest(name, self.lastRequestId, self, signals)
+        self.threadPool.start(queryWorker(request, function, args))
+        self.setRunning(name, True)
+
+        return(self.lastRequestId)
+
+    def cancel(self, name):
+        """
+        Cancel the running query of the name, its result is dropped.
+        """
+        if name in self.requestIdDic:
+            self.lastRequestId += 1
+            self.requestIdDic[name] = self.lastRequestId
+            self.setRunning(name, False)
+
+    def setRunning(self, name, running):
+        if running:
+            self.runningNameSet.add(name)
+        else:
+            self.runningNameSet.discard(name)
+
+        self.busy.emit(len(self.runningNameSet))
+
+    def releaseSignals(self):
+        signals = self.sender()
+
+        if signals in self.signalsSet:
+            self.signalsSet.remove(signals)
+
+    def workerFinished(self, name, requestId, result):
+        self.releaseSignals()
+
+        if requestId == self.getRequestId(name):
+            self.setRunning(name, False)
+            self.loaded.emit(name, result)
+
+    def workerFailed(self, name, requestId, message):
+        self.releaseSignals()
+
+        if requestId == self.getRequestId(name):
+            self.setRunning(name, False)
+            self.failed.emit(name, message)
+
+    def workerProgress(self, name, requestId, number):
+        if requestId == self.getRequestId(name):
+            self.progress.emit(name, number)
+
+def getRowRangeList(rowList):
+    """
+    Group the row numbers into the ascending continuous ranges [(firstRow, lastRow), ...].
+    """
+    rowRangeList = []
+
+    for row in sorted(rowList):
+        if (len(rowRangeList) > 0) and (rowRangeList[-1][1] == row-1):
+            rowRangeList[-1] = (rowRangeList[-1][0], row)
+        else:
+            rowRangeList.append((row, row))
+
+    return(rowRangeList)
+
+class tableModel(QAbstractTableModel):
+    """
+    Read-only table model over a record list (like the jobRecord list), the cell values are got from the record on demand, so
+    the view only reads the visible cells.
+    columnList is a list of (header, valueFunction, displayFunction), valueFunction(record) returns the typed value (None for
+    the missing value) which is used for sorting (Qt.UserRole), displayFunction(value) returns the shown text (the value itself
+    if displayFunction is None).
+    highlightFunction(record, column) returns True for the cells which are shown with bold red font.
+    keyFunction(record) returns the unique key of the record (like the job id), it is used by updateRecords to find the
+    added/removed/changed records.
+    The records are sorted on the model with one python sort (the missing values are the smallest), it is much faster than
+    sorting on QSortFilterProxyModel, which calls data() for every comparison.
+    """
+    def __init__(self, columnList, highlightFunction=None, keyFunction=None, parent=None):
+        super().__init__(parent)
+        self.columnList = columnList
+        self.highlightFunction = highlightFunction
+        self.keyFunction = keyFunction
+        self.recordList = []
+        self.sortColumn = -1
+        self.sortOrder = Qt.AscendingOrder
+        self.highlightFont = QFont('song', 10, QFont.Bold)
+        self.highlightBrush = QBrush(Qt.red)
+
+    def setRecords(self, recordList):
+        """
+        Replace all of the records.
+        """
+        self.beginResetModel()
+        self.recordList = self.sortRecords(list(recordList))
+        self.endResetModel()
+
+    def getRecordValues(self, record):
+        """
+        Get the typed values of all of the columns, the records with the same values are shown the same.
+        """
+        return(tuple([valueFunction(record) for (header, valueFunction, displayFunction) in self.columnList]))
+
+    def updateRecords(self, recordList):
+        """
+        Apply the delta between the current records and the new records (with the same key): remove the missing rows, update
+        the changed rows and append the new rows, so the view keeps the selection/scrolling and only repaints the changed rows.
+        Fall back to setRecords if there is no keyFunction, or most of the rows are changed.
+        Return (addedNum, removedNum, changedNum).
+        """
+        recordList = list(recordList)
+        oldRowDic = {}
+
+        for (row, record) in enumerate(self.recordList):
+            oldRowDic[self.keyFunction(record) if self.keyFunction else row] = row
+
+        newRecordDic = collections.OrderedDict()
+
+        if self.keyFunction is not None:
+            for record in recordList:
+                newRecordDic[self.keyFunction(record)] = record
+
+        removedRowList = [row for (key, row) in oldRowDic.items() if key not in newRecordDic]
+        addedRecordList = [record for (key, record) in newRecordDic.items() if key not in oldRowDic]
+        changedRowDic = {}
+
+        for (key, record) in newRecordDic.items():
+            if key in oldRowDic:
+                row = oldRowDic[key]
+
+                if self.getRecordValues(record) != self.getRecordValues(self.recordList[row]):
+                    changedRowDic[row] = record
+
+        if (self.keyFunction is None) or (len(removedRowList) + len(changedRowDic) > len(self.recordList)/2):
+            self.setRecords(recordList)
+            return(len(addedRecordList), len(removedRowList), len(changedRowDic))
+
+        # Update the changed rows.
+        for row in changedRowDic.keys():
+            self.recordList[row] = changedRowDic[row]
+
+        for (firstRow, lastRow) in getRowRangeList(changedRowDic.keys()):
+            self.dataChanged.emit(self.index(firstRow, 0), self.index(lastRow, len(self.columnList)-1))
+
+        # Remove the missing rows, from the last range to the first range, so the row numbers of the other ranges are not changed.
+        for (firstRow, lastRow) in reversed(getRowRangeList(removedRowList)):
+            self.beginRemoveRows(QModelIndex(), firstRow, lastRow)
+            del self.recordList[firstRow:lastRow+1]
+            self.endRemoveRows()
+
+        # Append the new rows, then sort them into the right place.
+        if len(addedRecordList) > 0:
+            self.beginInsertRows(QModelIndex(), len(self.recordList), len(self.recordList)+len(addedRecordList)-1)
+            self.recordList.extend(addedRecordList)
+            self.endInsertRows()
+
+            self.sort(self.sortColumn, self.sortOrder)
+        elif len(changedRowDic) > 0:
+            self.sort(self.sortColumn, self.sortOrder)
+
+        return(len(addedRecordList), len(removedRowList), len(changedRowDic))
+
+    def getSortKey(self, record):
+        """
+        Get the sort key of the record with the current sort column, the missing value is the smallest.
+        """
+        value = self.columnList[self.sortColumn][1](record)
+        return((value is not None, value))
+
+    def sortRecords(self, recordList):
+        """
+        Sort the record list with the current sort column/order.
+        """
+        if (self.sortColumn < 0) or (self.sortColumn >= len(self.columnList)):
+            return(recordList)
+
+        return(sorted(recordList, key=self.getSortKey, reverse=(self.sortOrder == Qt.DescendingOrder)))
+
+    def sort(self, column, order=Qt.AscendingOrder):
+        """
+        Sort the records with the typed values of the column, keep the persistent indexes (like the selection) on the same records.
+        """
+        self.sortColumn = column
+        self.sortOrder = order
+
+        if (column < 0) or (column >= len(self.columnList)):
+            return
+
+        self.layoutAboutToBeChanged.emit()
+
+        oldRecordList = self.recordList
+        rowList = sorted(range(len(oldRecordList)), key=lambda row: self.getSortKey(oldRecordList[row]), reverse=(order == Qt.DescendingOrder))
+        self.recordList = [oldRecordList[row] for row in rowList]
+        oldIndexList = self.persistentIndexList()
+
+        if len(oldIndexList) > 0:
+            newRowList = [0]*len(rowList)
+
+            for (newRow, oldRow) in enumerate(rowList):
+                newRowList[oldRow] = newRow
+
+            self.changePersistentIndexList(oldIndexList, [self.index(newRowList[index.row()], index.column()) for index in oldIndexList])
+
+        self.layoutChanged.emit()
+
+    def getRecord(self, row):
+        return(self.recordList[row])
+
+    def rowCount(self, parent=QModelIndex()):
+        if parent.isValid():
+            return(0)
+
+        return(len(self.recordList))
+
+    def columnCount(self, parent=QModelIndex()):
+        if parent.isValid():
+            return(0)
+
+        return(len(self.columnList))
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid():
+            return(QVariant())
+
+        record = self.recordList[index.row()]
+        (header, valueFunction, displayFunction) = self.columnList[index.column()]
+
+        if role == Qt.DisplayRole:
+            value = valueFunction(record)
+
+            if value is None:
+                return('')
+            elif displayFunction is not None:
+                return(displayFunction(value))
+            else:
+                return(value)
+        elif role == Qt.UserRole:
+            return(valueFunction(record))
+        elif (role in [Qt.FontRole, Qt.ForegroundRole]) and (self.highlightFunction is not None) and self.highlightFunction(record, index.column()):
+            if role == Qt.FontRole:
+                return(self.highlightFont)
+            else:
+                return(self.highlightBrush)
+
+        return(QVariant())
+
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if (role == Qt.DisplayRole) and (orientation == Qt.Horizontal):
+            return(self.columnList[section][0])
+
+        return(super().headerData(section, orientation, role))
+
+class sortFilterProxyModel(QSortFilterProxyModel):
+    """
+    Filter the tableModel records with filterFunction(record) (True to show), the sorting is passed to the tableModel.
+    """
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.filterFunction = None
+
+    def sort(self, column, order=Qt.AscendingOrder):
+        self.sourceModel().sort(column, order)
+
+    def setFilterFunction(self, filterFunction):
+        self.filterFunction = filterFunction
+        self.invalidateFilter()
+
+    def filterAcceptsRow(self, sourceRow, sourceParent):
+        if (self.filterFunction is not None) and (not self.filterFunction(self.sourceModel().getRecord(sourceRow))):
+            return(False)
+
+        return(super().filterAcceptsRow(sourceRow, sourceParent))
+
+    def getRecord(self, index):
+        """
+        Get the source record of the (proxy) index.
+        """
+        return(self.sourceModel().getRecord(self.mapToSource(index).row()))
+
+def getAxisRange(valueList, margin=0):
+    """
+    Get the (min, max) axis range of the values with the margin (ratio of max-min) on both sides, it is (min-1, max+1) if all of the values are the same.
+    """
+    minValue = min(valueList)
+    maxValue = max(valueList)
+
+    if minValue == maxValue:
+        return(minValue-1, maxValue+1)
+
+    return(minValue-margin*(maxValue-minValue), maxValue+margin*(maxValue-minValue))
+
+class curveCanvas(QWidget):
+    """
+    Embedded matplotlib curve widget (FigureCanvasQTAgg with the zoom/pan navigation toolbar).
+    One figure is reused by the widget, setCurves updates the line data in place, nothing is saved on disk.
+    """
+    def __init__(self, title='', parent=None):
+        super().__init__(parent)
+        self.title = title
+        self.figure = None
+        self.lineList = []
+
+        layout = QVBoxLayout()
+        layout.setContentsMargins(0, 0, 0, 0)
+        self.setLayout(layout)
+
+        try:
+            from matplotlib.figure import Figure
+            from matplotlib.backends.backend_qt5agg import FigureCanvasQTAgg, NavigationToolbar2QT
+        except ImportError as error:
+            common.printWarning('*Warning* (curveCanvas) : Failed on importing matplotlib, cannot draw the curves, ' + str(error))
+            label = QLabel(str(title) + ' (matplotlib is not installed)', self)
+            label.setAlignment(Qt.AlignCenter)
+            layout.addWidget(label)
+            return
+
+        # Use matplotlib.figure.Figure instead of pyplot, the figure is not registered on pyplot, so it is released with the widget.
+        self.figure = Figure()
+        self.canvas = FigureCanvasQTAgg(self.figure)
+        self.canvas.setParent(self)
+        self.toolbar = NavigationToolbar2QT(self.canvas, self)
+        self.axes = self.figure.add_subplot(111)
+        self.peakText = self.axes.text(0, 0, '')
+
+        layout.addWidget(self.toolbar)
+        layout.addWidget(self.canvas)
+
+        self.clearCurves()
+
+    def clearCurves(self, title=None):
+        """
+        Clear the curve data (keep the lines for the next setCurves), show the title only.
+        """
+        if self.figure is None:
+            return
+
+        for line in self.lineList:
+            line.set_data([], [])
+
+        self.peakText.set_text('')
+        self.axes.set_title(self.title if title is None else title)
+        self.toolbar.update()
+        self.canvas.draw_idle()
+
+    def setCurves(self, xList, yLists, xLabel='', yLabel='', yLabels=[], xTickLabels=[], title='', peakUnit=None, colorList=['red', 'green', 'blue', 'cyan', 'magenta', 'yellow', 'black'], marker=''):
+        """
+        Draw the curves (one curve per yList of yLists) on the same xList.
+        xTickLabels : the string tick labels of xList (like the dates).
+        peakUnit : show the peak value of the first curve with the unit (like 'G'), None to hide it.
+        """
+        if (self.figure is None) or (len(xList) == 0) or (len(yLists) == 0):
+            return
+
+        from matplotlib.ticker import AutoLocator, ScalarFormatter
+
+        # Re-create the lines only if the curve number is changed, otherwise update the line data in place.
+        if len(self.lineList) != len(yLists):
+            for line in self.lineList:
+                line.remove()
+
+            self.lineList = [self.axes.plot([], [])[0] for yList in yLists]
+
+        for (i, yList) in enumerate(yLists):
+            line = self.lineList[i]
+            line.set_data(xList, yList)
+            line.set_color(colorList[i%len(colorList)])
+            line.set_marker(marker)
+            line.set_label(yLabels[i] if i < len(yLabels) else '_curve' + str(i))
+
+        if len(yLabels) > 0:
+            self.axes.legend(loc='upper right')
+        elif self.axes.get_legend() is not None:
+            self.axes.get_legend().remove()
+
+        if len(xTickLabels) > 0:
+            self.axes.set_xticks(list(xList))
+            self.axes.set_xticklabels(xTickLabels, rotation=30, fontsize=12)
+            self.figure.subplots_adjust(bottom=0.2)
+        else:
+            self.axes.xaxis.set_major_locator(AutoLocator())
+            self.axes.xaxis.set_major_formatter(ScalarFormatter())
+            self.figure.subplots_adjust(bottom=0.15)
+
+        self.axes.set_xlabel(xLabel)
+        self.axes.set_ylabel(yLabel)
+        self.axes.set_title(title or self.title)
+        self.axes.grid(True)
+
+        # Define the curve range.
+        self.axes.set_xlim(getAxisRange(xList))
+        self.axes.set_ylim(getAxisRange([y for yList in yLists for y in yList], margin=0.1))
+
+        # Show the peak value.
+        if peakUnit is None:
+            self.peakText.set_text('')
+        else:
+            peak = max(yLists[0])
+            self.peakText.set_position((min(xList), peak))
+            self.peakText.set_text('peak: ' + str(peak) + str(peakUnit))
+
+        # Reset the zoom/pan history of the toolbar, so "Home" goes back to the new curves.
+        self.toolbar.update()
+        self.canvas.draw_idle()
@@ -1,18 +1,49 @@
 import os
 import re
 import sys
+import json
+import atexit
 import sqlite3
+import itertools
+import threading
+import collections
 
 sys.path.append('MONITORPATH')
+from conf import config
 from common import common
 
-def connectDbFile(dbFile, mode='read'):
+# WAL mode is opt-in with "sqliteWalMode = True" on config.py.
+# With WAL, readers never block the writer (and the writer never blocks readers), writers wait on the
+# database lock for "sqliteBusyTimeout" seconds instead of skipping the sampling cycle.
+# WAL requires the shared memory of the local host, don't enable it if dbPath is on NFS.
+sqliteWalMode = getattr(config, 'sqliteWalMode', False)
+sqliteBusyTimeout = getattr(config, 'sqliteBusyTimeout', 60)
+
+# Connection tuning, page cache size (KiB), memory-mapped I/O size (bytes) and prepared statement cache (statements).
+sqliteCacheSize = getattr(config, 'sqliteCacheSize', 16384)
+sqliteMmapSize = getattr(config, 'sqliteMmapSize', 268435456)
+sqliteCachedStatements = 256
+
+# The connections of connectCachedDbFile, (realpath, mode, thread): (conn, inode), the least recently used one is the first one.
+# sqlite3 connections can only be used on the thread which creates them, so the thread is part of the key.
+connectionCacheDic = collections.OrderedDict()
+connectionCacheLock = threading.Lock()
+connectionCacheSize = getattr(config, 'sqliteConnectionCacheSize', 16)
+
+def connectDbFile(dbFile, mode='read', walMode=None):
+    """
+    Connect the db file, return (result, conn), result is 'passed', 'failed' or 'locked'.
+    walMode is sqliteWalMode (config.py) by default.
+    """
     result = 'passed'
     conn = ''
 
+    if walMode is None:
+        walMode = sqliteWalMode
+
     if mode == 'write':
         journalDbFile = str(dbFile) + '-journal'
-        if os.path.exists(journalDbFile) and (mode == 'write'):
+        if (not walMode) and os.path.exists(journalDbFile):
             common.printWarning('*Warning*: database file "' + str(dbFile) + '" is on another connection, will not connect it.')
             result = 'locked'
             return(result, conn)
@@ -23,20 +54,124 @@ def connectDbFile(dbFile, mode='read'):
             return(result, conn)
 
     try:
-        conn = sqlite3.connect(dbFile)
+        if walMode:
+            if mode == 'write':
+                # Take the write lock when the transaction begins, so the busy timeout applies to it.
+                conn = sqlite3.connect(dbFile, timeout=sqliteBusyTimeout, isolation_level='IMMEDIATE', cached_statements=sqliteCachedStatements)
+                conn.execute('PRAGMA journal_mode=WAL')
+            else:
+                conn = sqlite3.connect(dbFile, timeout=sqliteBusyTimeout, cached_statements=sqliteCachedStatements)
+            conn.execute('PRAGMA synchronous=NORMAL')
+        else:
+            conn = sqlite3.connect(dbFile, cached_statements=sqliteCachedStatements)
+
+        conn.execute('PRAGMA cache_size=-' + str(int(sqliteCacheSize)))
+        conn.execute('PRAGMA mmap_size=' + str(int(sqliteMmapSize)))
     except Exception as error:
         common.printError('*Error*: Failed on connecting database file "' + str(dbFile) + '": ' + str(error))
         result = 'failed'
 
     return(result, conn)
 
+def connectCachedDbFile(dbFile, mode='read'):
+    """
+    Get the connection of dbFile-mode from the process-wide connection cache (connect it if it is not cached), return (result, conn).
+    The cached connection is shared by all of the callers, don't close it, it is closed on LRU eviction or on exit (the uncommitted
+    changes are rolled back, and the connection in a transaction is not evicted, so commit the changes explicitly).
+    """
+    realDbFile = os.path.realpath(dbFile)
+    cacheKey = (realDbFile, mode, threading.current_thread().ident)
+
+    with connectionCacheLock:
+        cacheValue = connectionCacheDic.pop(cacheKey, None)
+
+    if cacheValue is not None:
+        (conn, inode) = cacheValue
+
+        try:
+            # The db file could be removed or replaced (upgradeDb.py), and the connection could be closed by the caller.
+            if os.stat(realDbFile).st_ino == inode:
+                conn.execute('SELECT 1')
+
+                with connectionCacheLock:
+                    connectionCacheDic[cacheKey] = (conn, inode)
+
+                if (mode == 'write') and (not sqliteWalMode) and (not conn.in_transaction) and os.path.exists(str(realDbFile) + '-journal'):
+                    common.printWarning('*Warning*: database file "' + str(dbFile) + '" is on another connection, will not connect it.')
+                    return('locked', '')
+
+                return('passed', conn)
+        except Exception:
+            pass
+
+        closeConnection(conn)
+
+    (result, conn) = connectDbFile(dbFile, mode)
+
+    if result == 'passed':
+        evictedConnList = []
+
+        with connectionCacheLock:
+            connectionCacheDic[cacheKey] = (conn, os.stat(realDbFile).st_ino)
+
+            # Evict the least recently used connections which are not in a transaction, the pending changes are kept for their callers.
+            for evictedKey in list(connectionCacheDic.keys()):
+                if len(connectionCacheDic) <= connectionCacheSize:
+                    break
+
+                evictedConn = connectionCacheDic[evictedKey][0]
+
+                if (evictedKey != cacheKey) and (not isInTransaction(evictedConn)):
+                    del connectionCacheDic[evictedKey]
+                    evictedConnList.append(evictedConn)
+
+        for evictedConn in evictedConnList:
+            closeConnection(evictedConn)
+
+    return(result, conn)
+
+def isInTransaction(conn):
+    """
+    Whether the connection has the uncommitted changes, False for the closed connection.
+    """
+    try:
+        return(conn.in_transaction)
+    except Exception:
+        return(False)
+
+def closeConnection(conn):
+    """
+    Roll back the uncommitted changes and close the connection, ignore the closed connection.
+    """
+    try:
+        conn.rollback()
+        conn.close()
+    except Exception:
+        pass
+
+def closeCachedConnections():
+    """
+    Close all of the cached connections.
+    """
+    with connectionCacheLock:
+        connList = [conn for (conn, inode) in connectionCacheDic.values()]
+        connectionCacheDic.clear()
+
+    for conn in connList:
+        closeConnection(conn)
+
+atexit.register(closeCachedConnections)
+
 def connectPreprocess(dbFile, orig_conn, mode='read'):
     if orig_conn == '':
-        (result, conn) = connectDbFile(dbFile, mode)
+        (result, conn) = connectCachedDbFile(dbFile, mode)
     else:
         result = 'passed'
         conn = orig_conn
 
+    if result != 'passed':
+        return(result, conn, '')
+
     curs = conn.cursor()
 
     return(result, conn, curs)
@@ -59,8 +194,6 @@ def getSqlTableList(dbFile, orig_conn):
             (key,) = item
             tableList.append(key)
         curs.close()
-        if orig_conn == '':
-            conn.close()
     except Exception as error:
         common.printError('*Error* (getSqlTableList) : Failed on getting table list on dbFile "' + str(dbFile) + '": ' + str(error))
 
@@ -83,8 +216,6 @@ def getSqlTableCount(dbFile, orig_conn, tableName):
         returnTuple = returnList[0]
         count = returnTuple[0]
         curs.close()
-        if orig_conn == '':
-            conn.close()
     except Exception as error:
         common.printError('*Error* (getSqlTableCount) : Failed on getting table count fro table "' + str(tableName) + '" on dbFile "' + str(dbFile) + '": ' + str(error))
 
@@ -105,56 +236,110 @@ def getSqlTableKeyList(dbFile, orig_conn, tableName):
         curs.execute(command)
         keyList = [tuple[0] for tuple in curs.description]
         curs.close()
-        if orig_conn == '':
-            conn.close()
     except Exception as error:
         common.printError('*Error* (getSqlTableKeyList) : Failed on getting table key list on dbFile "' + str(dbFile) + '": ' + str(error))
 
     return(keyList)
 
-def getSqlTableData(dbFile, orig_conn, tableName, keyList=[], limit=0):
+def genSqlSelectCommand(tableName, keyList, tableKeyList, conditionDic={}, rangeKey='', rangeBegin=None, rangeEnd=None, orderKey='', limit=0, tail=False):
     """
-    With specified dbFile-tableName, get all data from specified keyList.
+    Generate (command, parameterList) for getting the keyList columns of table tableName.
+    conditionDic  : {key: value}, only get the rows which key == value.
+    rangeKey      : only get the rows which rangeBegin <= rangeKey <= rangeEnd (rangeBegin/rangeEnd is None for no limit).
+    orderKey      : order the rows with orderKey (ascending).
+    limit/tail    : only get the first limit rows, or the last limit rows (by orderKey, the first key by default) if tail is True, the rows are still ascending.
     """
-    dataDic = {}
+    for key in list(keyList) + list(conditionDic.keys()) + [rangeKey, orderKey]:
+        if (key != '') and (key not in tableKeyList):
+            raise ValueError('"' + str(key) + '": invalid key.')
+
+    if tail and (limit != 0) and (orderKey == ''):
+        orderKey = tableKeyList[0]
+
+    selectString = ', '.join(['"' + str(key) + '"' for key in keyList])
+    conditionList = []
+    parameterList = []
+
+    for (key, value) in conditionDic.items():
+        conditionList.append('"' + str(key) + '" = ?')
+        parameterList.append(value)
+
+    if rangeKey != '':
+        if rangeBegin is not None:
+            conditionList.append('"' + str(rangeKey) + '" >= ?')
+            parameterList.append(rangeBegin)
+
+        if rangeEnd is not None:
+            conditionList.append('"' + str(rangeKey) + '" <= ?')
+            parameterList.append(rangeEnd)
+
+    if len(conditionList) > 0:
+        whereString = ' WHERE ' + ' AND '.join(conditionList)
+    else:
+        whereString = ''
+
+    if tail and (limit != 0):
+        # Get the last rows with a descending sub-query, then switch them back into ascending order.
+        command = 'SELECT ' + str(selectString) + ' FROM (SELECT ' + str(selectString) + ', "' + str(orderKey) + '" AS tailOrderKey FROM \'' + str(tableName) + '\'' + str(whereString) + ' ORDER BY "' + str(orderKey) + '" DESC LIMIT ' + str(int(limit)) + ') ORDER BY tailOrderKey'
+    else:
+        command = 'SELECT ' + str(selectString) + ' FROM \'' + str(tableName) + '\'' + str(whereString)
+
+        if orderKey != '':
+            command = str(command) + ' ORDER BY "' + str(orderKey) + '"'
+
+        if limit != 0:
+            command = str(command) + ' LIMIT ' + str(int(limit))
+
+    return(command, parameterList)
 
+def iterSqlTableData(dbFile, orig_conn, tableName, keyList=[], conditionDic={}, rangeKey='', rangeBegin=None, rangeEnd=None, orderKey='', limit=0, tail=False):
+    """
+    With specified dbFile-tableName, iterate the rows (value tuples of keyList) from a sqlite cursor.
+    The columns, filters, order and limit are done by sqlite, see genSqlSelectCommand for the arguments.
+    """
     (result, conn, curs) = connectPreprocess(dbFile, orig_conn)
     if result == 'failed':
-        return(dataDic)
+        return
 
     try:
-        command = "SELECT * FROM '" + str(tableName) + "'"
+        tableKeyList = getSqlTableKeyList(dbFile, conn, tableName)
 
-        if limit != 0:
-            command = str(command) + ' limit ' + str(limit)
-
-        results = curs.execute(command)
-        allItems = results.fetchall()
-        tableKeyList = [tuple[0] for tuple in curs.description]
-        curs.close()
-        if orig_conn == '':
-            conn.close()
+        if len(tableKeyList) == 0:
+            return
 
         if len(keyList) == 0:
             keyList = tableKeyList
-        else:
-            for key in keyList:
-                if key not in tableKeyList:
-                    common.printError('*Error* (getSqlTableData) : "' + str(key) + '": invalid key on specified key list.')
-                    return(dataDic)
 
-        for item in allItems:
-            valueList = list(item)
-            for i in range(len(tableKeyList)):
-                key = tableKeyList[i]
-                if key in keyList:
-                    value = valueList[i]
-                    if key in dataDic.keys():
-                        dataDic[key].append(value)
-                    else:
-                        dataDic[key]=[value,]
+        (command, parameterList) = genSqlSelectCommand(tableName, keyList, tableKeyList, conditionDic, rangeKey, rangeBegin, rangeEnd, orderKey, limit, tail)
+
+        for item in curs.execute(command, parameterList):
+            yield(item)
+
+        curs.close()
     except Exception as error:
-        common.printError('*Error* (getSqlTableData) : Failed on getting table info from table "' + str(tableName) + '" of dbFile "' + str(dbFile) + '": ' + str(error))
+        common.printError('*Error* (iterSqlTableData) : Failed on getting table info from table "' + str(tableName) + '" of dbFile "' + str(dbFile) + '": ' + str(error))
+
+def getSqlTableData(dbFile, orig_conn, tableName, keyList=[], limit=0, conditionDic={}, rangeKey='', rangeBegin=None, rangeEnd=None, orderKey='', tail=False):
+    """
+    With specified dbFile-tableName, get all data from specified keyList, return a dict of key: valueList.
+    The columns, filters, order and limit are done by sqlite, see genSqlSelectCommand for the arguments.
+    """
+    dataDic = {}
+
+    if len(keyList) == 0:
+        keyList = getSqlTableKeyList(dbFile, orig_conn, tableName)
+
+        if len(keyList) == 0:
+            return(dataDic)
+
+    columnList = [[] for key in keyList]
+
+    for item in iterSqlTableData(dbFile, orig_conn, tableName, keyList, conditionDic, rangeKey, rangeBegin, rangeEnd, orderKey, limit, tail):
+        for i in range(len(columnList)):
+            columnList[i].append(item[i])
+
+    if (len(columnList) > 0) and (len(columnList[0]) > 0):
+        dataDic = dict(zip(keyList, columnList))
 
     return(dataDic)
 
@@ -172,8 +357,6 @@ def deleteSqlTableRows(dbFile, orig_conn, tableName, rowId, beginLine, endLine,
         curs.close()
         if commit:
             conn.commit()
-            if orig_conn == '':
-                conn.close()
     except Exception as error:
         common.printError('*Error* (dropSqlTable) : Failed on deleting table "' + str(tableName) + '" lines ' + str(beginLine) + '-' + str(endLine) + ': ' + str(error))
 
@@ -191,8 +374,6 @@ def dropSqlTable(dbFile, orig_conn, tableName, commit=True):
         curs.close()
         if commit:
             conn.commit()
-            if orig_conn == '':
-                conn.close()
     except Exception as error:
         common.printError('*Error* (dropSqlTable) : Failed on drop table "' + str(tableName) + '" from dbFile "' + str(dbFile) + '": ' + str(error))
 
@@ -210,8 +391,6 @@ def createSqlTable(dbFile, orig_conn, tableName, initString, commit=True):
         curs.close()
         if commit:
             conn.commit()
-            if orig_conn == '':
-                conn.close()
     except Exception as error:
         common.printError('*Error* (createSqlTable) : Failed on creating table "' + str(tableName) + '" on db file "' + str(dbFile) + '": ' + str(error))
 
@@ -229,14 +408,43 @@ def insertIntoSqlTable(dbFile, orig_conn, tableName, valueString, commit=True):
         curs.close()
         if commit:
             conn.commit()
-            if orig_conn == '':
-                conn.close()
     except Exception as error:
         common.printError('*Error* (insertIntoSqlTable) : Failed on inserting specified values into table "' + str(tableName) + '" on db file "' + str(dbFile) + '": ' + str(error))
 
-def genSqlTableKeyString(keyList, keyTypeList=[], autoIncrement=False):
+def insertIntoSqlTableMany(dbFile, orig_conn, tableName, valueTupleList, commit=True, replace=False):
+    """
+    Insert new values (an iterable of value tuples/lists) into sql table.
+    All of the rows share one prepared statement with bound parameters (executemany), no quoting is required.
+    If replace is True, the existing rows with the same primary key are replaced.
+    """
+    valueTupleIter = iter(valueTupleList)
+    firstValueTuple = next(valueTupleIter, None)
+
+    if firstValueTuple is None:
+        return
+
+    (result, conn, curs) = connectPreprocess(dbFile, orig_conn, mode='write')
+    if (result == 'failed') or (result == 'locked'):
+        return
+
+    try:
+        if replace:
+            command = "INSERT OR REPLACE INTO '" + str(tableName) + "' VALUES ("
+        else:
+            command = "INSERT INTO '" + str(tableName) + "' VALUES ("
+
+        command = str(command) + ', '.join(['?']*len(firstValueTuple)) + ")"
+        curs.executemany(command, itertools.chain([firstValueTuple], valueTupleIter))
+        curs.close()
+        if commit:
+            conn.commit()
+    except Exception as error:
+        common.printError('*Error* (insertIntoSqlTableMany) : Failed on inserting specified values into table "' + str(tableName) + '" on db file "' + str(dbFile) + '": ' + str(error))
+
+def genSqlTableKeyString(keyList, keyTypeList=[], autoIncrement=False, primaryKeyList=[]):
     """
     Switch the input keyList into the sqlite table key string.
+    The first key is the primary key by default, specify primaryKeyList for a composite primary key.
     """
     keyString = '('
 
@@ -249,10 +457,15 @@ def genSqlTableKeyString(keyList, keyTypeList=[], autoIncrement=False):
         if i == 0:
             if autoIncrement:
                 keyString = str(keyString) + "id INTEGER PRIMARY KEY AUTOINCREMENT, '" + str(key) + "' " + str(keyType) + ","
+            elif len(primaryKeyList) > 0:
+                keyString = str(keyString) + "'" + str(key) + "' " + str(keyType) + ","
             else:
                 keyString = str(keyString) + "'" + str(key) + "' " + str(keyType) + " PRIMARY KEY,"
         elif i == len(keyList)-1:
-            keyString = str(keyString) + " '" + str(key) + "' " + str(keyType) + ");"
+            if len(primaryKeyList) > 0:
+                keyString = str(keyString) + " '" + str(key) + "' " + str(keyType) + ", PRIMARY KEY ('" + "', '".join(primaryKeyList) + "'));"
+            else:
+                keyString = str(keyString) + " '" + str(key) + "' " + str(keyType) + ");"
         else:
             keyString = str(keyString) + " '" + str(key) + "' " + str(keyType) + ","
 
@@ -279,3 +492,300 @@ def genSqlTableValueString(valueList, autoIncrement=False):
             valueString = str(valueString) + " '" + str(value) + "',"
 
     return(valueString)
+
+## For schema version (begin) ##
+# Schema version of the sampled db files, it is saved as "PRAGMA user_version".
+# 0 : legacy schema, VARCHAR(255) columns, '%Y%m%d_%H%M%S'/'%Y-%m-%d %H:%M:%S' time strings, 'G'/'NA' strings.
+# 1 : typed schema, INTEGER epoch seconds, INTEGER job/slot numbers, REAL cpu and REAL memory (unit is G), NULL for the missing value.
+# Upgrade the legacy db files with "monitor/tools/upgradeDb.py".
+sqlSchemaVersion = 1
+
+# (keyList, keyTypeList) of the typed sample tables, table name is "<type>_<queue/host/user>" on bsample.py db files and "<user>" on jobResourceMonitor.py user db files.
+sampleTableSchemaDic = {
+                        'queue'   : (['sampleTime', 'NJOBS', 'PEND', 'RUN', 'SUSP'],
+                                     ['INTEGER', 'INTEGER', 'INTEGER', 'INTEGER', 'INTEGER']),
+                        'host'    : (['sampleTime', 'MAX', 'NJOBS', 'RUN', 'SSUSP', 'USUSP'],
+                                     ['INTEGER', 'INTEGER', 'INTEGER', 'INTEGER', 'INTEGER', 'INTEGER']),
+                        'load'    : (['sampleTime', 'ut', 'tmp', 'swp', 'mem'],
+                                     ['INTEGER', 'REAL', 'REAL', 'REAL', 'REAL']),
+                        'user'    : (['sampleTime', 'NJOBS', 'PEND', 'RUN', 'SSUSP', 'USUSP'],
+                                     ['INTEGER', 'INTEGER', 'INTEGER', 'INTEGER', 'INTEGER', 'INTEGER']),
+                        'userJob' : (['SAMPLE_TIME', 'JOB', 'STATUS', 'CPU_RESERVED', 'CPU_AVG', 'CPU_PEAK', 'MEM_RESERVED', 'MEM_AVG', 'MEM_PEAK', 'RUN_TIME', 'CWD', 'COMMAND'],
+                                     ['INTEGER', 'VARCHAR(20)', 'VARCHAR(10)', 'INTEGER', 'REAL', 'REAL', 'REAL', 'REAL', 'REAL', 'INTEGER', 'VARCHAR(1000)', 'VARCHAR(1000)']),
+                       }
+
+def getSqlSchemaVersion(dbFile, orig_conn):
+    """
+    Get the schema version (PRAGMA user_version) of the db file.
+    """
+    version = 'N/A'
+
+    (result, conn, curs) = connectPreprocess(dbFile, orig_conn)
+    if result == 'failed':
+        return(version)
+
+    try:
+        curs.execute('PRAGMA user_version')
+        version = curs.fetchone()[0]
+        curs.close()
+    except Exception as error:
+        common.printError('*Error* (getSqlSchemaVersion) : Failed on getting schema version of dbFile "' + str(dbFile) + '": ' + str(error))
+
+    return(version)
+
+def setSqlSchemaVersion(dbFile, orig_conn, version=sqlSchemaVersion):
+    """
+    Set the schema version (PRAGMA user_version) of the db file.
+    """
+    (result, conn, curs) = connectPreprocess(dbFile, orig_conn, mode='write')
+    if (result == 'failed') or (result == 'locked'):
+        return
+
+    try:
+        curs.execute('PRAGMA user_version = ' + str(int(version)))
+        curs.close()
+    except Exception as error:
+        common.printError('*Error* (setSqlSchemaVersion) : Failed on setting schema version of dbFile "' + str(dbFile) + '": ' + str(error))
+
+def checkSqlSchemaVersion(dbFile, orig_conn, mode='read'):
+    """
+    Make sure the db file is on the current schema version, a new (empty) db file is set to the current schema version on write mode.
+    Return True if pass, else print the upgrade tip and return False.
+    """
+    version = getSqlSchemaVersion(dbFile, orig_conn)
+
+    if version == sqlSchemaVersion:
+        return(True)
+    elif version == 0:
+        if len(getSqlTableList(dbFile, orig_conn)) == 0:
+            if mode == 'write':
+                setSqlSchemaVersion(dbFile, orig_conn)
+
+            return(True)
+
+    if version != 'N/A':
+        common.printError('*Error*: database file "' + str(dbFile) + '" is on schema version ' + str(version) + ' (current version is ' + str(sqlSchemaVersion) + '), please upgrade it with "monitor/tools/upgradeDb.py".')
+
+    return(False)
+
+def numberToSqlValue(number):
+    """
+    Switch the number into the sql value, None (NULL) for the missing value (None or nan).
+    """
+    if (number is None) or (number != number):
+        return(None)
+    else:
+        return(number)
+## For schema version (end) ##
+
+## For job sample table (begin) ##
+# All of the job samples of a job range db file (<jobHead>_<jobTail>.db) are saved into one table,
+# the composite primary key (job_id, sample_time, host) makes job history read/write indexed queries.
+# sample_time is epoch seconds, cpu is the used cpu number, mem is the used memory (unit is G).
+jobSampleTableName = 'job_samples'
+jobSampleKeyList = ['job_id', 'sample_time', 'host', 'cpu', 'mem']
+jobSampleKeyTypeList = ['VARCHAR(20)', 'INTEGER', 'VARCHAR(255)', 'REAL', 'REAL']
+jobSamplePrimaryKeyList = ['job_id', 'sample_time', 'host']
+
+# The jobResourceSample.py spool files (one json line record per job sample) wait for jobResourceIngest.py to save them.
+jobSampleSpoolPath = getattr(config, 'jobSampleSpoolPath', str(config.dbPath) + '/resource/spool')
+
+# Max variable number on one sql command (SQLITE_MAX_VARIABLE_NUMBER is 999 on old sqlite).
+sqlVariableLimit = 500
+
+def createJobSampleTable(dbFile, orig_conn, commit=True):
+    """
+    Create the job sample table if it not exists.
+    """
+    keyString = genSqlTableKeyString(jobSampleKeyList, jobSampleKeyTypeList, primaryKeyList=jobSamplePrimaryKeyList)
+    createSqlTable(dbFile, orig_conn, jobSampleTableName, keyString, commit)
+
+def getJobSampleData(dbFile, orig_conn, job, keyList=[], rangeBegin=None, rangeEnd=None):
+    """
+    Get the samples of the specified job (ordered by sample_time) with the specified keyList, only get the samples between rangeBegin and rangeEnd (sample_time) if specified.
+    """
+    if len(keyList) == 0:
+        keyList = jobSampleKeyList
+
+    dataDic = getSqlTableData(dbFile, orig_conn, jobSampleTableName, keyList, conditionDic={'job_id': str(job)}, rangeKey='sample_time', rangeBegin=rangeBegin, rangeEnd=rangeEnd, orderKey='sample_time')
+
+    return(dataDic)
+
+def getJobLastSampleTimeDic(dbFile, orig_conn, jobList):
+    """
+    Get the last sample_time of the specified jobs, return a dict of job: lastSampleTime (only for the sampled jobs).
+    """
+    lastSampleTimeDic = {}
+
+    (result, conn, curs) = connectPreprocess(dbFile, orig_conn)
+    if result == 'failed':
+        return(lastSampleTimeDic)
+
+    try:
+        for i in range(0, len(jobList), sqlVariableLimit):
+            subJobList = [str(job) for job in jobList[i:i+sqlVariableLimit]]
+            command = "SELECT job_id, MAX(sample_time) FROM '" + str(jobSampleTableName) + "' WHERE job_id IN (" + ", ".join(['?']*len(subJobList)) + ") GROUP BY job_id"
+
+            for (job, lastSampleTime) in curs.execute(command, subJobList):
+                lastSampleTimeDic[job] = lastSampleTime
+
+        curs.close()
+    except Exception as error:
+        common.printError('*Error* (getJobLastSampleTimeDic) : Failed on getting last sample time from dbFile "' + str(dbFile) + '": ' + str(error))
+
+    return(lastSampleTimeDic)
+
+def deleteJobSamples(dbFile, orig_conn, jobList, commit=True):
+    """
+    Delete all of the samples of the specified jobs.
+    """
+    (result, conn, curs) = connectPreprocess(dbFile, orig_conn, mode='write')
+    if (result == 'failed') or (result == 'locked'):
+        return
+
+    try:
+        command = "DELETE FROM '" + str(jobSampleTableName) + "' WHERE job_id = ?"
+        curs.executemany(command, [(str(job),) for job in jobList])
+        curs.close()
+        if commit:
+            conn.commit()
+    except Exception as error:
+        common.printError('*Error* (deleteJobSamples) : Failed on deleting job samples from dbFile "' + str(dbFile) + '": ' + str(error))
+
+def getStaleJobList(dbFile, orig_conn, jobList, staleSampleTime):
+    """
+    The job id may be re-used after openlava job id rolls over, the jobs which have been sampled
+    but the last sample_time (epoch seconds) is earlier than staleSampleTime are stale jobs, their old samples should be dropped.
+    """
+    staleJobList = []
+    lastSampleTimeDic = getJobLastSampleTimeDic(dbFile, orig_conn, jobList)
+
+    for job in jobList:
+        if (job in lastSampleTimeDic) and (lastSampleTimeDic[job] < staleSampleTime):
+            staleJobList.append(job)
+
+    return(staleJobList)
+
+def saveJobSamples(jobDbPath, valueTupleList, staleSeconds=3600):
+    """
+    Save the job sample value tuples (job_id, sample_time, host, cpu, mem) into the job range db files under jobDbPath, one transaction per job range db file.
+    The old samples of the stale jobs (the last sample is staleSeconds earlier than the first new sample) are dropped, the same job_id/sample_time/host samples are replaced.
+    The transaction of the job range db file is rolled back if it fails, then its samples are not counted.
+    Return the saved sample number, it is less than the sample number if any job range db file fails.
+    """
+    jobValueTupleListDic = collections.OrderedDict()
+
+    for valueTuple in valueTupleList:
+        jobValueTupleListDic.setdefault(str(valueTuple[0]), []).append(tuple(valueTuple))
+
+    jobRangeDic = common.getJobRangeDic(list(jobValueTupleListDic.keys()))
+    savedNum = 0
+
+    if (len(jobRangeDic) > 0) and (not os.path.exists(jobDbPath)):
+        try:
+            os.makedirs(jobDbPath)
+        except Exception as error:
+            common.printError('*Error* (saveJobSamples) : Failed on creating job db directory "' + str(jobDbPath) + '": ' + str(error))
+            return(savedNum)
+
+    for jobRange in jobRangeDic.keys():
+        dbFile = str(jobDbPath) + '/' + str(jobRange) + '.db'
+        rangeValueTupleList = []
+
+        for job in jobRangeDic[jobRange]:
+            rangeValueTupleList.extend(jobValueTupleListDic[job])
+
+        (result, dbConn) = connectDbFile(dbFile, mode='write')
+
+        if result != 'passed':
+            common.printError('*Error* (saveJobSamples) : Failed on connecting sqlite3 database "' + str(dbFile) + '" (' + str(result) + ').')
+            continue
+
+        if not checkSqlSchemaVersion(dbFile, dbConn, mode='write'):
+            dbConn.close()
+            continue
+
+        print('    Updating table "' + str(jobSampleTableName) + '" of "' + str(dbFile) + '" with ' + str(len(rangeValueTupleList)) + ' samples ...')
+
+        # Run the statements on dbConn directly (the sqlite3_common writing functions print and ignore the errors), so the
+        # stale job samples are never deleted without saving the new samples.
+        try:
+            dbConn.execute("CREATE TABLE IF NOT EXISTS '" + str(jobSampleTableName) + "' " + genSqlTableKeyString(jobSampleKeyList, jobSampleKeyTypeList, primaryKeyList=jobSamplePrimaryKeyList))
+
+            staleSampleTime = min([valueTuple[1] for valueTuple in rangeValueTupleList]) - staleSeconds
+            staleJobList = getStaleJobList(dbFile, dbConn, jobRangeDic[jobRange], staleSampleTime)
+
+            if len(staleJobList) > 0:
+                common.printWarning('*Warning*: samples of job "' + ' '.join(staleJobList) + '" already existed even one hour ago, will drop them.')
+                dbConn.executemany("DELETE FROM '" + str(jobSampleTableName) + "' WHERE job_id = ?", [(str(job),) for job in staleJobList])
+
+            dbConn.executemany("INSERT OR REPLACE INTO '" + str(jobSampleTableName) + "' VALUES (?, ?, ?, ?, ?)", rangeValueTupleList)
+            dbConn.commit()
+        except Exception as error:
+            common.printError('*Error* (saveJobSamples) : Failed on saving ' + str(len(rangeValueTupleList)) + ' job samples into dbFile "' + str(dbFile) + '": ' + str(error))
+
+            try:
+                dbConn.rollback()
+            except Exception:
+                pass
+
+            dbConn.close()
+            continue
+
+        dbConn.close()
+        savedNum += len(rangeValueTupleList)
+
+    return(savedNum)
+
+def saveJobSampleSpool(spoolPath, spoolName, valueTupleList):
+    """
+    Save the job sample value tuples as json line records into a new spool file "<spoolPath>/<spoolName>.jsonl" for jobResourceIngest.py
+    (write a tmp file then rename it, so jobResourceIngest.py never reads a partial file).
+    Return the spool file, '' if it fails.
+    """
+    spoolFile = str(spoolPath) + '/' + str(spoolName) + '.jsonl'
+    tmpSpoolFile = str(spoolFile) + '.tmp'
+
+    try:
+        if not os.path.exists(spoolPath):
+            os.makedirs(spoolPath)
+
+        with open(tmpSpoolFile, 'w') as SF:
+            for valueTuple in valueTupleList:
+                SF.write(genJobSampleRecord(valueTuple) + '\n')
+
+        os.rename(tmpSpoolFile, spoolFile)
+    except Exception as error:
+        common.printError('*Error* (saveJobSampleSpool) : Failed on writing spool file "' + str(spoolFile) + '": ' + str(error))
+        return('')
+
+    return(spoolFile)
+
+def genJobSampleRecord(valueTuple):
+    """
+    Switch the job sample value tuple (job_id, sample_time, host, cpu, mem) into a compact json line record.
+    """
+    return(json.dumps(collections.OrderedDict(zip(jobSampleKeyList, valueTuple)), separators=(',', ':')))
+
+def parseJobSampleRecords(lines):
+    """
+    Get the job sample value tuples from the json line records, the other lines (like the progress messages) are ignored.
+    """
+    valueTupleList = []
+
+    for line in lines:
+        line = line.strip()
+
+        if not line.startswith('{'):
+            continue
+
+        try:
+            record = json.loads(line)
+        except ValueError:
+            continue
+
+        if isinstance(record, dict) and all([(key in record) for key in jobSampleKeyList]):
+            valueTupleList.append(tuple([record[key] for key in jobSampleKeyList]))
+
+    return(valueTupleList)
+## For job sample table (end) ##
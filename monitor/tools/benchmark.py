@@ -0,0 +1,1138 @@
+#!PYTHONPATH
+# -*- coding: utf-8 -*-
+#
+# Benchmark for the performance sensitive functions of openlavaMonitor, all of the
+# benchmark cases run with synthetic data, no openlava command is required.
+
+import os
+import re
+import sys
+import time
+import random
+import shutil
+import threading
+import datetime
+import tempfile
+import argparse
+import collections
+import multiprocessing
+
+sys.path.insert(0, 'MONITORPATH')
+from common import common
+from common import cgroup_common
+from common import downsample_common
+from common import openlava_common
+from common import proc_common
+from common import sqlite3_common
+from bin import jobResourceMonitor
+from bin import jobResourceSample
+
+def readArgs():
+    """
+    Read in arguments.
+    """
+    parser = argparse.ArgumentParser()
+
+    parser.add_argument("-c", "--cases",
+                        nargs='+',
+                        default=['bjobsUf', 'sqliteWal', 'multiHostPeak', 'batchRun', 'procScan', 'cgroupScan', 'commandCache', 'hostGroup', 'downsample', 'daemonSchedule'],
+                        choices=['bjobsUf', 'sqliteWal', 'multiHostPeak', 'batchRun', 'procScan', 'cgroupScan', 'commandCache', 'hostGroup', 'downsample', 'daemonSchedule'],
+                        help='Specify the benchmark cases to run.')
+    parser.add_argument("-n", "--number",
+                        type=int,
+                        default=40000,
+                        help='Specify the data size (job number) for the benchmark cases.')
+
+    args = parser.parse_args()
+    return(args.cases, args.number)
+
+def runTime(function, *args):
+    """
+    Run the specified function, return (result, seconds).
+    """
+    startTime = time.time()
+    result = function(*args)
+    seconds = time.time() - startTime
+    return(result, seconds)
+
+def printResult(case, origSeconds, newSeconds):
+    print('    %-16s%-16s%-16s%-10s' % ('CASE', 'ORIGINAL (s)', 'CURRENT (s)', 'SPEEDUP'))
+    print('    %-16s%-16.3f%-16.3f%-10.1f' % (case, origSeconds, newSeconds, origSeconds/max(newSeconds, 0.000001)))
+
+
+## For case bjobsUf (begin) ##
+def genBjobsUfLines(jobNum):
+    """
+    Generate a synthetic "bjobs -u all -a -UF" dump with RUN/PEND/DONE/EXIT and array jobs.
+    """
+    lines = []
+
+    for i in range(jobNum):
+        job = str(100000 + i)
+
+        if i % 10 == 0:
+            job = str(job) + '[' + str(i % 7 + 1) + ']'
+
+        if i % 4 == 1:
+            status = 'PEND'
+        elif i % 4 == 2:
+            status = 'DONE'
+        elif i % 4 == 3:
+            status = 'EXIT'
+        else:
+            status = 'RUN'
+
+        lines.append('Job <' + str(job) + '>, Job Name <bench_' + str(i) + '>, User <user' + str(i % 37) + '>, Project <default>, Status <' + str(status) + '>, Queue <normal>, Command <sleep ' + str(i) + '>')
+        lines.append('Sun May 13 18:08:26: Submitted from host <lavaHost1>, CWD <$HOME/work' + str(i) + '>, ' + str(i % 8 + 1) + ' Processors Requested, Requested Resources <rusage[mem=' + str(i % 4096 + 1) + '] span[hosts=1]>;')
+
+        if status == 'PEND':
+            lines.append('PENDING REASONS:')
+            lines.append('New job is waiting for scheduling: 1 host;')
+        else:
+            if i % 8 == 0:
+                lines.append('Sun May 13 18:08:27: Started on 4 Hosts/Processors <2*lavaHost' + str(i % 50) + '> <2*lavaHost' + str(i % 50 + 1) + '>, Execution Home </home/user' + str(i % 37) + '>, Execution CWD <$HOME/work' + str(i) + '>;')
+            else:
+                lines.append('Sun May 13 18:08:27: Started on <lavaHost' + str(i % 50) + '>, Execution Home </home/user' + str(i % 37) + '>, Execution CWD <$HOME/work' + str(i) + '>;')
+
+            if status == 'DONE':
+                lines.append('Sun May 13 19:08:27: Done successfully. The CPU time used is ' + str(i % 3600 + 1) + ' seconds.')
+            elif status == 'EXIT':
+                lines.append('Sun May 13 19:08:27: Exited with exit code 1. The CPU time used is ' + str(i % 3600 + 1) + ' seconds.')
+            else:
+                lines.append('Sun May 13 18:13:27: Resource usage collected.')
+                lines.append('                     The CPU time used is ' + str(i % 3600 + 1) + ' seconds.')
+                lines.append('                     MEM: ' + str(i % 8192 + 1) + ' Mbytes;  SWAP: 0 Mbytes;  NTHREAD: 4')
+                lines.append('                     PGID: ' + str(i) + ';  PIDs: ' + str(i) + ' ')
+
+        lines.append('')
+        lines.append('SCHEDULING PARAMETERS:')
+        lines.append('          r15s   r1m  r15m   ut      pg    io   ls    it    tmp    swp    mem')
+        lines.append('loadSched   -     -     -     -       -     -    -     -     -      -      -')
+        lines.append('loadStop    -     -     -     -       -     -    -     -     -      -      -')
+        lines.append('')
+        lines.append('RESOURCE REQUIREMENT DETAILS:')
+        lines.append('Combined: rusage[mem=' + str(i % 4096 + 1) + '] span[hosts=1]')
+        lines.append('Effective: rusage[mem=' + str(i % 4096 + 1) + '] span[hosts=1]')
+
+    return(lines)
+
+def origParseBjobsUfLines(lines):
+    """
+    The original openlava_common.getBjobsUfInfo parser (one anchored regex per field on every line), kept as the benchmark reference.
+    """
+    jobCompileDic = {
+                     'jobCompile'                 : re.compile('.*Job <([0-9]+(\[[0-9]+\])?)>.*'),
+                     'jobNameCompile'             : re.compile('.*Job Name <([^>]+)>.*'),
+                     'userCompile'                : re.compile('.*User <([^>]+)>.*'),
+                     'projectCompile'             : re.compile('.*Project <([^>]+)>.*'),
+                     'statusCompile'              : re.compile('.*Status <([A-Z]+)>*'),
+                     'queueCompile'               : re.compile('.*Queue <([^>]+)>.*'),
+                     'commandCompile'             : re.compile('.*Command <(.+)>\s*$'),
+                     'submittedFromCompile'       : re.compile('.*Submitted from host <([^>]+)>.*'),
+                     'submittedTimeCompile'       : re.compile('(.*): Submitted from host.*'),
+                     'cwdCompile'                 : re.compile('.*CWD <([^>]+)>.*'),
+                     'processorsRequestedCompile' : re.compile('.* ([1-9][0-9]*) Processors Requested.*'),
+                     'requestedResourcesCompile'  : re.compile('.*Requested Resources <(.+)>;.*'),
+                     'spanHostsCompile'           : re.compile('.*Requested Resources <.*span\[hosts=([1-9][0-9]*).*>.*'),
+                     'rusageMemCompile'           : re.compile('.*Requested Resources <.*rusage\[mem=([1-9][0-9]*).*>.*'),
+                     'startedOnCompile'           : re.compile('.*[sS]tarted on ([0-9]+ Hosts/Processors )?([^;,]+).*'),
+                     'startedTimeCompile'         : re.compile('(.*): (\[\d+\])?\s*[sS]tarted on.*'),
+                     'finishedTimeCompile'        : re.compile('(.*): (Done successfully|Exited with).*'),
+                     'cpuTimeCompile'             : re.compile('.*The CPU time used is ([1-9][0-9]*) seconds.*'),
+                     'memCompile'                 : re.compile('.*MEM: ([1-9][0-9]*) Mbytes.*'),
+                    }
+    fieldList = [
+                 ('jobName', 'jobNameCompile'),
+                 ('user', 'userCompile'),
+                 ('project', 'projectCompile'),
+                 ('status', 'statusCompile'),
+                 ('queue', 'queueCompile'),
+                 ('command', 'commandCompile'),
+                 ('submittedFrom', 'submittedFromCompile'),
+                 ('submittedTime', 'submittedTimeCompile'),
+                 ('cwd', 'cwdCompile'),
+                 ('processorsRequested', 'processorsRequestedCompile'),
+                 ('requestedResources', 'requestedResourcesCompile'),
+                 ('spanHosts', 'spanHostsCompile'),
+                 ('rusageMem', 'rusageMemCompile'),
+                 ('startedTime', 'startedTimeCompile'),
+                 ('finishedTime', 'finishedTimeCompile'),
+                 ('cpuTime', 'cpuTimeCompile'),
+                 ('mem', 'memCompile'),
+                ]
+
+    myDic = collections.OrderedDict()
+    job = ''
+
+    for line in lines:
+        if re.match('Job <' + str(job) + '> is not found', line):
+            continue
+
+        if jobCompileDic['jobCompile'].match(line):
+            job = jobCompileDic['jobCompile'].match(line).group(1)
+            myDic[job] = collections.OrderedDict.fromkeys(openlava_common.bjobsUfKeyList, '')
+            myDic[job]['jobId'] = job
+
+        if job != '':
+            if 'jobInfo' in myDic[job].keys():
+                myDic[job]['jobInfo'] = str(myDic[job]['jobInfo']) + '\n' + str(line)
+            else:
+                myDic[job]['jobInfo'] = line
+
+            for (key, compileName) in fieldList:
+                if jobCompileDic[compileName].match(line):
+                    myDic[job][key] = jobCompileDic[compileName].match(line).group(1)
+
+            if jobCompileDic['startedOnCompile'].match(line):
+                startedHost = jobCompileDic['startedOnCompile'].match(line).group(2)
+                startedHost = re.sub('<', '', startedHost)
+                startedHost = re.sub('>', '', startedHost)
+                myDic[job]['startedOn'] = startedHost
+
+    return(myDic)
+
+def newParseBjobsUfLines(lines, keepJobInfo=False):
+    myDic = collections.OrderedDict()
+
+    for (job, myJobRecord) in openlava_common.parseBjobsUfLines(lines, keepJobInfo):
+        myDic[job] = myJobRecord
+
+    return(myDic)
+
+def benchBjobsUf(jobNum):
+    print('>>> Benchmark "bjobs -UF" parser with ' + str(jobNum) + ' synthetic jobs ...')
+    lines = genBjobsUfLines(jobNum)
+    (origDic, origSeconds) = runTime(origParseBjobsUfLines, lines)
+    (newDic, newSeconds) = runTime(newParseBjobsUfLines, lines)
+
+    # Compare with the job info text, switch the original result into jobRecord for the typed fields.
+    newDic = newParseBjobsUfLines(lines, keepJobInfo=True)
+    origDic = collections.OrderedDict([(job, openlava_common.jobRecord(jobDic, jobDic['jobInfo']).toDic()) for (job, jobDic) in origDic.items()])
+    newDic = collections.OrderedDict([(job, myJobRecord.toDic()) for (job, myJobRecord) in newDic.items()])
+
+    if origDic != newDic:
+        print('*Error*: the current parser result is different from the original parser result.')
+        sys.exit(1)
+
+    printResult('bjobsUf', origSeconds, newSeconds)
+## For case bjobsUf (end) ##
+
+
+## For case sqliteWal (begin) ##
+def sqliteWalWriter(dbFile, walMode, writer, cycleNum, jobNum, resultQueue):
+    """
+    Write cycleNum sampling cycles (jobNum job samples per cycle) into dbFile like bsample.py, put (committed cycles, dropped cycles) into resultQueue.
+    """
+    # Keep the locked/error messages of the writers out of the benchmark report.
+    sys.stdout = open(os.devnull, 'w')
+    committedNum = 0
+    droppedNum = 0
+
+    for cycle in range(cycleNum):
+        (result, dbConn) = sqlite3_common.connectDbFile(dbFile, mode='write', walMode=walMode)
+
+        if result != 'passed':
+            droppedNum += 1
+            continue
+
+        sampleTime = 'writer' + str(writer) + '_cycle' + str(cycle)
+        valueTupleList = [(str(job), sampleTime, 'lavaHost' + str(writer), '1.0', str(job)) for job in range(jobNum)]
+
+        try:
+            sqlite3_common.createJobSampleTable(dbFile, dbConn, commit=False)
+            sqlite3_common.insertIntoSqlTableMany(dbFile, dbConn, sqlite3_common.jobSampleTableName, valueTupleList, commit=False)
+            dbConn.commit()
+            committedNum += 1
+        except Exception:
+            droppedNum += 1
+
+        dbConn.close()
+
+    resultQueue.put((committedNum, droppedNum))
+
+def sqliteWalReader(dbFile, walMode, stopEvent, resultQueue):
+    """
+    Read the job samples like bmonitor until stopEvent is set, put the read number into resultQueue.
+    """
+    sys.stdout = open(os.devnull, 'w')
+    readNum = 0
+
+    while not stopEvent.is_set():
+        if os.path.exists(dbFile):
+            (result, dbConn) = sqlite3_common.connectDbFile(dbFile, mode='read', walMode=walMode)
+
+            if result == 'passed':
+                sqlite3_common.getJobSampleData(dbFile, dbConn, '0')
+                dbConn.close()
+                readNum += 1
+
+    resultQueue.put(readNum)
+
+def runSqliteWal(walMode, writerNum, cycleNum, jobNum):
+    """
+    Start writerNum writer processes and one reader process on the same job range database, return (seconds, committed cycles, dropped cycles, rows, reads).
+    """
+    tmpDir = tempfile.mkdtemp(prefix='openlavaMonitor_benchmark_')
+    dbFile = str(tmpDir) + '/0_9999.db'
+    writerQueue = multiprocessing.Queue()
+    readerQueue = multiprocessing.Queue()
+    stopEvent = multiprocessing.Event()
+
+    startTime = time.time()
+    reader = multiprocessing.Process(target=sqliteWalReader, args=(dbFile, walMode, stopEvent, readerQueue))
+    reader.start()
+    writerList = [multiprocessing.Process(target=sqliteWalWriter, args=(dbFile, walMode, writer, cycleNum, jobNum, writerQueue)) for writer in range(writerNum)]
+
+    for writer in writerList:
+        writer.start()
+
+    writerResultList = [writerQueue.get() for writer in writerList]
+
+    for writer in writerList:
+        writer.join()
+
+    seconds = time.time() - startTime
+    stopEvent.set()
+    readNum = readerQueue.get()
+    reader.join()
+
+    (result, dbConn) = sqlite3_common.connectDbFile(dbFile, mode='read', walMode=walMode)
+    rowNum = int(sqlite3_common.getSqlTableCount(dbFile, dbConn, sqlite3_common.jobSampleTableName))
+    dbConn.close()
+    shutil.rmtree(tmpDir)
+
+    committedNum = sum([committed for (committed, dropped) in writerResultList])
+    droppedNum = sum([dropped for (committed, dropped) in writerResultList])
+
+    return(seconds, committedNum, droppedNum, rowNum, readNum)
+
+def benchSqliteWal(sampleNum):
+    writerNum = 8
+    cycleNum = 20
+    jobNum = max(1, int(sampleNum/(writerNum*cycleNum)))
+
+    print('>>> Benchmark ' + str(writerNum) + ' writer processes (' + str(cycleNum) + ' cycles, ' + str(jobNum) + ' job samples per cycle) and one reader process on the same job range database ...')
+    print('    %-12s%-12s%-12s%-12s%-12s%-12s' % ('MODE', 'TIME (s)', 'COMMITTED', 'DROPPED', 'ROWS', 'READS'))
+
+    for walMode in [False, True]:
+        (seconds, committedNum, droppedNum, rowNum, readNum) = runSqliteWal(walMode, writerNum, cycleNum, jobNum)
+
+        if walMode:
+            mode = 'WAL'
+        else:
+            mode = 'journal'
+
+        print('    %-12s%-12.3f%-12s%-12s%-12s%-12s' % (mode, seconds, committedNum, droppedNum, rowNum, readNum))
+
+        # Every cycle must be committed on WAL mode, the writers wait on the database lock instead of dropping the cycle.
+        if walMode and ((droppedNum != 0) or (rowNum != writerNum*cycleNum*jobNum)):
+            print('*Error*: sampling cycles are lost on WAL mode.')
+            sys.exit(1)
+## For case sqliteWal (end) ##
+
+
+## For case multiHostPeak (begin) ##
+def genMultiHostSamples(hostNum, hours, interval=300, seed=0):
+    """
+    Generate synthetic multi-hosts job samples (ascending epoch seconds), every host is sampled every interval seconds with 0-10 seconds jitter.
+    """
+    myRandom = random.Random(seed)
+    beginSeconds = int(time.mktime(datetime.datetime(2018, 5, 13).timetuple()))
+    sampleList = []
+
+    for cycle in range(int(hours*3600/interval)):
+        for host in range(hostNum):
+            sampleList.append((beginSeconds + cycle*interval + myRandom.randint(0, 10), 'lavaHost' + str(host), round(myRandom.uniform(0, 8), 3)))
+
+    sampleList.sort(key=lambda sample: sample[0])
+    sampleTimeList = [sample[0] for sample in sampleList]
+    hostList = [sample[1] for sample in sampleList]
+    valueList = [sample[2] for sample in sampleList]
+
+    return(sampleTimeList, hostList, valueList)
+
+def origGetMultiHostPeakValue(sampleTimeList, hostList, valueList):
+    """
+    The original jobResourceMonitor.getMultiHostPeakValue (nested loop on '%Y-%m-%d %H:%M:%S' strings), kept as the benchmark reference.
+    """
+    secondsList = []
+
+    for sampleTime in sampleTimeList:
+        seconds = int(time.mktime(datetime.datetime.strptime(str(sampleTime), "%Y-%m-%d %H:%M:%S").timetuple()))
+        secondsList.append(seconds)
+
+    usedNum = []
+    nearBySecondsList = []
+
+    for i in range(len(secondsList)):
+        if i in usedNum:
+            continue
+        else:
+            usedNum.append(i)
+            tmpNumList = [i]
+            host = hostList[i]
+            tmpHostList = [host]
+            seconds = secondsList[i]
+            for j in range(i+1, len(secondsList)):
+                newSeconds = secondsList[j]
+                if -5 <= newSeconds-seconds <= 5:
+                    host = hostList[j]
+                    if host not in tmpHostList:
+                        usedNum.append(j)
+                        tmpNumList.append(j)
+            nearBySecondsList.append(tmpNumList)
+
+    sumValueList = []
+
+    for nearBySeconds in nearBySecondsList:
+        sumValue = 0
+        for num in nearBySeconds:
+            value = valueList[num]
+            sumValue += value
+        sumValueList.append(sumValue)
+
+    peakValue = max(sumValueList)
+    return(peakValue)
+
+def isSamePeak(origPeak, newPeak):
+    # The prefix sums could be different with the original sums on the last float bits.
+    return(abs(origPeak-newPeak) <= 0.000001*max(1, abs(origPeak)))
+
+def benchMultiHostPeak():
+    hostNum = 64
+    origHours = 24
+    newHours = 7*24
+
+    # Random small jobs, the hosts are sampled with the same/near seconds frequently.
+    myRandom = random.Random(1)
+
+    for i in range(500):
+        sampleNum = myRandom.randint(1, 40)
+        sampleTimeList = sorted([1526140800 + myRandom.randint(0, 60) for j in range(sampleNum)])
+        hostList = ['lavaHost' + str(myRandom.randint(0, 3)) for j in range(sampleNum)]
+        valueList = [myRandom.randint(0, 10) for j in range(sampleNum)]
+        origTimeList = [datetime.datetime.fromtimestamp(seconds).strftime('%Y-%m-%d %H:%M:%S') for seconds in sampleTimeList]
+
+        if origGetMultiHostPeakValue(origTimeList, hostList, valueList) != jobResourceMonitor.getMultiHostPeakValue(sampleTimeList, hostList, valueList):
+            print('*Error*: the current peak is different from the original peak on random case ' + str(i) + '.')
+            sys.exit(1)
+
+    print('>>> Benchmark multi-hosts peak with a ' + str(origHours) + ' hours, ' + str(hostNum) + ' hosts synthetic job ...')
+    (sampleTimeList, hostList, valueList) = genMultiHostSamples(hostNum, origHours)
+    origTimeList = [datetime.datetime.fromtimestamp(seconds).strftime('%Y-%m-%d %H:%M:%S') for seconds in sampleTimeList]
+    (origPeak, origSeconds) = runTime(origGetMultiHostPeakValue, origTimeList, hostList, valueList)
+    (newPeak, newSeconds) = runTime(jobResourceMonitor.getMultiHostPeakValue, sampleTimeList, hostList, valueList)
+
+    if not isSamePeak(origPeak, newPeak):
+        print('*Error*: the current peak (' + str(newPeak) + ') is different from the original peak (' + str(origPeak) + ').')
+        sys.exit(1)
+
+    printResult('multiHostPeak', origSeconds, newSeconds)
+
+    # The original implementation takes too long time on the week-long job, only run the current one.
+    print('>>> Benchmark multi-hosts peak with a one week, ' + str(hostNum) + ' hosts synthetic job (current implementation only) ...')
+    (sampleTimeList, hostList, valueList) = genMultiHostSamples(hostNum, newHours)
+    (newPeak, newSeconds) = runTime(jobResourceMonitor.getMultiHostPeakValue, sampleTimeList, hostList, valueList)
+    print('    ' + str(len(sampleTimeList)) + ' samples, peak ' + str(round(newPeak, 3)) + ', ' + str(round(newSeconds, 3)) + ' seconds.')
+## For case multiHostPeak (end) ##
+
+
+## For case batchRun (begin) ##
+# Local "ssh" stand-in, the last two arguments are the host and the command.
+#   lavaHostTimeout* : hang.
+#   lavaHostRetry*   : ssh connection failure (255) on the first attempt.
+#   lavaHostFail*    : command failure.
+#   others           : run for SSH_DELAY seconds.
+fakeSshScript = """#!/bin/sh
+for arg in "$@"; do host="$command"; command="$arg"; done
+case "$host" in
+    lavaHostTimeout*) sleep 30 ;;
+    lavaHostRetry*) if [ ! -f "$SSH_STATE_DIR/$host" ]; then touch "$SSH_STATE_DIR/$host"; echo "ssh: connect to host $host port 22: Connection refused"; exit 255; fi ;;
+    lavaHostFail*) echo "$command: No such file or directory"; exit 1 ;;
+    *) sleep "$SSH_DELAY" ;;
+esac
+echo "$host : $command"
+"""
+
+def genFakeSsh(tmpDir, delay):
+    """
+    Write the local fake ssh command into tmpDir, return the fake ssh command path.
+    """
+    sshCommand = str(tmpDir) + '/ssh'
+
+    with open(sshCommand, 'w') as SF:
+        SF.write(fakeSshScript)
+
+    os.chmod(sshCommand, 0o755)
+    os.environ['SSH_DELAY'] = str(delay)
+    os.environ['SSH_STATE_DIR'] = str(tmpDir)
+
+    return(sshCommand)
+
+def origSshRunHosts(hostList, inputCommand, timeout, sshCommand):
+    """
+    The original batchRun.runJobResourceSample dispatcher (one thread per host, sleep 1 second after every thread start), kept as the benchmark reference.
+    """
+    threadList = []
+
+    for host in hostList:
+        myThread = threading.Thread(target=common.sshRunCommand, args=(host, inputCommand, timeout, 0, sshCommand))
+        threadList.append(myThread)
+        myThread.daemon = True
+        myThread.start()
+        time.sleep(1)
+
+    for myThread in threadList:
+        myThread.join()
+
+def benchBatchRun(hostNum):
+    tmpDir = tempfile.mkdtemp(prefix='openlavaMonitor_benchmark_')
+    sshCommand = genFakeSsh(tmpDir, 0.2)
+    command = '/openlavaMonitor/monitor/bin/jobResourceSample.py'
+
+    # Check the timeout/retry/failure handling.
+    resultList = common.sshRunHosts(['lavaHost0', 'lavaHostTimeout0', 'lavaHostRetry0', 'lavaHostFail0'], command, concurrency=4, timeout=2, retry=1, sshCommand=sshCommand)
+    statusList = [(resultDic['host'], resultDic['status'], resultDic['attempts']) for resultDic in resultList]
+    expectedStatusList = [('lavaHost0', 'passed', 1), ('lavaHostTimeout0', 'timeout', 1), ('lavaHostRetry0', 'passed', 2), ('lavaHostFail0', 'failed', 1)]
+
+    if statusList != expectedStatusList:
+        print('*Error*: the ssh result ' + str(statusList) + ' is different from the expected result ' + str(expectedStatusList) + '.')
+        sys.exit(1)
+
+    origHostNum = 20
+    origHostList = ['lavaHost' + str(i) for i in range(origHostNum)]
+
+    print('>>> Benchmark batchRun dispatcher with ' + str(origHostNum) + ' hosts (fake ssh, 0.2 seconds per host) ...')
+    (result, origSeconds) = runTime(origSshRunHosts, origHostList, command, 20, sshCommand)
+    (resultList, newSeconds) = runTime(common.sshRunHosts, origHostList, command, 64, 20, 1, sshCommand)
+    printResult('batchRun', origSeconds, newSeconds)
+
+    # The original dispatcher takes more than hostNum seconds, only run the current one.
+    hostNum = max(1, int(hostNum/20))
+    hostList = ['lavaHost' + str(i) for i in range(hostNum)]
+
+    print('>>> Benchmark batchRun dispatcher with ' + str(hostNum) + ' hosts (current implementation only) ...')
+    (resultList, newSeconds) = runTime(common.sshRunHosts, hostList, command, 64, 20, 1, sshCommand)
+    passedNum = len([resultDic for resultDic in resultList if resultDic['status'] == 'passed'])
+    hostSecondsList = [resultDic['seconds'] for resultDic in resultList]
+    print('    ' + str(passedNum) + '/' + str(hostNum) + ' hosts passed, ' + str(round(newSeconds, 3)) + ' seconds, host latency max ' + str(max(hostSecondsList)) + ' seconds.')
+    shutil.rmtree(tmpDir)
+## For case batchRun (end) ##
+
+
+## For case procScan (begin) ##
+def genFakeProcfs(procDir, procNum, jobProcNum=10):
+    """
+    Generate a synthetic procfs tree with procNum processes, every job has a "res" process and (jobProcNum-1) descendant processes, the others are the no job user processes.
+    Return the list of the res job ids.
+    """
+    myRandom = random.Random(0)
+    jobList = []
+
+    with open(str(procDir) + '/stat', 'w') as SF:
+        SF.write('cpu  1000 0 1000 100000 0 0 0 0 0 0\nbtime 1526140800\n')
+
+    with open(str(procDir) + '/uptime', 'w') as UF:
+        UF.write('86400.00 80000.00\n')
+
+    def writeProc(pid, ppid, uid, name, cmdline):
+        pidDir = str(procDir) + '/' + str(pid)
+        os.mkdir(pidDir)
+
+        with open(pidDir + '/stat', 'w') as SF:
+            # pid (comm) state ppid ... utime(14) stime(15) ... num_threads(20) ... starttime(22) ... (52 fields)
+            fieldList = ['S', str(ppid)] + ['0']*9 + [str(myRandom.randint(0, 100000)), str(myRandom.randint(0, 10000))] + ['0']*4 + ['1', '0', str(1000+pid)] + ['0']*30
+            SF.write(str(pid) + ' (' + str(name) + ') ' + ' '.join(fieldList) + '\n')
+
+        with open(pidDir + '/statm', 'w') as SF:
+            SF.write('100000 ' + str(myRandom.randint(1000, 100000)) + ' ' + str(myRandom.randint(0, 1000)) + ' 100 0 5000 0\n')
+
+        with open(pidDir + '/status', 'w') as SF:
+            SF.write('Name:\t' + str(name) + '\nState:\tS (sleeping)\nPPid:\t' + str(ppid) + '\nUid:\t' + str(uid) + '\t' + str(uid) + '\t' + str(uid) + '\t' + str(uid) + '\nGid:\t' + str(uid) + '\t' + str(uid) + '\t' + str(uid) + '\t' + str(uid) + '\nThreads:\t1\n')
+
+        with open(pidDir + '/cmdline', 'w') as SF:
+            SF.write('\0'.join(cmdline) + '\0')
+
+    writeProc(1, 0, 0, 'init', ['/sbin/init'])
+    pid = 2
+
+    while pid <= procNum:
+        if (pid % 3 == 0) and (pid + jobProcNum <= procNum + 1):
+            # The job process tree, res -> shell -> (job processes).
+            job = str(100000 + pid)
+            jobList.append(job)
+            uid = 1000 + pid % 37
+            writeProc(pid, 1, uid, 'res', ['/opt/openlava/sbin/res', '-d', '/home/user/.lsbatch/1526140800.' + str(job)])
+            writeProc(pid+1, pid, uid, 'sh', ['/bin/sh', '/home/user/.lsbatch/1526140800.' + str(job)])
+
+            for i in range(2, jobProcNum):
+                writeProc(pid+i, pid+1+myRandom.randint(0, i-2), uid, 'job' + str(i), ['./job', str(i)])
+
+            pid += jobProcNum
+        else:
+            writeProc(pid, 1, 1000 + pid % 37, 'bash', ['-bash'])
+            pid += 1
+
+    return(jobList)
+
+def origGetPidInfos(pid, pidProcess=''):
+    """
+    The original jobResourceSample.getPidInfos (about ten psutil calls per pid, recursive children per pid), kept as the benchmark reference.
+    """
+    import psutil
+
+    pidDic = {'username' : '', 'pid' : pid, 'ppid' : 0, 'create_time' : 0.0, 'status' : '', 'cpu_percent' : 0.0, 'memory' : 0.0, 'num_threads' : 1, 'name' : '', 'cmdline' : [], 'children_pids' : []}
+
+    if str(pidProcess) == '':
+        try:
+            pidProcess = psutil.Process(pid)
+        except Exception:
+            return(pidDic, pidProcess)
+
+    for (key, function) in [('name', 'name'), ('cmdline', 'cmdline'), ('create_time', 'create_time'), ('status', 'status'), ('username', 'username'), ('num_threads', 'num_threads'), ('ppid', 'ppid')]:
+        try:
+            pidDic[key] = getattr(pidProcess, function)()
+        except Exception:
+            pass
+
+    try:
+        for item in pidProcess.children(recursive=True):
+            pidDic['children_pids'].append(item.pid)
+    except Exception:
+        pass
+
+    try:
+        pidDic['cpu_percent'] = round(pidProcess.cpu_percent(interval=None)/100, 4)
+    except Exception:
+        pass
+
+    try:
+        pidMemoryInfo = pidProcess.memory_info()
+        pidDic['memory'] = round((int(pidMemoryInfo.rss)-int(pidMemoryInfo.shared))/1024/1024/1024, 4)
+    except Exception:
+        pass
+
+    return(pidDic, pidProcess)
+
+def origGetJobResource(pidList, jobList):
+    """
+    The original jobResourceSample process tree path: psutil information of all of the pids, then match the res command line for every job.
+    """
+    pidsDic = {}
+
+    for pid in pidList:
+        (pidsDic[pid], pidProcess) = origGetPidInfos(pid)
+
+    lsbatchCompile = re.compile('^.*/sbin/res .*/[0-9]+\\.([0-9]+)$')
+    jobResourceDic = {}
+
+    for job in jobList:
+        for pid in pidsDic.keys():
+            if pidsDic[pid]['name'] == 'res':
+                myMatch = lsbatchCompile.match(' '.join(pidsDic[pid]['cmdline']))
+
+                if myMatch and (myMatch.group(1) == job):
+                    jobPidList = [pid,] + pidsDic[pid]['children_pids']
+                    jobResourceDic[job] = round(sum([pidsDic[jobPid]['memory'] for jobPid in jobPidList]), 4)
+
+    return(jobResourceDic)
+
+def newGetJobResource(procDir, jobList):
+    mySample = jobResourceSample.jobResourceSample(output='stdout')
+    pidsDic = proc_common.scanProcs(procDir, skipUidList=[0], cmdlineNameList=['res'])
+    mySample.setCpuUsage(pidsDic, {}, 1)
+    resJobDic = mySample.getResJobDic(pidsDic)
+    jobPidListDic = {}
+
+    for job in jobList:
+        if job in resJobDic:
+            jobPidListDic[job] = [resJobDic[job],] + proc_common.getDescendantPidList(pidsDic, resJobDic[job])
+
+    jobResourceDic = mySample.sumJobResource(jobPidListDic, pidsDic)
+
+    return(dict([(job, jobResourceDic[job]['memory']) for job in jobResourceDic.keys()]))
+
+def runProcScan(procNum, origRun=True):
+    """
+    Run the current (and the original if origRun) job process scan on a synthetic procfs with procNum processes, return (job number, original seconds, current seconds).
+    """
+    tmpDir = tempfile.mkdtemp(prefix='openlavaMonitor_benchmark_')
+    jobList = genFakeProcfs(tmpDir, procNum)
+    (newDic, newSeconds) = runTime(newGetJobResource, tmpDir, jobList)
+    origSeconds = None
+
+    if origRun:
+        import psutil
+
+        # The original path gets the no root pids with "ps -U root -u root -N".
+        origProcfsPath = psutil.PROCFS_PATH
+        psutil.PROCFS_PATH = tmpDir
+        pidList = [pid for pid in proc_common.getPidList(tmpDir) if pid != 1]
+        (origDic, origSeconds) = runTime(origGetJobResource, pidList, jobList)
+        psutil.PROCFS_PATH = origProcfsPath
+
+        if origDic != newDic:
+            print('*Error*: the current job memory is different from the original job memory.')
+            sys.exit(1)
+
+    shutil.rmtree(tmpDir)
+
+    return(len(newDic), origSeconds, newSeconds)
+
+def benchProcScan(procNum):
+    try:
+        import psutil
+        origProcNum = 1000
+    except ImportError:
+        print('*Warning*: psutil is not installed, only run the current implementation.')
+        origProcNum = 0
+
+    # The original path re-scans the process table for every pid (O(pids^2)), it takes minutes on 5000 processes.
+    if origProcNum > 0:
+        print('>>> Benchmark job process scan on a synthetic procfs with ' + str(origProcNum) + ' processes ...')
+        (jobNum, origSeconds, newSeconds) = runProcScan(origProcNum)
+        printResult('procScan', origSeconds, newSeconds)
+
+    print('>>> Benchmark job process scan on a synthetic procfs with ' + str(procNum) + ' processes (current implementation only) ...')
+    (jobNum, origSeconds, newSeconds) = runProcScan(procNum, origRun=False)
+    print('    ' + str(jobNum) + ' jobs, ' + str(round(newSeconds, 3)) + ' seconds.')
+## For case procScan (end) ##
+
+
+## For case cgroupScan (begin) ##
+def genFakeCgroupfs(cgroupRoot, version, jobList):
+    """
+    Generate a synthetic cgroupfs (v1 or v2) with one job cgroup "job.<id>.<index>.<time>" per job and some system cgroups.
+    The cgroup memory usage is the anonymous memory plus the page cache.
+    Return the expected usage dict (job: (cpu_usec, memory, memory_peak)).
+    """
+    myRandom = random.Random(0)
+    expectedDic = {}
+
+    if version == 2:
+        memoryRoot = cpuRoot = str(cgroupRoot)
+        os.makedirs(memoryRoot)
+
+        with open(str(cgroupRoot) + '/cgroup.controllers', 'w') as CF:
+            CF.write('cpu memory\n')
+    else:
+        memoryRoot = str(cgroupRoot) + '/memory'
+        cpuRoot = str(cgroupRoot) + '/cpu,cpuacct'
+
+    for name in ['system.slice/sshd.service', 'user.slice/user-1000.slice']:
+        for root in set([memoryRoot, cpuRoot]):
+            os.makedirs(str(root) + '/' + str(name))
+
+    for job in jobList:
+        cgroupPath = 'openlava/cluster1/job.' + str(job) + '.0.1526140800'
+        (cpuUsec, memory, memoryPeak) = (myRandom.randint(0, 10**10), myRandom.randint(0, 2**34), None)
+        cache = myRandom.randint(0, 2**32)
+
+        for root in set([memoryRoot, cpuRoot]):
+            os.makedirs(str(root) + '/' + str(cgroupPath) + '/step_batch')
+
+        if version == 2:
+            memoryPeak = memory + cache + myRandom.randint(0, 2**30)
+
+            with open(str(cpuRoot) + '/' + str(cgroupPath) + '/cpu.stat', 'w') as CF:
+                CF.write('usage_usec ' + str(cpuUsec) + '\nuser_usec ' + str(cpuUsec) + '\nsystem_usec 0\n')
+
+            with open(str(memoryRoot) + '/' + str(cgroupPath) + '/memory.current', 'w') as CF:
+                CF.write(str(memory+cache) + '\n')
+
+            with open(str(memoryRoot) + '/' + str(cgroupPath) + '/memory.stat', 'w') as CF:
+                CF.write('anon ' + str(memory) + '\nfile ' + str(cache) + '\nkernel 0\n')
+
+            with open(str(memoryRoot) + '/' + str(cgroupPath) + '/memory.peak', 'w') as CF:
+                CF.write(str(memoryPeak) + '\n')
+        else:
+            # cgroup v1 cpuacct.usage is nano seconds, memory.max_usage_in_bytes is missing on purpose.
+            with open(str(cpuRoot) + '/' + str(cgroupPath) + '/cpuacct.usage', 'w') as CF:
+                CF.write(str(cpuUsec*1000) + '\n')
+
+            with open(str(memoryRoot) + '/' + str(cgroupPath) + '/memory.usage_in_bytes', 'w') as CF:
+                CF.write(str(memory+cache) + '\n')
+
+            # The job memory is on the sub cgroup (the job step), only the "total_" items include it.
+            with open(str(memoryRoot) + '/' + str(cgroupPath) + '/memory.stat', 'w') as CF:
+                CF.write('cache 0\nrss 0\ntotal_cache ' + str(cache) + '\ntotal_rss ' + str(memory) + '\n')
+
+        expectedDic[job] = (cpuUsec, memory, memoryPeak)
+
+    return(expectedDic)
+
+def getCgroupUsage(cgroupRoot):
+    jobCgroupDic = cgroup_common.findJobCgroups(cgroupRoot)
+    return(cgroup_common.getJobCgroupUsageDic(cgroupRoot, jobCgroupDic))
+
+def benchCgroupScan(procNum):
+    tmpDir = tempfile.mkdtemp(prefix='openlavaMonitor_benchmark_')
+    jobList = genFakeProcfs(tmpDir, procNum)
+
+    print('>>> Benchmark job resource usage of ' + str(len(jobList)) + ' jobs with the process tree (' + str(procNum) + ' processes) and the job cgroups ...')
+    (procDic, procSeconds) = runTime(newGetJobResource, tmpDir, jobList)
+    print('    %-16s%-16s%-16s%-10s' % ('CASE', 'PROC (s)', 'CGROUP (s)', 'SPEEDUP'))
+
+    for version in [1, 2]:
+        cgroupRoot = str(tmpDir) + '/cgroup_v' + str(version)
+        expectedDic = genFakeCgroupfs(cgroupRoot, version, jobList)
+        (usageDic, cgroupSeconds) = runTime(getCgroupUsage, cgroupRoot)
+        resultDic = dict([(job, (usageDic[job]['cpu_usec'], usageDic[job]['memory'], usageDic[job]['memory_peak'])) for job in usageDic.keys()])
+
+        if resultDic != expectedDic:
+            print('*Error*: the cgroup v' + str(version) + ' job usage is different from the expected job usage.')
+            sys.exit(1)
+
+        print('    %-16s%-16.3f%-16.3f%-10.1f' % ('cgroupScan v' + str(version), procSeconds, cgroupSeconds, procSeconds/max(cgroupSeconds, 0.000001)))
+
+    shutil.rmtree(tmpDir)
+## For case cgroupScan (end) ##
+
+## For case commandCache (begin) ##
+# Local openlava command stand-in (bhosts/lshosts/lsload/bqueues/bmgroup), every run sleeps for OPENLAVA_DELAY
+# seconds and is logged into OPENLAVA_LOG.
+fakeOpenlavaScript = """#!/bin/sh
+echo "$0 $*" >> "$OPENLAVA_LOG"
+sleep "$OPENLAVA_DELAY"
+case "$(basename $0)" in
+    bhosts) echo "HOST_NAME STATUS JL/U MAX NJOBS RUN SSUSP USUSP RSV"; for i in $(seq 0 $((HOST_NUM-1))); do echo "lavaHost$i ok - 8 2 2 0 0 0"; done ;;
+    lshosts) echo "HOST_NAME type model cpuf ncpus maxmem maxswp server RESOURCES"; for i in $(seq 0 $((HOST_NUM-1))); do echo "lavaHost$i linux IntelI5 100.0 8 7807M 5119M Yes (cs)"; done ;;
+    lsload) echo "HOST_NAME status r15s r1m r15m ut pg ls it tmp swp mem"; for i in $(seq 0 $((HOST_NUM-1))); do echo "lavaHost$i ok 0.3 0.1 0.1 19% 0.0 3 5 35G 5120M 6688M"; done ;;
+    bqueues)
+        if [ "$1" = "-l" ]; then
+            echo "QUEUE: normal"; echo "HOSTS: all hosts used by the OpenLava system"; echo
+            echo "QUEUE: short"; echo "HOSTS: lavaHost0 lavaHost1 lavaHost2"; echo
+            echo "QUEUE: long"; echo "HOSTS: lavaGroup+2"; echo
+            echo "QUEUE: group"; echo "HOSTS: lavaGroup/"
+            for i in $(seq 0 $((QUEUE_NUM-1))); do echo; echo "QUEUE: queue$i"; echo "HOSTS: lavaGroup$((i%GROUP_NUM))/ lavaGroup$(((i+1)%GROUP_NUM))+2 lavaHost$i"; done
+        else
+            echo "QUEUE_NAME PRIO STATUS MAX JL/U JL/P JL/H NJOBS PEND RUN SUSP"; for queue in normal short long group; do echo "$queue 30 Open:Active - - - - 0 0 0 0"; done
+        fi ;;
+    bmgroup)
+        echo "GROUP_NAME HOSTS"
+        for group in lavaGroup $(for i in $(seq 0 $((GROUP_NUM-1))); do echo lavaGroup$i; done); do
+            if [ "$2" = "" ] || [ "$2" = "$group" ]; then echo "$group lavaHost0 lavaHost1 $group-host0 $group-host1"; fi
+        done ;;
+esac
+"""
+
+def genFakeOpenlava(tmpDir, delay, hostNum, queueNum=0, groupNum=0):
+    """
+    Write the local fake openlava commands into tmpDir and put tmpDir at the head of PATH, return the command log file.
+    Besides the fixed queues, there are queueNum queues on the groupNum host groups.
+    """
+    for command in ['bhosts', 'lshosts', 'lsload', 'bqueues', 'bmgroup']:
+        commandPath = str(tmpDir) + '/' + str(command)
+
+        with open(commandPath, 'w') as CF:
+            CF.write(fakeOpenlavaScript)
+
+        os.chmod(commandPath, 0o755)
+
+    logFile = str(tmpDir) + '/openlava.log'
+    os.environ['PATH'] = str(tmpDir) + ':' + str(os.environ['PATH'])
+    os.environ['OPENLAVA_DELAY'] = str(delay)
+    os.environ['OPENLAVA_LOG'] = logFile
+    os.environ['HOST_NUM'] = str(hostNum)
+    os.environ['QUEUE_NUM'] = str(queueNum)
+    os.environ['GROUP_NUM'] = str(groupNum)
+
+    return(logFile)
+
+def getCommandNum(logFile):
+    """
+    Get the command run number from the command log file, then clean the log file.
+    """
+    if not os.path.exists(logFile):
+        return(0)
+
+    with open(logFile, 'r') as LF:
+        commandNum = len(LF.readlines())
+
+    os.remove(logFile)
+
+    return(commandNum)
+
+def refreshHostsTab(threadNum):
+    """
+    The openlava queries of bmonitorGUI on loading (the main window and the HOSTS tab), with threadNum concurrent loaders.
+    """
+    def loadHostsTab():
+        openlava_common.getQueueList()
+        openlava_common.getHostList()
+        openlava_common.getBhostsInfo()
+        openlava_common.getLshostsInfo()
+        openlava_common.getLsloadInfo()
+        openlava_common.getHostQueueInfo()
+
+    threadList = []
+
+    for i in range(threadNum):
+        myThread = threading.Thread(target=loadHostsTab)
+        myThread.daemon = True
+        myThread.start()
+        threadList.append(myThread)
+
+    for myThread in threadList:
+        myThread.join()
+
+def benchCommandCache(hostNum):
+    tmpDir = tempfile.mkdtemp(prefix='openlavaMonitor_benchmark_')
+    logFile = genFakeOpenlava(tmpDir, 0.1, hostNum)
+    origPath = os.environ['PATH'].split(':', 1)[1]
+    threadNum = 4
+
+    # No cache, every query runs the command.
+    origTtlDic = dict(openlava_common.commandCacheTtlDic)
+    openlava_common.commandCacheTtlDic.clear()
+    openlava_common.clearCommandCache()
+
+    print('>>> Benchmark ' + str(threadNum) + ' concurrent bmonitorGUI HOSTS tab loadings (' + str(hostNum) + ' hosts, fake openlava commands, 0.1 seconds per command) ...')
+    (origHostQueueDic, origSeconds) = runTime(refreshHostsTab, threadNum)
+    origCommandNum = getCommandNum(logFile)
+
+    openlava_common.commandCacheTtlDic.update(origTtlDic)
+    openlava_common.clearCommandCache()
+    (result, newSeconds) = runTime(refreshHostsTab, threadNum)
+    newCommandNum = getCommandNum(logFile)
+    printResult('commandCache', origSeconds, newSeconds)
+    print('    Command runs: ' + str(origCommandNum) + ' -> ' + str(newCommandNum) + '.')
+
+    # The cached output is the same as the command output, and it is re-run after clearCommandCache.
+    hostQueueDic = openlava_common.getHostQueueInfo()
+    openlava_common.clearCommandCache()
+
+    if (openlava_common.getHostQueueInfo() != hostQueueDic) or (getCommandNum(logFile) != 3):
+        print('*Error*: the command output is not re-loaded after clearCommandCache.')
+        sys.exit(1)
+
+    os.environ['PATH'] = origPath
+    shutil.rmtree(tmpDir)
+## For case commandCache (end) ##
+
+## For case hostGroup (begin) ##
+def origGetHostGroupMembers(hostGroupName):
+    """
+    The original openlava_common.getHostGroupMembers (one "bmgroup -r <group>" per group), kept as the benchmark reference.
+    """
+    hostList = []
+    lines = os.popen('bmgroup -r ' + str(hostGroupName)).readlines()
+
+    for line in lines:
+        if re.search('No such user/host group', line):
+            break
+        elif re.match('^' + str(hostGroupName) + ' .*$', line):
+            myList = line.split()
+            hostList = myList[1:]
+
+    return(hostList)
+
+def origGetQueueHostInfo():
+    """
+    openlava_common.getQueueHostInfo with the original group member query.
+    """
+    origFunction = openlava_common.getHostGroupMembers
+    openlava_common.getHostGroupMembers = origGetHostGroupMembers
+
+    try:
+        return(openlava_common.getQueueHostInfo())
+    finally:
+        openlava_common.getHostGroupMembers = origFunction
+
+def benchHostGroup(queueNum):
+    tmpDir = tempfile.mkdtemp(prefix='openlavaMonitor_benchmark_')
+    logFile = genFakeOpenlava(tmpDir, 0, 100, queueNum, max(1, int(queueNum/4)))
+    origPath = os.environ['PATH'].split(':', 1)[1]
+
+    # No cache, so both of them run the commands.
+    origTtlDic = dict(openlava_common.commandCacheTtlDic)
+    openlava_common.commandCacheTtlDic.clear()
+    openlava_common.clearCommandCache()
+
+    print('>>> Benchmark queue host expansion of ' + str(queueNum) + ' queues (2 host groups per queue, fake openlava commands) ...')
+    (origQueueHostDic, origSeconds) = runTime(origGetQueueHostInfo)
+    origCommandNum = getCommandNum(logFile)
+    (queueHostDic, newSeconds) = runTime(openlava_common.getQueueHostInfo)
+    newCommandNum = getCommandNum(logFile)
+
+    if queueHostDic != origQueueHostDic:
+        print('*Error*: the queue hosts are different from the original queue hosts.')
+        sys.exit(1)
+
+    printResult('hostGroup', origSeconds, newSeconds)
+    print('    Command runs: ' + str(origCommandNum) + ' -> ' + str(newCommandNum) + '.')
+
+    # One "bqueues -l", one "bhosts" (for the queues on all hosts) and one "bmgroup -r", whatever the queue number is.
+    if newCommandNum != 3:
+        print('*Error*: the host groups are queried ' + str(newCommandNum) + ' times, it should not depend on the queue number.')
+        sys.exit(1)
+
+    openlava_common.commandCacheTtlDic.update(origTtlDic)
+    openlava_common.clearCommandCache()
+    os.environ['PATH'] = origPath
+    shutil.rmtree(tmpDir)
+## For case hostGroup (end) ##
+
+## For case downsample (begin) ##
+def genMemCurve(pointNum):
+    """
+    Generate a synthetic job memory curve (random walk with some short spikes), return (runTimeList, memList).
+    """
+    myRandom = random.Random(0)
+    mem = 10.0
+    memList = []
+
+    for i in range(pointNum):
+        mem = max(0.0, mem + myRandom.uniform(-0.1, 0.1))
+
+        if myRandom.random() < 0.0001:
+            memList.append(round(mem + myRandom.uniform(10, 50), 1))
+        else:
+            memList.append(round(mem, 1))
+
+    return(list(range(pointNum)), memList)
+
+def drawCurve(runTimeList, memList):
+    """
+    Draw the curve like the bmonitorGUI.py job memory curve on an off-screen figure.
+    """
+    from matplotlib.figure import Figure
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+
+    figure = Figure()
+    canvas = FigureCanvasAgg(figure)
+    axes = figure.add_subplot(111)
+    axes.plot(runTimeList, memList, color='red', marker='o')
+    canvas.draw()
+
+def downsampleDrawCurve(runTimeList, memList, maxPoints):
+    (runTimeList, [memList]) = downsample_common.downsampleCurves(runTimeList, [memList], maxPoints)
+    drawCurve(runTimeList, memList)
+
+def benchDownsample(pointNum, maxPoints=2000):
+    (runTimeList, memList) = genMemCurve(pointNum)
+
+    print('>>> Benchmark min/max downsampling of a ' + str(pointNum) + ' points job memory curve into ' + str(maxPoints) + ' points ...')
+    (pythonResult, pythonSeconds) = runTime(downsample_common.downsampleCurves, runTimeList, [memList], maxPoints, False)
+    (downRunTimeList, [downMemList]) = pythonResult
+
+    if (len(downMemList) > maxPoints) or (max(downMemList) != max(memList)) or (min(downMemList) != min(memList)) or (downRunTimeList[0] != 0) or (downRunTimeList[-1] != pointNum-1):
+        print('*Error*: the downsampled curve misses the peak/valley/first/last point, or has too many points.')
+        sys.exit(1)
+
+    if downsample_common.numpy is None:
+        print('*Warning*: numpy is not installed, only run the pure python implementation.')
+        print('    ' + str(len(downMemList)) + ' points, ' + str(round(pythonSeconds, 3)) + ' seconds.')
+    else:
+        # Warm up numpy (the first call of some numpy functions loads their implementations).
+        downsample_common.downsampleCurves(runTimeList[:maxPoints*2], [memList[:maxPoints*2]], maxPoints)
+        (numpyResult, numpySeconds) = runTime(downsample_common.downsampleCurves, runTimeList, [memList], maxPoints)
+
+        if numpyResult != pythonResult:
+            print('*Error*: the numpy downsampled curve is different from the pure python downsampled curve.')
+            sys.exit(1)
+
+        print('    %-16s%-16s%-16s%-10s' % ('CASE', 'PYTHON (s)', 'NUMPY (s)', 'SPEEDUP'))
+        print('    %-16s%-16.3f%-16.3f%-10.1f' % ('downsample', pythonSeconds, numpySeconds, pythonSeconds/max(numpySeconds, 0.000001)))
+
+    try:
+        import matplotlib
+    except ImportError:
+        print('*Warning*: matplotlib is not installed, skip the curve drawing benchmark.')
+        return
+
+    print('>>> Benchmark drawing the ' + str(pointNum) + ' points job memory curve with/without downsampling ...')
+    (result, origSeconds) = runTime(drawCurve, runTimeList, memList)
+    (result, newSeconds) = runTime(downsampleDrawCurve, runTimeList, memList, maxPoints)
+    printResult('downsampleDraw', origSeconds, newSeconds)
+## For case downsample (end) ##
+
+## For case daemonSchedule (begin) ##
+class fakeClock:
+    """
+    Fake "time" module for jobResourceSample.py, sleep() moves the clock forward, and stops the daemon after endSeconds.
+    """
+    def __init__(self, endSeconds):
+        self.seconds = 0.0
+        self.endSeconds = endSeconds
+
+    def time(self):
+        return(self.seconds)
+
+    def sleep(self, seconds):
+        self.seconds += seconds
+
+        if self.seconds >= self.endSeconds:
+            raise KeyboardInterrupt
+
+def benchDaemonSchedule(hours):
+    """
+    Run the jobResourceSample.py daemon loop on a fake clock, the job list must be updated from bjobs once per flush.
+    """
+    (interval, flush, bjobsSeconds) = (30, 300, 2)
+    clock = fakeClock(hours*3600)
+    jobSecondsList = []
+    flushSecondsList = []
+    mySample = jobResourceSample.jobResourceSample(output='stdout')
+
+    def getRunningJobDic():
+        jobSecondsList.append(clock.time())
+        clock.seconds += bjobsSeconds
+        return({})
+
+    mySample.getRunningJobDic = getRunningJobDic
+    mySample.getJobCgroupDic = lambda jobList: {}
+    mySample.getProcJobList = lambda jobList, jobCgroupDic: []
+    mySample.flush = lambda jobAggregateDic: flushSecondsList.append(clock.time())
+
+    print('>>> Check the jobResourceSample.py daemon schedule on a fake clock (' + str(hours) + ' hours, interval ' + str(interval) + ' seconds, flush ' + str(flush) + ' seconds) ...')
+    origTime = jobResourceSample.time
+    jobResourceSample.time = clock
+
+    try:
+        mySample.daemon(interval, flush)
+    finally:
+        jobResourceSample.time = origTime
+
+    expectedJobSecondsList = [float(seconds) for seconds in range(0, hours*3600, flush)]
+    print('    ' + str(len(jobSecondsList)) + ' job list updates, ' + str(len(flushSecondsList)) + ' flushes.')
+
+    if jobSecondsList != expectedJobSecondsList:
+        print('*Error*: the job list is not updated once per flush, the update seconds are ' + str(jobSecondsList[:6]) + ' ...')
+        sys.exit(1)
+
+    if len(flushSecondsList) != len(expectedJobSecondsList)-1:
+        print('*Error*: the samples are flushed ' + str(len(flushSecondsList)) + ' times, it should be ' + str(len(expectedJobSecondsList)-1) + '.')
+        sys.exit(1)
+## For case daemonSchedule (end) ##
+
+################
+# Main Process #
+################
+def main():
+    (caseList, number) = readArgs()
+
+    for case in caseList:
+        if case == 'bjobsUf':
+            benchBjobsUf(number)
+        elif case == 'sqliteWal':
+            benchSqliteWal(number)
+        elif case == 'multiHostPeak':
+            benchMultiHostPeak()
+        elif case == 'batchRun':
+            benchBatchRun(number)
+        elif case == 'procScan':
+            benchProcScan(max(5000, int(number/8)))
+        elif case == 'cgroupScan':
+            benchCgroupScan(max(5000, int(number/8)))
+        elif case == 'commandCache':
+            benchCommandCache(max(100, int(number/40)))
+        elif case == 'hostGroup':
+            benchHostGroup(max(100, int(number/100)))
+        elif case == 'downsample':
+            benchDownsample(max(100000, number*5))
+        elif case == 'daemonSchedule':
+            benchDaemonSchedule(24)
+
+if __name__ == '__main__':
+    main()
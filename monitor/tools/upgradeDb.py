@@ -0,0 +1,296 @@
+#!PYTHONPATH
+# -*- coding: utf-8 -*-
+#
+# Upgrade the existing openlavaMonitor sqlite3 database files into the current schema.
+# Job range db files: move the per-job tables (job_<id> for bsample.py, <id> for
+# jobResourceSample.py) into the single job sample table.
+# Schema version 0 -> 1: switch the time strings into INTEGER epoch seconds, the number
+# strings into INTEGER/REAL numbers (memory unit is G), and "NA"/""/"-" into NULL.
+
+import os
+import re
+import sys
+import time
+import glob
+import argparse
+import datetime
+
+sys.path.insert(0, 'MONITORPATH')
+from conf import config
+from common import common
+from common import openlava_common
+from common import sqlite3_common
+
+os.environ["PYTHONUNBUFFERED"]="1"
+
+# (keyList, converterList) of the legacy sample tables, the table type is the key of sqlite3_common.sampleTableSchemaDic.
+# time      : '%Y%m%d_%H%M%S' or '%Y-%m-%d %H:%M:%S' string to epoch seconds.
+# text      : keep the string.
+# number    : number string to number.
+# memM/memG : memory string (like "5120M"/"35G", the bare number unit is M/G) to number (unit is G).
+legacyTableDic = {
+                  'queue'   : (['sampleTime', 'NJOBS', 'PEND', 'RUN', 'SUSP'],
+                               ['time', 'number', 'number', 'number', 'number']),
+                  'host'    : (['sampleTime', 'MAX', 'NJOBS', 'RUN', 'SSUSP', 'USUSP'],
+                               ['time', 'number', 'number', 'number', 'number', 'number']),
+                  'load'    : (['sampleTime', 'ut', 'tmp', 'swp', 'mem'],
+                               ['time', 'number', 'memM', 'memM', 'memM']),
+                  'user'    : (['sampleTime', 'NJOBS', 'PEND', 'RUN', 'SSUSP', 'USUSP'],
+                               ['time', 'number', 'number', 'number', 'number', 'number']),
+                  'userJob' : (['id', 'SAMPLE_TIME', 'JOB', 'STATUS', 'CPU_RESERVED', 'CPU_AVG', 'CPU_PEAK', 'MEM_RESERVED', 'MEM_AVG', 'MEM_PEAK', 'RUN_TIME', 'CWD', 'COMMAND'],
+                               ['', 'time', 'text', 'text', 'number', 'number', 'number', 'memG', 'memG', 'memG', 'number', 'text', 'text']),
+                 }
+
+def readArgs():
+    """
+    Read in arguments.
+    """
+    parser = argparse.ArgumentParser()
+
+    parser.add_argument("-d", "--databases",
+                        nargs='+',
+                        default=[],
+                        help='Specify the database files to upgrade, default is all of the files under "<dbPath>/monitor", "<dbPath>/monitor/job", "<dbPath>/resource/job" and "<dbPath>/resource/user".')
+
+    args = parser.parse_args()
+
+    if len(args.databases) == 0:
+        for dbDir in ['monitor', 'monitor/job', 'resource/job', 'resource/user']:
+            args.databases.extend(sorted(glob.glob(str(config.dbPath) + '/' + str(dbDir) + '/*.db')))
+
+    for database in args.databases:
+        if not os.path.exists(database):
+            common.printError('*Error*: ' + str(database) + ': No such database file.')
+            sys.exit(1)
+
+    return(args.databases)
+
+def timeToSeconds(timeString):
+    """
+    Switch legacy time string into epoch seconds, None for the invalid time string.
+    """
+    for timeFormat in ['%Y%m%d_%H%M%S', '%Y-%m-%d %H:%M:%S']:
+        try:
+            return(int(time.mktime(datetime.datetime.strptime(str(timeString), timeFormat).timetuple())))
+        except ValueError:
+            pass
+
+    return(None)
+
+def convertValue(value, converter):
+    """
+    Switch legacy string value into the typed value with the specified converter (see legacyTableDic).
+    """
+    if (value is None) or (converter == 'text'):
+        return(value)
+    elif converter == 'time':
+        return(timeToSeconds(value))
+
+    value = str(value).strip()
+
+    if value == '':
+        return(None)
+
+    # The memory value with unit is switched into M by commandValueToNumber.
+    number = openlava_common.commandValueToNumber(value)
+
+    if converter == 'memM':
+        number = number/1024
+    elif (converter == 'memG') and (value[-1:] in openlava_common.memUnitDic):
+        number = number/1024
+
+    return(sqlite3_common.numberToSqlValue(number))
+
+def getTableDataDic(dbConn, tableName, keyList):
+    """
+    Get all of the data of the table on dbConn, return a dict of key: valueList.
+    The sqlite3 errors are raised (not printed and ignored like sqlite3_common.getSqlTableData), so upgradeDb can roll back.
+    """
+    dataDic = dict([(key, []) for key in keyList])
+    command = 'SELECT ' + ', '.join(['"' + str(key) + '"' for key in keyList]) + " FROM '" + str(tableName) + "'"
+
+    for item in dbConn.execute(command):
+        for i in range(len(keyList)):
+            dataDic[keyList[i]].append(item[i])
+
+    return(dataDic)
+
+def getJobTableSampleList(dbConn, tableName, keyList):
+    """
+    Switch the data of the legacy job table into typed job sample value lists [job_id, sample_time, host, cpu, mem].
+    """
+    sampleList = []
+
+    if keyList == ['sampleTime', 'mem']:
+        # bsample.py job table "job_<id>".
+        job = tableName[4:]
+        dataDic = getTableDataDic(dbConn, tableName, keyList)
+
+        for i in range(len(dataDic.get('sampleTime', []))):
+            sampleList.append([job, timeToSeconds(dataDic['sampleTime'][i]), '', None, convertValue(dataDic['mem'][i], 'memM')])
+    elif keyList == ['SAMPLE_TIME', 'HOST_NAME', 'CPU', 'MEMORY']:
+        # jobResourceSample.py job table "<id>".
+        job = tableName
+        dataDic = getTableDataDic(dbConn, tableName, keyList)
+
+        for i in range(len(dataDic.get('SAMPLE_TIME', []))):
+            sampleList.append([job, timeToSeconds(dataDic['SAMPLE_TIME'][i]), dataDic['HOST_NAME'][i], convertValue(dataDic['CPU'][i], 'number'), convertValue(dataDic['MEMORY'][i], 'memG')])
+    elif (tableName == sqlite3_common.jobSampleTableName) and (keyList == sqlite3_common.jobSampleKeyList):
+        # Untyped job sample table, the sample_time of bsample.py is '%Y%m%d_%H%M%S' and the mem unit is M.
+        dataDic = getTableDataDic(dbConn, tableName, keyList)
+
+        for i in range(len(dataDic.get('sample_time', []))):
+            if re.match('^\d{8}_\d{6}$', str(dataDic['sample_time'][i])):
+                memConverter = 'memM'
+            else:
+                memConverter = 'memG'
+
+            sampleList.append([dataDic['job_id'][i], timeToSeconds(dataDic['sample_time'][i]), dataDic['host'][i], convertValue(dataDic['cpu'][i], 'number'), convertValue(dataDic['mem'][i], memConverter)])
+    else:
+        return(None)
+
+    return(sampleList)
+
+def getLegacyTableType(keyList):
+    """
+    Get the legacy sample table type with the table key list, return '' for the unknown table.
+    """
+    for (tableType, (legacyKeyList, converterList)) in legacyTableDic.items():
+        if keyList == legacyKeyList:
+            return(tableType)
+
+    return('')
+
+def upgradeSampleTable(dbConn, tableName, tableType):
+    """
+    Switch the legacy sample table into the typed sample table, return the row number.
+    The legacy table is dropped only after the typed table is filled, the sqlite3 errors are raised.
+    """
+    (legacyKeyList, converterList) = legacyTableDic[tableType]
+    (keyList, keyTypeList) = sqlite3_common.sampleTableSchemaDic[tableType]
+    dataDic = getTableDataDic(dbConn, tableName, legacyKeyList)
+    valueList = []
+
+    for i in range(len(dataDic.get(legacyKeyList[0], []))):
+        value = []
+
+        for j in range(len(legacyKeyList)):
+            if converterList[j] == '':
+                # The auto increment id.
+                value.append(None)
+            else:
+                value.append(convertValue(dataDic[legacyKeyList[j]][i], converterList[j]))
+
+        valueList.append(value)
+
+    upgradeTableName = str(tableName) + '__upgrade'
+    keyString = sqlite3_common.genSqlTableKeyString(keyList, keyTypeList, autoIncrement=(tableType == 'userJob'))
+    dbConn.execute("DROP TABLE IF EXISTS '" + str(upgradeTableName) + "'")
+    dbConn.execute("CREATE TABLE '" + str(upgradeTableName) + "' " + str(keyString))
+
+    if len(valueList) > 0:
+        dbConn.executemany("INSERT INTO '" + str(upgradeTableName) + "' VALUES (" + ', '.join(['?']*len(valueList[0])) + ")", valueList)
+
+    dbConn.execute("DROP TABLE '" + str(tableName) + "'")
+    dbConn.execute("ALTER TABLE '" + str(upgradeTableName) + "' RENAME TO '" + str(tableName) + "'")
+
+    return(len(valueList))
+
+def upgradeDb(dbFile):
+    """
+    Upgrade the db file into the current schema version, in one transaction.
+    All of the changes are rolled back (and the db file is kept as it is) if any step fails.
+    """
+    print('>>> Upgrading database "' + str(dbFile) + '" ...')
+
+    (result, dbConn) = sqlite3_common.connectDbFile(dbFile, mode='write')
+
+    if result != 'passed':
+        common.printError('*Error*: Failed on connecting sqlite3 database "' + str(dbFile) + '" (' + str(result) + ').')
+        return
+
+    version = sqlite3_common.getSqlSchemaVersion(dbFile, dbConn)
+
+    if version == sqlite3_common.sqlSchemaVersion:
+        print('    Already on the current schema version ' + str(version) + '.')
+        dbConn.close()
+        return
+
+    tableList = sqlite3_common.getSqlTableList(dbFile, dbConn)
+    jobSampleList = []
+    jobTableList = []
+    jobTableNum = 0
+    tableNum = 0
+    rowNum = 0
+
+    # Manage the transaction explicitly, so the DDL (DROP/CREATE/ALTER) is rolled back together with the data.
+    dbConn.isolation_level = None
+
+    try:
+        dbConn.execute('BEGIN IMMEDIATE')
+
+        for tableName in tableList:
+            # The sqlite internal tables, like "sqlite_sequence" of the auto increment id.
+            if tableName.startswith('sqlite_'):
+                continue
+
+            keyList = sqlite3_common.getSqlTableKeyList(dbFile, dbConn, tableName)
+            tableType = getLegacyTableType(keyList)
+
+            if tableType != '':
+                rowNum += upgradeSampleTable(dbConn, tableName, tableType)
+                tableNum += 1
+                continue
+
+            sampleList = getJobTableSampleList(dbConn, tableName, keyList)
+
+            if sampleList is None:
+                common.printWarning('    *Warning*: table "' + str(tableName) + '" is not a known sample table, ignore it.')
+                continue
+
+            jobSampleList.extend(sampleList)
+            jobTableList.append(tableName)
+            jobTableNum += 1
+
+        if jobTableNum > 0:
+            # The legacy job tables (including the untyped job sample table) are dropped after all of their samples are read,
+            # the duplicate legacy samples (same job_id/sample_time/host) are replaced, so they don't abort the upgrade.
+            for tableName in jobTableList:
+                dbConn.execute("DROP TABLE '" + str(tableName) + "'")
+
+            keyString = sqlite3_common.genSqlTableKeyString(sqlite3_common.jobSampleKeyList, sqlite3_common.jobSampleKeyTypeList, primaryKeyList=sqlite3_common.jobSamplePrimaryKeyList)
+            dbConn.execute("CREATE TABLE '" + str(sqlite3_common.jobSampleTableName) + "' " + str(keyString))
+
+            if len(jobSampleList) > 0:
+                dbConn.executemany("INSERT OR REPLACE INTO '" + str(sqlite3_common.jobSampleTableName) + "' VALUES (?, ?, ?, ?, ?)", jobSampleList)
+
+            rowNum += dbConn.execute("SELECT COUNT(*) FROM '" + str(sqlite3_common.jobSampleTableName) + "'").fetchone()[0]
+
+        dbConn.execute('PRAGMA user_version = ' + str(int(sqlite3_common.sqlSchemaVersion)))
+        dbConn.execute('COMMIT')
+    except Exception as error:
+        if dbConn.in_transaction:
+            dbConn.execute('ROLLBACK')
+
+        dbConn.close()
+        common.printError('*Error*: Failed on upgrading database "' + str(dbFile) + '", it is not changed: ' + str(error))
+        return
+
+    if (jobTableNum > 0) or (tableNum > 0):
+        dbConn.execute('VACUUM')
+
+    dbConn.close()
+
+    print('    Done (' + str(jobTableNum) + ' job tables, ' + str(tableNum) + ' sample tables, ' + str(rowNum) + ' rows).')
+
+################
+# Main Process #
+################
+def main():
+    (dbFileList) = readArgs()
+
+    for dbFile in dbFileList:
+        upgradeDb(dbFile)
+
+if __name__ == '__main__':
+    main()